@@ -7,8 +7,20 @@ import numpy #for vectorized code (todo)
 import hlt #interface with the Halite engine
 
 # GAME START
-game = hlt.Game("Finalbotv1") #Initialize game
+game = hlt.Game("Finalbotv1", send_name=False) #Initialize game
+#take the opening from the book if it has this map, else spend the init
+#phase rolling out the openings, then let the game start
+entry = hlt.book.OpeningBook().get(hlt.book.layout(game.initial_map))
+opening = None
+if entry is None:
+    #without a verdict first_turn falls back to the distance rule
+    try:
+        opening = hlt.opening.evaluate(game.initial_map)
+    except Exception as e:
+        logging.warning('MyBot: opening evaluation failed ('+repr(e)+')')
+game.send_name()
 state = hlt.state.State()
+dispatcher = hlt.dispatch.Dispatcher()
 logging.info("Starting my Final bot!") #Init message
 
 FIRST_TURN_FLAG = 1
@@ -20,7 +32,8 @@ while True:
     # TURN START
     # Update the map for the new turn
     start_up = time.time()
-    game_map = game.update_map()
+    #the worker started last turn stops as soon as the map is in
+    game_map = game.update_map(received=state.speculator.stop)
     state.update(game_map)
     end_up = time.time()
     logging.info('Map and State update: '+str(end_up-start_up))
@@ -28,37 +41,19 @@ while True:
     #    break
 
     #Issue commands to ships
-    command_queue = []
     if FIRST_TURN_FLAG:
-        hlt.strategy.first_turn(game_map, state)
+        hlt.strategy.first_turn(game_map, state, opening, entry)
         FIRST_TURN_FLAG = 0
 
-    for cmd in hlt.commands.sqrn_step(state):
-        command_queue.append(cmd)
-    logging.info('MyBot: squadron commands')
+    #one command per ship, routed through its role (and any role changes)
+    command_queue = dispatcher.run(game_map, state)
+    logging.info('MyBot: dispatched commands')
 
-    while (state.ships_guar or state.ships_atck
-           or state.ships_mine or state.ships_corn
-           or state.ships_flee):
-        for cmd in hlt.commands.atck_step(game_map, state):
-            command_queue.append(cmd)
-        logging.info('MyBot: attacker commands')
+    #spend what is left of the turn on queued plans (paths, flow fields)
+    state.planner.run(state.start + hlt.planner.TURN_BUDGET)
 
-        for cmd in hlt.commands.mine_step(game_map, state):
-            command_queue.append(cmd)
-        logging.info('MyBot: miner commands')
-
-        for cmd in hlt.commands.guar_step(game_map, state):
-            command_queue.append(cmd)
-        logging.info('MyBot: guardian commands')
-
-        for cmd in hlt.commands.corn_step(game_map, state):
-            command_queue.append(cmd)
-        logging.info('MyBot: corner commands')
-
-        for cmd in hlt.commands.flee_step(game_map, state):
-            command_queue.append(cmd)
-        logging.info('MyBot: flee commands')
+    logging.info('Navigation: '+str(dict(state.nav_stats)))
+    state.profiler.log()
 
     #Complain about collisions
     # ships = game_map.get_me().all_ships()
@@ -74,6 +69,8 @@ while True:
 
     # Send our set of commands to the Halite engine for this turn
     game.send_command_queue(command_queue)
+    #work ahead on the next turn while the engine plays this one
+    state.speculator.start(game_map, command_queue)
     # TURN END
 
     #End timer
@@ -0,0 +1,72 @@
+'''
+Allocation benchmark: objects created per turn.
+
+Plays a synthetic game and counts, per turn, the Position and Thrust
+instances created and the number of memory blocks allocated (tracemalloc).
+
+    python benchmarks/alloc_bench.py [--turns N] [--players 2|4] [--seed S]
+'''
+import argparse
+import logging
+import os
+import sys
+import tracemalloc
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import hlt
+from synthetic import play
+
+
+def count_instances(cls, counts):
+    '''
+    Wrap cls.__init__ so every new instance bumps counts[cls.__name__]
+    '''
+    init = cls.__init__
+
+    def counted(self, *args, **kwargs):
+        counts[cls.__name__] += 1
+        init(self, *args, **kwargs)
+    cls.__init__ = counted
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--turns', type=int, default=80)
+    parser.add_argument('--players', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--crowd', type=int, default=20)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    counts = defaultdict(int)
+    for cls in (hlt.entity.Position, hlt.entity.Thrust):
+        count_instances(cls, counts)
+
+    totals = defaultdict(int)
+    blocks = []
+
+    def on_turn(turn, gmap, gstate, run_turn):
+        counts.clear()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        commands = run_turn()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        blocks.append(peak - before)
+        for name, n in counts.items():
+            totals[name] += n
+        return commands
+
+    play(args.turns, on_turn, n_players=args.players, seed=args.seed, crowd=args.crowd)
+    n = len(blocks)
+    print('turns: %d' % n)
+    for name in ('Position', 'Thrust'):
+        print('%-10s per turn: %10.1f' % (name, totals[name]/n))
+    print('%-10s per turn: %10.1f KiB' % ('peak alloc', sum(blocks)/n/1024.))
+    print('slotted entities: %s' % (not hasattr(hlt.entity.Position(0, 0), '__dict__')))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+'''
+Opening book builder.
+
+Works out first_turn for each map, with a longer opening evaluation than
+the init phase allows, and stores the result in the opening book under
+the map's layout (see hlt.book). Maps are files holding the three lines the engine
+sends at init (player id, width and height, initial map), or synthetic
+games.
+
+    python benchmarks/build_book.py [--budget S] [--book DIR] [--synthetic N --players 2|4] [map ...]
+'''
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import hlt
+from synthetic import Scenario
+
+
+def read_map(path):
+    '''
+    Map from a file of the engine's init lines
+    '''
+    with open(path) as f:
+        tag, size, line = [f.readline().rstrip('\n') for _ in range(3)]
+    width, height = [int(x) for x in size.split()]
+    gmap = hlt.game_map.Map(int(tag), width, height)
+    gmap._parse(line)
+    return gmap
+
+
+def synthetic_maps(n, n_players):
+    for seed in range(n):
+        scenario = Scenario(n_players, seed)
+        gmap = hlt.game_map.Map(0, scenario.width, scenario.height)
+        gmap._parse(scenario.map_string())
+        yield 'synthetic-%dp-%d' % (n_players, seed), gmap
+
+
+def build(book, gmap, budget):
+    '''
+    Entry for gmap, as first_turn decides it after budget seconds of rollouts
+    '''
+    verdict = hlt.opening.evaluate(gmap, budget=budget)
+    gstate = hlt.state.State()
+    gstate.update(gmap)
+    hlt.strategy.first_turn(gmap, gstate, verdict)
+    entry = hlt.book.record(gstate, verdict)
+    book.put(hlt.book.layout(gmap), entry)
+    return entry
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('maps', nargs='*')
+    parser.add_argument('--budget', type=float, default=30.)
+    parser.add_argument('--book', default=hlt.book.BOOK_DIR)
+    parser.add_argument('--synthetic', type=int, default=0)
+    parser.add_argument('--players', type=int, default=2)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    book = hlt.book.OpeningBook(args.book)
+    maps = [(path, read_map(path)) for path in args.maps]
+    maps += list(synthetic_maps(args.synthetic, args.players))
+    for name, gmap in maps:
+        start = time.time()
+        entry = build(book, gmap, args.budget)
+        print('%-24s %s  %-8s z %6.2f  %d miners  %.1fs'
+              % (name, hlt.book.fingerprint(gmap), entry.opening, entry.z,
+                 len(entry.miners), time.time() - start))
+
+
+if __name__ == '__main__':
+    main()
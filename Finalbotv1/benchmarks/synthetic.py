@@ -0,0 +1,179 @@
+'''
+Synthetic Halite II games for offline benchmarks.
+
+Scenario keeps a crude world model (planets, ships, docking, production,
+enemies drifting toward the nearest planet or opposing ship) and renders
+it in the engine's map format, so turns can be fed through Map._parse
+without an engine binary.
+'''
+import math
+import random
+
+
+class Scenario:
+    '''
+    A seeded synthetic game. Player 0 is us.
+    '''
+    def __init__(self, n_players=2, seed=0, n_planets=None, ships_per_player=3):
+        self.rng = random.Random(seed)
+        self.n_players = n_players
+        self.width, self.height = (240, 160) if n_players == 2 else (288, 192)
+        self.turn = 0
+
+        self.planets = []
+        n_planets = n_planets or (10 if n_players == 2 else 14)
+        tries = 0
+        while len(self.planets) < n_planets and tries < 1000:
+            tries += 1
+            x = self.rng.uniform(30, self.width - 30)
+            y = self.rng.uniform(25, self.height - 25)
+            r = self.rng.uniform(3, 9)
+            if any(math.hypot(x - p['x'], y - p['y']) < r + p['r'] + 12 for p in self.planets):
+                continue
+            self.planets.append({'id': len(self.planets), 'x': x, 'y': y, 'r': r,
+                                 'spots': self.rng.randint(2, 5), 'owner': None,
+                                 'docked': [], 'hp': 2000})
+
+        if n_players == 2:
+            starts = [(40, self.height/2), (self.width - 40, self.height/2)]
+        else:
+            starts = [(40, 30), (self.width - 40, 30),
+                      (self.width - 40, self.height - 30), (40, self.height - 30)]
+        self.ships = {}
+        self.next_id = 0
+        for owner, (sx, sy) in enumerate(starts):
+            for k in range(ships_per_player):
+                self.spawn(owner, sx, sy + 2*(k - 1))
+
+    def spawn(self, owner, x, y):
+        self.ships[self.next_id] = {'id': self.next_id, 'owner': owner, 'x': x, 'y': y,
+                                    'hp': 255, 'dock': 0, 'planet': 0, 'progress': 0}
+        self.next_id += 1
+
+    def crowd(self, n_per_player):
+        '''
+        Add undocked ships for every player around their fleet's centroid,
+        to build crowded turns
+        '''
+        for owner in range(self.n_players):
+            mine = [s for s in self.ships.values() if s['owner'] == owner] or \
+                [{'x': self.width/2, 'y': self.height/2}]
+            cx = sum(s['x'] for s in mine)/len(mine)
+            cy = sum(s['y'] for s in mine)/len(mine)
+            for _ in range(n_per_player):
+                x = min(max(cx + self.rng.uniform(-20, 20), 1), self.width - 1)
+                y = min(max(cy + self.rng.uniform(-20, 20), 1), self.height - 1)
+                if any(math.hypot(x - p['x'], y - p['y']) < p['r'] + 1 for p in self.planets):
+                    continue
+                self.spawn(owner, x, y)
+
+    def map_string(self):
+        '''
+        Render the current state in the engine's per-turn format
+        '''
+        out = [str(self.n_players)]
+        for owner in range(self.n_players):
+            ships = [s for s in self.ships.values() if s['owner'] == owner]
+            out += [str(owner), str(len(ships))]
+            for s in ships:
+                out += [str(s['id']), '%.4f' % s['x'], '%.4f' % s['y'], str(s['hp']),
+                        '0', '0', str(s['dock']), str(s['planet']), str(s['progress']), '0']
+        out.append(str(len(self.planets)))
+        for p in self.planets:
+            out += [str(p['id']), '%.4f' % p['x'], '%.4f' % p['y'], str(p['hp']),
+                    '%.4f' % p['r'], str(p['spots']), '0', '1000',
+                    '1' if p['owner'] is not None else '0', str(p['owner'] or 0),
+                    str(len(p['docked']))] + [str(sid) for sid in p['docked']]
+        return ' '.join(out)
+
+    def _dock(self, s, p):
+        if p['owner'] in (None, s['owner']) and len(p['docked']) < p['spots']:
+            s['dock'], s['planet'] = 2, p['id']
+            p['owner'] = s['owner']
+            p['docked'].append(s['id'])
+
+    def apply(self, commands):
+        '''
+        Advance one turn: apply our commands, move the enemies, resolve
+        crude combat and production
+        '''
+        self.turn += 1
+        for command in commands:
+            tokens = command.split()
+            s = self.ships.get(int(tokens[1]))
+            if s is None or s['owner'] != 0 or s['dock']:
+                continue
+            if tokens[0] == 't':
+                magnitude, angle = int(tokens[2]), int(tokens[3])
+                s['x'] += magnitude*math.cos(math.radians(angle))
+                s['y'] += magnitude*math.sin(math.radians(angle))
+            elif tokens[0] == 'd':
+                self._dock(s, self.planets[int(tokens[2])])
+
+        for s in list(self.ships.values()):
+            if s['owner'] == 0 or s['dock']:
+                continue
+            p = min(self.planets, key=lambda p: math.hypot(p['x'] - s['x'], p['y'] - s['y']))
+            d = math.hypot(p['x'] - s['x'], p['y'] - s['y'])
+            if d < p['r'] + 4:
+                self._dock(s, p)
+                continue
+            foes = [o for o in self.ships.values() if o['owner'] != s['owner']]
+            target = p
+            if foes and self.rng.random() < .5:
+                target = min(foes, key=lambda o: math.hypot(o['x'] - s['x'], o['y'] - s['y']))
+            angle = math.atan2(target['y'] - s['y'], target['x'] - s['x'])
+            magnitude = min(7, max(d - p['r'] - 2, 0))
+            s['x'] += magnitude*math.cos(angle)
+            s['y'] += magnitude*math.sin(angle)
+
+        ships = list(self.ships.values())
+        for s in ships:
+            for o in ships:
+                if o['owner'] != s['owner'] and math.hypot(o['x'] - s['x'], o['y'] - s['y']) < 5:
+                    o['hp'] -= 20
+        for s in ships:
+            s['x'] = min(max(s['x'], .6), self.width - .6)
+            s['y'] = min(max(s['y'], .6), self.height - .6)
+            if s['hp'] <= 0:
+                del self.ships[s['id']]
+                for p in self.planets:
+                    if s['id'] in p['docked']:
+                        p['docked'].remove(s['id'])
+                    if not p['docked']:
+                        p['owner'] = None
+
+        if self.turn % 6 == 0:
+            for p in self.planets:
+                if p['docked']:
+                    self.spawn(p['owner'], p['x'] + p['r'] + 1.5, p['y'])
+
+
+def play(n_turns, on_turn, n_players=2, seed=0, crowd=0):
+    '''
+    Drive a fresh bot (Map, State, Dispatcher) through a synthetic game.
+
+    on_turn(turn, gmap, gstate, run_turn) is called each turn; run_turn()
+    builds and returns that turn's command queue.
+    '''
+    import hlt
+
+    scenario = Scenario(n_players, seed)
+    if crowd:
+        scenario.crowd(crowd)
+    gmap = hlt.game_map.Map(0, scenario.width, scenario.height)
+    gstate = hlt.state.State()
+    dispatcher = hlt.dispatch.Dispatcher()
+
+    for turn in range(n_turns):
+        def run_turn():
+            gmap._parse(scenario.map_string())
+            gstate.update(gmap)
+            if turn == 0:
+                hlt.strategy.first_turn(gmap, gstate)
+            return dispatcher.run(gmap, gstate)
+        commands = on_turn(turn, gmap, gstate, run_turn)
+        scenario.apply(commands)
+        if not [s for s in scenario.ships.values() if s['owner'] != 0]:
+            break
+    return scenario
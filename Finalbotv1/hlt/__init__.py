@@ -6,8 +6,10 @@ the start, then in a loop, call get_map() to get the current game state, then
 build up a list of commands and send them with send_command_queue().
 """
 
-from . import collision, constants, entity, game_map, networking
+from . import collision, combat, constants, entity, game_map, geometry, networking, profiler, store
 
-from . import commands, state, strategy
+from . import book, clusters, cohort, commands, derived, dispatch, docking, dockring, events
+from . import flowfield, forecast, formation, intercept, opening, pathing, planner, potential
+from . import skirmish, speculate, state, strategy, targeting
 
 from .networking import Game
@@ -0,0 +1,238 @@
+'''
+Opening book keyed by map layout.
+
+A layout is the map seen from my seat, put in a canonical form so the same
+structure is recognised across games. The map is mirrored so my spawn sits
+in its top left quarter, which folds the symmetric seats of a map onto one
+another. A spawn on a centre line could go either way, so both mirrorings
+are kept and the one with the smaller key is the layout's. Planets (radius, position relative to my spawn, docking spots) are
+sorted by size and then position, and the enemy spawns are taken relative
+to mine as well. The layout's key hashes these with positions and radii
+bucketed to BUCKET units, so maps a little apart usually share a key.
+
+The book keeps one small JSON file per key under BOOK_DIR holding what
+first_turn works out for that layout: the opening verdict, the planet stats
+of State.assess_planets and the planets the starting miners were queued to,
+stored by planet and ship order in the layout rather than by id. A lookup
+reads the file for the key (or a mirroring's). If there is none (a layout near a bucket edge,
+or a new map), the nearest layout in the book's index is taken instead,
+planet by planet, as long as no planet or spawn is more than TOLERANCE
+away. Either way it takes a few milliseconds.
+
+Entries are built offline by benchmarks/build_book.py.
+'''
+import hashlib
+import json
+import logging
+import math
+import os
+from collections import namedtuple
+
+BOOK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'book')
+#file listing every layout in the book, for nearest layout lookups
+INDEX = 'index.json'
+#State attributes of State.assess_planets kept in an entry, without 'pstat_'
+PSTATS = ('Ndocks', 'rdock_avg', 'xdock_avg', 'ydock_avg', 'rdock_rms')
+#units positions and radii are rounded to in a layout's key
+BUCKET = 2.
+#furthest a planet or spawn may be from its match in a book layout
+TOLERANCE = 4.
+
+#opening and z of the opening verdict, pstat name -> value, starting ship
+#id -> planet id it mines
+Entry = namedtuple('Entry', 'opening z pstat miners')
+#key, players, map size, enemy spawns [dx, dy] and planets [radius, dx, dy,
+#spots] relative to my spawn in the canonical frame, the ids of the planets
+#and of my ships in layout order, and the other ways to mirror the map if
+#my spawn is on a centre line
+Layout = namedtuple('Layout', 'key players width height spawns planets planet_ids ship_ids '
+                              'mirrors')
+
+
+def _bucket(v):
+    return int(round(v/BUCKET))
+
+
+def layout(gmap):
+    '''
+    Canonical layout of gmap, seen from my seat
+    '''
+    ships = gmap.get_me().all_ships()
+    flips = []
+    for axis, size in ((0, gmap.width), (1, gmap.height)):
+        offset = sum((s.x, s.y)[axis] for s in ships)/len(ships) - size/2
+        flips.append((False, True) if abs(offset) < BUCKET else (offset > 0,))
+    layouts = sorted((_layout(gmap, flip_x, flip_y) for flip_x in flips[0] for flip_y in flips[1]),
+                     key=lambda lay: lay.key)
+    return layouts[0]._replace(mirrors=tuple(layouts[1:]))
+
+
+def _layout(gmap, flip_x, flip_y):
+    '''
+    Layout of gmap with x and y mirrored as flip_x and flip_y say
+    '''
+    me = gmap.get_me()
+
+    def frame(x, y):
+        return (gmap.width - x if flip_x else x), (gmap.height - y if flip_y else y)
+
+    def centre(ships):
+        points = [frame(s.x, s.y) for s in ships]
+        return sum(x for x, _ in points)/len(points), sum(y for _, y in points)/len(points)
+
+    ox, oy = centre(me.all_ships())
+    spawns = sorted([round(x - ox, 2), round(y - oy, 2)]
+                    for x, y in (centre(p.all_ships()) for p in gmap.all_players()
+                                 if p.id != me.id and p.all_ships()))
+    planets = []
+    for p in gmap.all_planets():
+        x, y = frame(p.x, p.y)
+        planets.append((p.id, [round(p.radius, 2), round(x - ox, 2), round(y - oy, 2),
+                               p.num_docking_spots]))
+    planets.sort(key=lambda p: (-_bucket(p[1][0]), _bucket(p[1][1]), _bucket(p[1][2])))
+    ships = sorted(me.all_ships(), key=lambda s: frame(s.x, s.y)[::-1])
+
+    features = [len(gmap.all_players()), gmap.width, gmap.height,
+                [[_bucket(v) for v in s] for s in spawns],
+                [[_bucket(r), _bucket(x), _bucket(y), n] for _, (r, x, y, n) in planets]]
+    key = '%dp-%dx%d-%s' % (len(gmap.all_players()), gmap.width, gmap.height,
+                            hashlib.sha1(json.dumps(features).encode()).hexdigest()[:16])
+    return Layout(key, len(gmap.all_players()), gmap.width, gmap.height, spawns,
+                  [p for _, p in planets], [pid for pid, _ in planets], [s.id for s in ships], ())
+
+
+def fingerprint(gmap):
+    '''
+    Key of the layout of gmap
+    '''
+    return layout(gmap).key
+
+
+def _stored(lay):
+    '''
+    lay as the book keeps it
+    '''
+    return {'players': lay.players, 'width': lay.width, 'height': lay.height,
+            'spawns': lay.spawns, 'planets': lay.planets}
+
+
+def match(a, b):
+    '''
+    Pair the planets of layout a with those of b (both as stored in the
+    index), each with the nearest one left, biggest first
+
+    :return: (furthest pair or spawn apart, b planet index of each a planet),
+             or None if the layouts can't match
+    '''
+    if (a['players'], a['width'], a['height']) != (b['players'], b['width'], b['height']) \
+            or len(a['planets']) != len(b['planets']) or len(a['spawns']) != len(b['spawns']):
+        return None
+    worst = max([math.hypot(sa[0] - sb[0], sa[1] - sb[1])
+                 for sa, sb in zip(a['spawns'], b['spawns'])] or [0.])
+    left = list(range(len(b['planets'])))
+    pairs = []
+    for r, x, y, _ in a['planets']:
+        d, j = min((math.hypot(x - b['planets'][j][1], y - b['planets'][j][2])
+                    + abs(r - b['planets'][j][0]), j) for j in left)
+        left.remove(j)
+        pairs.append(j)
+        worst = max(worst, d)
+    return worst, pairs
+
+
+class OpeningBook:
+    '''
+    Book entries on disk, one file per layout key plus an index of them all
+    '''
+    def __init__(self, path=BOOK_DIR):
+        self.path = path
+
+    def _read(self, name):
+        try:
+            with open(os.path.join(self.path, name)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            logging.warning('Book: unreadable '+name+' ('+str(e)+')')
+            return None
+
+    def _write(self, name, raw):
+        os.makedirs(self.path, exist_ok=True)
+        tmp = os.path.join(self.path, name+'.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(raw, f, sort_keys=True)
+        os.replace(tmp, os.path.join(self.path, name))
+
+    def get(self, lay):
+        '''
+        Entry for layout lay, from the book's entry for it or the nearest
+        one within TOLERANCE, or None if there is none
+        '''
+        views = (lay,) + lay.mirrors
+        found = None
+        for view in views:
+            raw = self._read(view.key+'.json')
+            if isinstance(raw, dict) and 'layout' in raw:
+                found = match(_stored(view), raw['layout'])
+                if found is not None and found[0] <= TOLERANCE:
+                    lay = view
+                    break
+        else:
+            best = None
+            for key, other in (self._read(INDEX) or {}).items():
+                for view in views:
+                    m = match(_stored(view), other)
+                    if m is not None and m[0] <= TOLERANCE and (best is None or m[0] < best[2][0]):
+                        best = key, view, m
+            if best is None:
+                return None
+            key, lay, found = best
+            raw = self._read(key+'.json')
+            if raw is None:
+                return None
+            logging.info('Book: nearest layout '+key+' is '+str(round(found[0], 2))+' away')
+
+        try:
+            entry = raw['entry']
+            #layout order in the book -> planet id here
+            planet_ids = {j: lay.planet_ids[i] for i, j in enumerate(found[1])}
+            miners = {lay.ship_ids[int(rank)]: planet_ids[k]
+                      for rank, k in entry['miners'].items() if int(rank) < len(lay.ship_ids)}
+            return Entry(entry['opening'], entry['z'], entry['pstat'], miners)
+        except (KeyError, TypeError, IndexError) as e:
+            logging.warning('Book: unreadable entry '+lay.key+' ('+str(e)+')')
+            return None
+
+    def put(self, lay, entry):
+        '''
+        Write entry for layout lay, replacing any older one
+        '''
+        stored = _stored(lay)
+        ranks = {sid: rank for rank, sid in enumerate(lay.ship_ids)}
+        order = {pid: k for k, pid in enumerate(lay.planet_ids)}
+        miners = {ranks[sid]: order[pid] for sid, pid in entry.miners.items()
+                  if sid in ranks and pid in order}
+        self._write(lay.key+'.json', {'layout': stored,
+                                      'entry': dict(entry._asdict(), miners=miners)})
+        index = self._read(INDEX) or {}
+        index[lay.key] = stored
+        self._write(INDEX, index)
+
+
+def record(gstate, verdict):
+    '''
+    Entry for what first_turn decided in gstate, following verdict
+    '''
+    miners = {sid: gstate.ships_targets[sid] for sid in gstate.ships_init
+              if isinstance(gstate.ships_targets.get(sid), int)}
+    return Entry(verdict.opening, verdict.z,
+                 {name: getattr(gstate, 'pstat_'+name) for name in PSTATS}, miners)
+
+
+def apply_stats(gstate, entry):
+    '''
+    Set the planet stats of entry on gstate in place of assess_planets
+    '''
+    for name in PSTATS:
+        setattr(gstate, 'pstat_'+name, entry.pstat[name])
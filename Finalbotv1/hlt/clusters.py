@@ -0,0 +1,100 @@
+'''
+Enemy clusters.
+
+Undocked enemy ships within link_radius of each other (weapon range by
+default) are joined into one cluster, transitively. Ships are binned into
+a grid of link_radius cells so only neighbouring cells are compared.
+'''
+import math
+from collections import defaultdict, namedtuple
+
+import numpy as np
+
+from . import constants
+
+Cluster = namedtuple('Cluster', ['id', 'x', 'y', 'vx', 'vy', 'size', 'health',
+                                 'radius', 'members'])
+Cluster.__doc__ = '''
+A group of enemy ships: centroid, mean velocity over the last turn, ship
+count, total health, distance from the centroid to its farthest member and
+the member ships
+'''
+
+
+def components(x, y, link_radius):
+    '''
+    Connected components of points linked when within link_radius
+
+    :return: array with the component label of every point
+    '''
+    n = len(x)
+    parent = list(range(n))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    cells = defaultdict(list)
+    for i, cell in enumerate(zip((x//link_radius).astype(int), (y//link_radius).astype(int))):
+        cells[cell].append(i)
+    for (cx, cy), members in cells.items():
+        #each pair of cells is compared once: this cell and the half of its neighbours after it
+        near = [j for dx, dy in ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1))
+                for j in cells.get((cx + dx, cy + dy), ())]
+        if len(near) < 2:
+            continue
+        a, b = np.array(members), np.array(near)
+        linked = np.hypot(x[a][:, None] - x[b][None, :],
+                          y[a][:, None] - y[b][None, :]) <= link_radius
+        for i, j in zip(*np.nonzero(linked)):
+            ri, rj = find(a[i]), find(b[j])
+            if ri != rj:
+                parent[ri] = rj
+
+    return np.array([find(i) for i in range(n)], dtype=int)
+
+
+class EnemyClusters:
+    '''
+    This turn's clusters of undocked enemy ships
+
+    :ivar clusters: List of Cluster, largest first
+    :ivar of: Enemy ship id -> its Cluster
+    '''
+    def __init__(self, store, link_radius=constants.WEAPON_RADIUS + 2*constants.SHIP_RADIUS):
+        ships = store.ships
+        rows = np.nonzero(store.mask('enemy') & store.mask('undocked'))[0]
+        self.clusters, self.of = [], {}
+        if not len(rows):
+            return
+
+        x, y = ships.x[rows], ships.y[rows]
+        labels = components(x, y, link_radius)
+        _, labels, size = np.unique(labels, return_inverse=True, return_counts=True)
+        mean_x = np.bincount(labels, x)/size
+        mean_y = np.bincount(labels, y)/size
+        vx = np.bincount(labels, x - ships.px[rows])/size
+        vy = np.bincount(labels, y - ships.py[rows])/size
+        health = np.bincount(labels, ships.health[rows])
+        radius = np.zeros(len(size))
+        np.maximum.at(radius, labels, np.hypot(x - mean_x[labels], y - mean_y[labels]))
+
+        members = [[] for _ in size]
+        for r, label in zip(rows, labels):
+            members[label].append(ships.objects[r])
+        for c in np.argsort(-size, kind='stable'):
+            cluster = Cluster(len(self.clusters), float(mean_x[c]), float(mean_y[c]),
+                              float(vx[c]), float(vy[c]), int(size[c]), int(health[c]),
+                              float(radius[c]), members[c])
+            self.clusters.append(cluster)
+            for e in cluster.members:
+                self.of[e.id] = cluster
+
+    def near(self, entity, radius):
+        '''
+        Clusters with any part within radius of entity
+        '''
+        return [c for c in self.clusters
+                if math.hypot(c.x - entity.x, c.y - entity.y) - c.radius <= radius]
@@ -0,0 +1,124 @@
+'''
+Cohorts of ships sharing a destination.
+
+Undocked miners headed for the same planet, or attackers assigned the same
+enemy, that are within link_radius of each other (transitively) form a
+cohort. Its leader, the member nearest the target, is navigated first and
+the heading of its thrust is the cohort's route. Every other member takes
+that heading at its own speed, plus an (angle, speed) offset of its own
+from OFFSETS, so no two followers of a leader move the same way. Offsets
+turn away from the leader's line, so members fan out rather than cross.
+A member only checks that one move for collisions. Members whose move
+is blocked, or would take them too far off their own heading, are
+navigated on their own, so the heading search runs once per cohort
+rather than once per ship.
+'''
+import math
+from collections import defaultdict
+
+import numpy as np
+
+from . import constants
+from .clusters import components
+from .entity import Ship
+
+#(degrees away from the leader's line, speed) added to the leader's thrust
+#for each member, by rank
+OFFSETS = ((0, 0), (0, -1), (6, 0), (6, -1), (12, 0), (0, -2), (12, -1), (6, -2),
+           (18, 0), (18, -1), (12, -2), (24, 0))
+#furthest a member's move may turn from its own heading, in degrees
+FOLLOW_ARC = 45
+
+
+class Cohorts:
+    '''
+    This turn's cohorts
+
+    :ivar cohort: Ship id -> cohort key, for ships in a cohort of two or more
+    :ivar leaders: Cohort key -> leader ship id
+    :ivar ranks: Ship id -> rank in its cohort by distance to the target
+                 (the leader's is 0)
+    :ivar routes: Cohort key -> (heading, x, y) of the leader's thrust this
+                  turn and where it started
+    '''
+    def __init__(self, link_radius=constants.MAX_SPEED):
+        self.link_radius = link_radius
+        self.cohort = {}
+        self.leaders = {}
+        self.ranks = {}
+        self.routes = {}
+
+    def build(self, gmap, gstate):
+        '''
+        Regroup my undocked miners and attackers by target and proximity
+        '''
+        self.cohort, self.leaders, self.ranks, self.routes = {}, {}, {}, {}
+        targets = {}
+        for sid in gstate.role_members[1]:
+            planet_id = gstate.ships_targets.get(sid)
+            if planet_id is not None:
+                targets[sid] = ('planet', gmap.get_planet(planet_id))
+        for sid, enem in gstate.attack_plan.targets.items():
+            targets[sid] = ('ship', enem)
+
+        groups = defaultdict(list)
+        me = gmap.get_me()
+        for sid, (kind, target) in targets.items():
+            ship = me.get_ship(sid)
+            if target is not None and ship is not None \
+                    and ship.docking_status is Ship.DockingStatus.UNDOCKED:
+                groups[(kind, target.id)].append(ship)
+
+        for key, ships in groups.items():
+            if len(ships) < 2:
+                continue
+            target = targets[ships[0].id][1]
+            labels = components(np.array([s.x for s in ships]),
+                                np.array([s.y for s in ships]), self.link_radius)
+            members = defaultdict(list)
+            for ship, label in zip(ships, labels):
+                members[label].append(ship)
+            for label, cohort in members.items():
+                if len(cohort) < 2:
+                    continue
+                cohort_key = key + (int(label),)
+                cohort.sort(key=target.calculate_distance_between)
+                self.leaders[cohort_key] = cohort[0].id
+                for rank, ship in enumerate(cohort):
+                    self.cohort[ship.id] = cohort_key
+                    self.ranks[ship.id] = rank
+
+    def is_leader(self, ship_id):
+        key = self.cohort.get(ship_id)
+        return key is not None and self.leaders[key] == ship_id
+
+    def follow(self, ship, goal_angle, vel):
+        '''
+        Move for ship on its cohort's route: the leader's heading at vel,
+        the speed ship would go at, plus the ship's offset
+
+        :return: (speed, angle), or None if ship has no route to follow
+                 this turn or it turns more than FOLLOW_ARC from goal_angle
+        '''
+        key = self.cohort.get(ship.id)
+        route = self.routes.get(key)
+        if route is None or self.leaders[key] == ship.id:
+            return None
+        heading, x, y = route
+        d_angle, d_speed = OFFSETS[(self.ranks[ship.id] - 1) % len(OFFSETS)]
+        #turn to the side of the leader's line the ship is on
+        a = math.radians(heading)
+        if math.cos(a)*(ship.y - y) - math.sin(a)*(ship.x - x) < 0:
+            d_angle = -d_angle
+        speed = vel + d_speed
+        angle = (heading + d_angle) % 360
+        if speed < 1 or abs((angle - goal_angle + 180) % 360 - 180) > FOLLOW_ARC:
+            return None
+        return speed, angle
+
+    def record(self, ship):
+        '''
+        Note ship's thrust as its cohort's route if it leads one
+        '''
+        if self.is_leader(ship.id) and ship.thrust_cmd and ship.thrust_cmd.magnitude:
+            self.routes[self.cohort[ship.id]] = (ship.thrust_cmd.angle, ship.x, ship.y)
@@ -1,3 +1,5 @@
+import math
+
 from .entity import Position, Entity
 
 
@@ -9,6 +11,18 @@ def intersect_segment_circle(start, end, circle, *, fudge=0.5):
     :param Entity end: The end of the line segment. (Needs x, y attributes)
     :param Entity circle: The circle to test against. (Needs x, y, r attributes)
     :param float fudge: A fudge factor; additional distance to leave between the segment and circle. (Probably set this to the ship radius, 0.5.)
+    :return: True if intersects, False otherwise
+    :rtype: bool
+    """
+    return intersect_segment_circle_xy(start.x, start.y, end.x, end.y,
+                                       circle.x, circle.y, circle.radius, fudge=fudge)
+
+
+def intersect_segment_circle_xy(x0, y0, x1, y1, cx, cy, radius, *, fudge=0.5):
+    """
+    intersect_segment_circle on plain coordinates, so callers testing many
+    candidate segments need not build an Entity for each.
+
     :return: True if intersects, False otherwise
     :rtype: bool
     """
@@ -16,25 +30,24 @@ def intersect_segment_circle(start, end, circle, *, fudge=0.5):
     # Parameterize the segment as start + t * (end - start),
     # and substitute into the equation of a circle
     # Solve for t
-    dx = end.x - start.x
-    dy = end.y - start.y
+    dx = x1 - x0
+    dy = y1 - y0
 
     a = dx*dx + dy*dy
-    b = -2 * (start.x*start.x- start.x*end.x - start.x*circle.x + end.x*circle.x +
-              start.y*start.y - start.y*end.y - start.y*circle.y + end.y*circle.y)
-    c = (start.x - circle.x)*(start.x - circle.x) + (start.y - circle.y)*(start.y - circle.y)
+    b = -2 * (x0*x0 - x0*x1 - x0*cx + x1*cx +
+              y0*y0 - y0*y1 - y0*cy + y1*cy)
 
     if a == 0.0:
         # Start and end are the same point
-        return start.calculate_distance_between(circle) <= circle.radius + fudge
+        return math.hypot(cx - x0, cy - y0) <= radius + fudge
 
     # Time along segment when closest to the circle (vertex of the quadratic)
     t = min(-b / (2 * a), 1.0)
     if t < 0:
         return False
 
-    closest_x = start.x + dx * t
-    closest_y = start.y + dy * t
-    closest_distance = Position(closest_x, closest_y).calculate_distance_between(circle)
+    closest_x = x0 + dx * t
+    closest_y = y0 + dy * t
+    closest_distance = math.hypot(cx - closest_x, cy - closest_y)
 
-    return closest_distance <= circle.radius + fudge
+    return closest_distance <= radius + fudge
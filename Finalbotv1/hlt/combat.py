@@ -0,0 +1,167 @@
+'''
+Batched combat estimates.
+
+simulate() plays a few turns of the weapon rules for many independent
+engagements at once. Each ship moves toward its nearest living opponent
+(docked ships stay put and don't fire), then every ship with a ready weapon
+splits WEAPON_DAMAGE evenly between the opponents within WEAPON_RADIUS.
+Damage is applied simultaneously, as in the engine.
+'''
+from collections import namedtuple
+
+import numpy as np
+
+from . import constants
+
+#reach of a weapon between ship centres
+_RANGE = constants.WEAPON_RADIUS + 2*constants.SHIP_RADIUS
+
+Outcome = namedtuple('Outcome', ['ally_survivors', 'enemy_survivors',
+                                 'ally_damage', 'enemy_damage',
+                                 'ally_count', 'enemy_count'])
+Outcome.__doc__ = '''
+Predicted result of one engagement: ships left standing on each side and
+the total damage each side takes, out of ally_count and enemy_count ships
+'''
+
+
+def favourable(outcome, margin=1.):
+    '''
+    Whether an engagement trades in our favour: the enemies take more than
+    margin times the damage we take (and anything at all when we take none)
+    '''
+    if outcome is None or not outcome.enemy_count:
+        return True
+    if outcome.ally_damage == 0:
+        return outcome.enemy_damage > 0 or outcome.ally_survivors >= outcome.enemy_survivors
+    return outcome.enemy_damage > margin*outcome.ally_damage
+
+
+def approach(x, y, mask, docked, ox, oy, alive_o, docked_o):
+    '''
+    Move every undocked ship toward its nearest living opponent, stopping
+    once inside weapon range (sharing the approach if the opponent moves too)
+    '''
+    d = np.hypot(x[:, :, None] - ox[:, None, :], y[:, :, None] - oy[:, None, :])
+    d = np.where(alive_o[:, None, :], d, np.inf)
+    near = np.argmin(d, axis=2)
+    dist = np.take_along_axis(d, near[:, :, None], axis=2)[:, :, 0]
+    tx = np.take_along_axis(ox, near, axis=1)
+    ty = np.take_along_axis(oy, near, axis=1)
+    move = mask & ~docked & np.isfinite(dist)
+    share = np.where(np.take_along_axis(docked_o, near, axis=1), 1., .5)
+    step = np.where(move, np.clip(share*(dist - _RANGE + 1.), 0., constants.MAX_SPEED), 0.)
+    safe = np.where(dist > 0, dist, 1.)
+    safe = np.where(np.isfinite(safe), safe, 1.)
+    return x + step*(tx - x)/safe, y + step*(ty - y)/safe
+
+
+def volley(d, shooters, targets):
+    '''
+    Damage each target takes from the shooters, split evenly per shooter
+    '''
+    hit = (d <= _RANGE) & shooters[:, :, None] & targets[:, None, :]
+    n = hit.sum(axis=2)
+    share = np.where(n > 0, constants.WEAPON_DAMAGE/np.maximum(n, 1), 0.)
+    return (hit*share[:, :, None]).sum(axis=1), n > 0
+
+
+def simulate(ally, enemy, turns=3):
+    '''
+    Resolve a batch of engagements.
+
+    ally and enemy are dicts of (B, N) and (B, K) arrays: x, y, health,
+    cooldown, docked (bool) and mask (bool, False for padding).
+
+    :return: dict of (B,) arrays: ally_survivors, enemy_survivors,
+             ally_damage, enemy_damage, ally_count, enemy_count
+    '''
+    ax, ay = ally['x'].astype(float), ally['y'].astype(float)
+    ex, ey = enemy['x'].astype(float), enemy['y'].astype(float)
+    ah, eh = ally['health'].astype(float), enemy['health'].astype(float)
+    acd, ecd = ally['cooldown'].astype(int), enemy['cooldown'].astype(int)
+    adock, edock = ally['docked'], enemy['docked']
+    amask, emask = ally['mask'], enemy['mask']
+    ah0, eh0 = np.where(amask, ah, 0.), np.where(emask, eh, 0.)
+
+    for _ in range(turns):
+        a_alive, e_alive = amask & (ah > 0), emask & (eh > 0)
+        if not (a_alive.any(axis=1) & e_alive.any(axis=1)).any():
+            break
+        ax, ay, ex, ey = approach(ax, ay, a_alive, adock, ex, ey, e_alive, edock) + \
+            approach(ex, ey, e_alive, edock, ax, ay, a_alive, adock)
+
+        d = np.hypot(ax[:, :, None] - ex[:, None, :], ay[:, :, None] - ey[:, None, :])
+        to_enemy, a_fired = volley(d, a_alive & ~adock & (acd <= 0), e_alive)
+        to_ally, e_fired = volley(d.transpose(0, 2, 1), e_alive & ~edock & (ecd <= 0), a_alive)
+        ah, eh = ah - to_ally, eh - to_enemy
+        acd = np.where(a_fired, constants.WEAPON_COOLDOWN, acd) - 1
+        ecd = np.where(e_fired, constants.WEAPON_COOLDOWN, ecd) - 1
+
+    ah, eh = np.where(amask, np.maximum(ah, 0.), 0.), np.where(emask, np.maximum(eh, 0.), 0.)
+    return {'ally_survivors': (amask & (ah > 0)).sum(axis=1),
+            'enemy_survivors': (emask & (eh > 0)).sum(axis=1),
+            'ally_damage': (ah0 - ah).sum(axis=1),
+            'enemy_damage': (eh0 - eh).sum(axis=1),
+            'ally_count': amask.sum(axis=1),
+            'enemy_count': emask.sum(axis=1)}
+
+
+def _gather(store, rows, members):
+    '''
+    Pad each batch entry's member rows into (B, N) arrays (plus 'row', the
+    store row behind each slot)
+    '''
+    ships = store.ships
+    width = max(int(members.sum(axis=1).max()) if len(members) else 0, 1)
+    #members first, in row order, then padding
+    order = np.argsort(~members, axis=1, kind='stable')[:, :width]
+    mask = np.take_along_axis(members, order, axis=1)
+    idx = rows[order]
+    side = {'x': ships.x[idx], 'y': ships.y[idx], 'health': ships.health[idx],
+            'cooldown': ships.cooldown[idx], 'docked': ships.docking[idx] != 0, 'mask': mask,
+            'row': idx}
+    return side
+
+
+def local_engagements(store, engage_radius=5 + 2*constants.MAX_SPEED,
+                      dock_radius=5 + 3*constants.MAX_SPEED, turns=3):
+    '''
+    Predict the fight around each of my undocked ships, all in one batch.
+
+    engage: my undocked ships and every enemy within engage_radius.
+    dock: the same enemies against all my ships within dock_radius, with
+    the ship itself counted as docked (it can't fire while docking).
+
+    :return: (engage, dock) dicts of ship id -> Outcome
+    '''
+    ships = store.ships
+    mine_rows = np.nonzero(store.mask('mine'))[0]
+    enem_rows = np.nonzero(store.mask('enemy'))[0]
+    query = mine_rows[ships.docking[mine_rows] == 0]
+    if not len(query) or not len(enem_rows):
+        return {}, {}
+
+    qx, qy = ships.x[query], ships.y[query]
+    d_mine = np.hypot(qx[:, None] - ships.x[mine_rows][None, :],
+                      qy[:, None] - ships.y[mine_rows][None, :])
+    d_enem = np.hypot(qx[:, None] - ships.x[enem_rows][None, :],
+                      qy[:, None] - ships.y[enem_rows][None, :])
+    undocked_mine = (ships.docking[mine_rows] == 0)[None, :]
+
+    enemies = d_enem <= engage_radius
+    engage_allies = (d_mine <= engage_radius) & undocked_mine
+    dock_allies = d_mine <= dock_radius
+
+    #one call: the engage batch stacked on the dock batch
+    allies = np.concatenate([engage_allies, dock_allies])
+    ally = _gather(store, mine_rows, allies)
+    n = len(query)
+    is_self = ally['mask'] & (ally['row'] == np.concatenate([query, query])[:, None])
+    ally['docked'] = ally['docked'] | (is_self & (np.arange(2*n) >= n)[:, None])
+    enemy = _gather(store, enem_rows, np.concatenate([enemies, enemies]))
+
+    result = simulate(ally, enemy, turns)
+    outcomes = [Outcome(*(result[f][i].item() for f in Outcome._fields)) for i in range(2*n)]
+    ids = [ships.objects[r].id for r in query]
+    return dict(zip(ids, outcomes[:n])), dict(zip(ids, outcomes[n:]))
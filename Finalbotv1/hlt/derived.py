@@ -0,0 +1,88 @@
+import time
+from collections import defaultdict
+
+
+def derived(*depends):
+    '''
+    Declare a lazily computed value on a class with a DerivedCache in
+    self.derived.
+
+    The decorated function runs the first time the value is read and its
+    result is kept until one of the names in depends changes: either a
+    source announced through DerivedCache.changed (e.g. 'turn', 'planets')
+    or another derived value.
+    '''
+    def wrap(func):
+        return DerivedValue(func, depends)
+    return wrap
+
+
+class DerivedValue:
+    '''
+    Descriptor for a derived value, see derived()
+    '''
+    def __init__(self, func, depends):
+        self.func = func
+        self.name = func.__name__
+        self.depends = depends
+        self.__doc__ = func.__doc__
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        return obj.derived.get(self, obj)
+
+    def __set__(self, obj, value):
+        raise AttributeError(self.name+' is derived, change its dependencies instead')
+
+
+class DerivedCache:
+    '''
+    Values and dependency graph of an object's derived values.
+
+    :ivar values: Derived name -> cached value
+    :ivar costs: Derived name -> seconds spent computing it this turn
+    '''
+    def __init__(self, cls):
+        self.values = {}
+        self.costs = defaultdict(float)
+        self.dependents = defaultdict(set) #name -> derived values depending on it
+        for value in vars(cls).values():
+            if isinstance(value, DerivedValue):
+                for name in value.depends:
+                    self.dependents[name].add(value.name)
+
+    def get(self, value, obj):
+        try:
+            return self.values[value.name]
+        except KeyError:
+            start = time.time()
+            result = value.func(obj)
+            self.costs[value.name] += time.time() - start
+            self.values[value.name] = result
+            return result
+
+    def changed(self, *names):
+        '''
+        Drop every cached value depending (directly or not) on names
+        '''
+        stack, seen = list(names), set()
+        while stack:
+            name = stack.pop()
+            for dependent in self.dependents[name]:
+                if dependent not in seen:
+                    seen.add(dependent)
+                    self.values.pop(dependent, None)
+                    stack.append(dependent)
+
+    def is_computed(self, name):
+        return name in self.values
+
+    def start_turn(self):
+        self.costs = defaultdict(float)
+
+    def stats(self):
+        '''
+        Derived values computed this turn and the seconds spent on each
+        '''
+        return {name: round(cost, 5) for name, cost in self.costs.items()}
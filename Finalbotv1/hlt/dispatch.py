@@ -0,0 +1,135 @@
+import logging
+
+from . import commands
+
+
+class Dispatcher:
+    '''
+    Builds the turn's command queue in a single pass over my ships.
+
+    Each ship is routed through the command function of its role. When a
+    ship changes role along the way (miner -> attacker, attacker -> miner,
+    miner -> flee, ...) it is handed straight to its new role's function
+    instead of waiting for another pass over every step, and only one
+    command per ship id ends up in the queue.
+
+    :ivar transitions: Role changes handled this turn
+    :ivar wasted: Commands built this turn and then replaced by a later one
+    '''
+    #roles in the order their steps used to run: attackers, miners,
+    #guardians, corners, flee
+    ROLE_ORDER = (2, 1, 4, 5, 6)
+    #guards against ships bouncing between roles within a turn
+    MAX_HOPS = 4
+
+    def __init__(self):
+        self.handlers = {1: commands.mine_ship,
+                         2: commands.atck_ship,
+                         4: commands.guar_ship,
+                         5: commands.corn_ship,
+                         6: commands.flee_ship}
+        self.transitions = 0
+        self.wasted = 0
+        self._issued = {}
+
+    def _role_lists(self, gstate):
+        return {1: gstate.ships_mine, 2: gstate.ships_atck, 4: gstate.ships_guar,
+                5: gstate.ships_corn, 6: gstate.ships_flee}
+
+    def _drain(self, gstate):
+        '''
+        Empty the State role lists (conversions append to them) and return
+        their contents in role order
+        '''
+        lists = self._role_lists(gstate)
+        queued = []
+        for role in self.ROLE_ORDER:
+            #back to front, as the step loops popped them
+            queued.extend(reversed(lists[role]))
+            del lists[role][:]
+        return queued
+
+    def _issue(self, sid, command):
+        if sid in self._issued:
+            self.wasted += 1
+        self._issued[sid] = command
+
+    def route(self, gmap, gstate, sid):
+        '''
+        Run one ship through its role's command function, following any role
+        changes it makes until it settles. A ship coming back to a role it
+        already took this turn is sent on the attack instead.
+        '''
+        role = gstate.get_ship_role(sid)
+        visited = set()
+        for _ in range(self.MAX_HOPS):
+            if role in visited:
+                logging.warning('Dispatcher: ship '+str(sid)+' back to role '+str(role)
+                                +', attacking instead')
+                self._fallback(gmap, gstate, sid)
+                return
+            visited.add(role)
+            handler = self.handlers.get(role)
+            if handler is None:
+                return
+            command = handler(gmap, gstate, sid)
+            if command:
+                self._issue(sid, command)
+            new_role = gstate.get_ship_role(sid)
+            #drop the appends the handler made for the old step loops
+            self._drain(gstate)
+            if new_role == role:
+                return
+            self.transitions += 1
+            role = new_role
+        logging.warning('Dispatcher: ship '+str(sid)+' still changing role after '
+                        +str(self.MAX_HOPS)+' hops')
+        self._fallback(gmap, gstate, sid)
+
+    def _fallback(self, gmap, gstate, sid):
+        '''
+        Make ship sid an attacker and issue its attack move, if it has no
+        command yet
+        '''
+        if sid in self._issued:
+            return
+        gstate.ships_unplaced.add(sid)
+        if gstate.get_ship_role(sid) != 2:
+            gstate.set_ship_role(sid, 2)
+        command = commands.atck_ship(gmap, gstate, sid)
+        self._drain(gstate)
+        if command:
+            self._issue(sid, command)
+
+    def run(self, gmap, gstate):
+        '''
+        Build the command queue for this turn, one command per ship id
+        '''
+        self.transitions = 0
+        self.wasted = 0
+        self._issued = {}
+
+        for command in commands.sqrn_step(gstate):
+            self._issue(int(command.split()[1]), command)
+
+        #cohort leaders go first within their role, so the rest can follow
+        #the heading they find
+        gstate.cohorts.build(gmap, gstate)
+        rank = {role: i for i, role in enumerate(self.ROLE_ORDER)}
+        queued = sorted(self._drain(gstate),
+                        key=lambda sid: (rank.get(gstate.get_ship_role(sid), len(rank)),
+                                         not gstate.cohorts.is_leader(sid)))
+
+        done = set(self._issued)
+        for sid in queued:
+            if sid in done:
+                continue
+            done.add(sid)
+            self.route(gmap, gstate, sid)
+
+        gstate.profiler.count('role_transitions', self.transitions)
+        gstate.profiler.count('wasted_navigations', self.wasted)
+        logging.info('Dispatcher: '+str(len(self._issued))+' commands, '
+                     +str(self.transitions)+' role transitions, '
+                     +str(self.wasted)+' wasted navigations')
+        return list(self._issued.values())
@@ -0,0 +1,79 @@
+'''
+Docking safety forecasts.
+
+A ship that starts docking is a sitting target for DOCK_TURNS turns (and
+for good once docked). DockingForecast works out, for all my undocked ships
+at once, when each enemy could first get within weapon range of it and
+when each of my other ships could get there to defend it.
+'''
+import math
+from collections import namedtuple
+
+import numpy as np
+
+from . import constants
+
+#reach of a weapon between ship centres
+_RANGE = constants.WEAPON_RADIUS + 2*constants.SHIP_RADIUS
+
+Safety = namedtuple('Safety', ['threats', 'earliest', 'defenders', 'score'])
+Safety.__doc__ = '''
+Docking forecast for one ship: enemies that can reach weapon range within
+the horizon, the turn the first one does (inf if none), my ships that can
+get there by then, and score = (defenders + 1)/(threats + 1), where a
+score of 1 or more means every threat can be met.
+'''
+
+_SAFE = Safety(0, math.inf, 0, math.inf)
+
+
+def _reach_turns(x, y, tx, ty):
+    '''
+    Turns needed to get within weapon range of (tx, ty) at MAX_SPEED
+    '''
+    d = np.hypot(tx - x, ty - y)
+    return np.ceil(np.maximum(d - _RANGE, 0.)/constants.MAX_SPEED)
+
+
+class DockingForecast:
+    '''
+    Batch docking forecast for every undocked ship of mine, built from the
+    entity store. Enemy velocities (last turn's move) decide how an enemy
+    is timed: one closing in gets there at MAX_SPEED from where it is,
+    one heading elsewhere is assumed to finish this turn's move first.
+    '''
+    def __init__(self, store):
+        ships = store.ships
+        mine = np.nonzero(store.mask('mine') & store.mask('undocked'))[0]
+        enems = np.nonzero(store.mask('enemy') & store.mask('undocked'))[0]
+        self.index = {ships.objects[r].id: i for i, r in enumerate(mine)}
+
+        cx, cy = ships.x[mine][:, None], ships.y[mine][:, None]
+        ex, ey = ships.x[enems][None, :], ships.y[enems][None, :]
+        vx = (ships.x[enems] - ships.px[enems])[None, :]
+        vy = (ships.y[enems] - ships.py[enems])[None, :]
+
+        #enemies closing on a ship are timed from where they are now
+        closing = (cx - ex)*vx + (cy - ey)*vy > 0
+        direct = _reach_turns(ex, ey, cx, cy)
+        detour = 1 + _reach_turns(ex + vx, ey + vy, cx, cy)
+        enemy = np.where(closing, direct, np.minimum(detour, direct + 1))
+        self.enemy_reach = np.sort(enemy, axis=1)
+
+        friend = _reach_turns(cx.T, cy.T, cx, cy)
+        np.fill_diagonal(friend, np.inf)
+        self.friend_reach = np.sort(friend, axis=1)
+
+    def safety(self, ship_id, horizon=constants.DOCK_TURNS):
+        '''
+        Return the Safety forecast of docking ship_id now, counting enemies
+        that can reach it within horizon turns
+        '''
+        i = self.index.get(ship_id)
+        if i is None:
+            return _SAFE
+        threats = int(np.searchsorted(self.enemy_reach[i], horizon, side='right'))
+        earliest = float(self.enemy_reach[i][0]) if threats else math.inf
+        defenders = int(np.searchsorted(self.friend_reach[i],
+                                        earliest if threats else horizon, side='right'))
+        return Safety(threats, earliest, defenders, (defenders + 1.)/(threats + 1.))
@@ -0,0 +1,142 @@
+'''
+Docking ring slots.
+
+Miners aiming for the point of their planet nearest to them bunch up there.
+Instead every planet gets a ring of slots RING_GAP outside its surface,
+inside docking range. Docking ships hold the slot they sit on and each
+incoming miner reserves a free one and heads for it.
+'''
+import math
+
+from . import constants
+from .entity import Position, Ship
+from .events import PlanetDestroyed, ShipDestroyed, ShipDockingChanged
+
+#distance of the ring from the planet's surface, inside DOCK_RADIUS
+RING_GAP = constants.DOCK_RADIUS/2
+#arc length between neighbouring slots
+SLOT_SPACING = 4*constants.SHIP_RADIUS
+
+
+class Ring:
+    '''
+    Slots around one planet, indexed by angle
+
+    :ivar holders: Slot -> id of the ship docked on or reserving it, or None
+    '''
+    def __init__(self, planet):
+        self.x, self.y = planet.x, planet.y
+        self.radius = planet.radius + RING_GAP
+        self.n = max(planet.num_docking_spots, int(2*math.pi*self.radius/SLOT_SPACING))
+        self.step = 360./self.n
+        self.holders = [None]*self.n
+
+    def index(self, x, y):
+        '''
+        Slot nearest the direction of (x, y) from the planet
+        '''
+        angle = math.degrees(math.atan2(y - self.y, x - self.x)) % 360
+        return int(round(angle/self.step)) % self.n
+
+    def position(self, i):
+        angle = math.radians(i*self.step)
+        return Position(self.x + self.radius*math.cos(angle), self.y + self.radius*math.sin(angle))
+
+    def nearest_free(self, x, y):
+        '''
+        Free slot closest in angle to (x, y), or None if all are taken
+        '''
+        i0 = self.index(x, y)
+        for k in range(self.n//2 + 1):
+            for i in ((i0 + k) % self.n, (i0 - k) % self.n):
+                if self.holders[i] is None:
+                    return i
+        return None
+
+
+class DockRings:
+    '''
+    Rings of every planet, kept up to date from the map events
+
+    :ivar slots: Ship id -> (planet id, slot, docked)
+    '''
+    def __init__(self):
+        self.rings = {} #planet id -> Ring, built on first use
+        self.slots = {}
+
+    def ring(self, planet):
+        ring = self.rings.get(planet.id)
+        if ring is None:
+            ring = self.rings[planet.id] = Ring(planet)
+        return ring
+
+    def update(self, gmap, rebuild=False):
+        '''
+        Apply this turn's docking changes, or take them all from the map
+        '''
+        if rebuild:
+            self.rings, self.slots = {}, {}
+            for player in gmap.all_players():
+                for ship in player.all_ships():
+                    if ship.docking_status is not Ship.DockingStatus.UNDOCKED:
+                        self.occupy(ship)
+            return
+
+        for event in gmap.events:
+            if isinstance(event, ShipDockingChanged):
+                if event.new is Ship.DockingStatus.UNDOCKED:
+                    self.release(event.ship_id)
+                elif event.old is Ship.DockingStatus.UNDOCKED:
+                    self.occupy(gmap.get_player(event.owner).get_ship(event.ship_id))
+            elif isinstance(event, ShipDestroyed):
+                self.release(event.ship_id)
+            elif isinstance(event, PlanetDestroyed):
+                ring = self.rings.pop(event.planet_id, None)
+                for sid in (ring.holders if ring else ()):
+                    if sid is not None:
+                        del self.slots[sid]
+
+    def occupy(self, ship):
+        '''
+        Give a docking ship the slot it sits on, moving out whoever had
+        reserved it
+        '''
+        if ship.planet is None:
+            return
+        self.release(ship.id)
+        ring = self.ring(ship.planet)
+        i = ring.index(ship.x, ship.y)
+        holder = ring.holders[i]
+        if holder is not None:
+            del self.slots[holder]
+        ring.holders[i] = ship.id
+        self.slots[ship.id] = (ship.planet.id, i, True)
+
+    def release(self, ship_id, reserved_only=False):
+        '''
+        Free ship_id's slot (only if merely reserved, with reserved_only)
+        '''
+        entry = self.slots.get(ship_id)
+        if entry is None or (reserved_only and entry[2]):
+            return
+        del self.slots[ship_id]
+        ring = self.rings.get(entry[0])
+        if ring is not None and ring.holders[entry[1]] == ship_id:
+            ring.holders[entry[1]] = None
+
+    def slot(self, ship, planet):
+        '''
+        Position of the slot ship should dock from at planet, reserving the
+        free one nearest to it on first call (planet itself if the ring is full)
+        '''
+        ring = self.ring(planet)
+        entry = self.slots.get(ship.id)
+        if entry is not None and entry[0] == planet.id:
+            return ring.position(entry[1])
+        self.release(ship.id)
+        i = ring.nearest_free(ship.x, ship.y)
+        if i is None:
+            return planet
+        ring.holders[i] = ship.id
+        self.slots[ship.id] = (planet.id, i, False)
+        return ring.position(i)
@@ -1,10 +1,18 @@
 import logging
 import math
 
-from . import collision, constants
+from . import collision, combat, constants, formation
+from .events import (PlanetDestroyed, PlanetDockedChanged, PlanetOwnerChanged,
+                     ShipDestroyed, ShipDockingChanged, ShipSpawned)
 import abc
 from enum import Enum
 
+#(angular_step, iterations) passes tried by Ship.navigate_tiers
+_TIERS = ((3, 20), (6, 20), (18, 20))
+_SQUADRON_TIERS = ((1, 60), (3, 60), (6, 60))
+#the straight line and then the potential field's moves, no sweep
+_FIELD_TIERS = ((3, 0),)
+
 
 class Entity:
     """
@@ -20,6 +28,7 @@ class Entity:
     :ivar owner: The player ID of the owner, if any. If None, Entity is not owned.
     """
     __metaclass__ = abc.ABCMeta
+    __slots__ = ('x', 'y', 'radius', 'health', 'owner', 'id')
 
     def _init__(self, x, y, radius, health, player, entity_id):
         self.x = x
@@ -93,6 +102,8 @@ class Planet(Entity):
     :ivar owner: The player ID of the owner, if any. If None, Entity is not owned.
 
     """
+    __slots__ = ('num_docking_spots', 'current_production', 'remaining_resources',
+                 '_docked_ship_ids', '_docked_ships', '_docked_view', 'row')
 
     def __init__(self, planet_id, x, y, hp, radius, docking_spots, current,
                  remaining, owned, owner, docked_ships):
@@ -107,6 +118,8 @@ class Planet(Entity):
         self.owner = owner if bool(int(owned)) else None
         self._docked_ship_ids = docked_ships
         self._docked_ships = {}
+        self._docked_view = None
+        self.row = -1
 
     def get_docked_ship(self, ship_id):
         """
@@ -120,12 +133,14 @@ class Planet(Entity):
 
     def all_docked_ships(self):
         """
-        The list of all ships docked into the planet
+        The ships docked into the planet
 
-        :return: The list of all ships docked
-        :rtype: list[Ship]
+        :return: All ships docked (cached, do not modify)
+        :rtype: tuple[Ship]
         """
-        return list(self._docked_ships.values())
+        if self._docked_view is None:
+            self._docked_view = tuple(self._docked_ships.values())
+        return self._docked_view
 
     def is_owned(self):
         """
@@ -156,12 +171,15 @@ class Planet(Entity):
             self.owner = players.get(self.owner)
             for ship in self._docked_ship_ids:
                 self._docked_ships[ship] = self.owner.get_ship(ship)
+        self._docked_view = None
 
     @staticmethod
-    def _parse_single(tokens):
+    def _parse_single(tokens, pool=None, events=None):
         """
         Parse a single planet given tokenized input from the game environment.
 
+        :param dict[int, Planet] pool: Last turn's planets; the object for this id is reused (and removed)
+        :param list events: If given, ownership and docking changes are appended to it
         :return: The planet ID, planet object, and unused tokens.
         :rtype: (int, Planet, list[str])
         """
@@ -175,7 +193,19 @@ class Planet(Entity):
             ship_id, *remainder = remainder
             docked_ships.append(int(ship_id))
 
-        planet = Planet(int(plid),
+        #reuse last turn's object for this id, if any
+        planet = pool.pop(plid, None) if pool else None
+        if planet is None:
+            planet = Planet.__new__(Planet)
+        elif events is not None:
+            old_owner = planet.owner.id if planet.owner is not None else None
+            new_owner = int(owner) if bool(int(owned)) else None
+            if old_owner != new_owner:
+                events.append(PlanetOwnerChanged(plid, old_owner, new_owner))
+            if len(planet._docked_ship_ids) != len(docked_ships):
+                events.append(PlanetDockedChanged(plid, len(planet._docked_ship_ids),
+                                                  len(docked_ships)))
+        Planet.__init__(planet, int(plid),
                         float(x), float(y),
                         int(hp), float(r), int(docking),
                         int(current), int(remaining),
@@ -185,22 +215,28 @@ class Planet(Entity):
         return plid, planet, remainder
 
     @staticmethod
-    def _parse(tokens):
+    def _parse(tokens, pool=None, events=None):
         """
         Parse planet data given a tokenized input.
 
         :param list[str] tokens: The tokenized input
+        :param dict[int, Planet] pool: Last turn's planets, whose objects are reused
+        :param list events: If given, planet events are appended to it
         :return: the populated planet dict and the unused tokens.
         :rtype: (dict, list[str])
         """
         num_planets, *remainder = tokens
         num_planets = int(num_planets)
         planets = {}
+        pool = dict(pool) if pool else None
 
         for _ in range(num_planets):
-            plid, planet, remainder = Planet._parse_single(remainder)
+            plid, planet, remainder = Planet._parse_single(remainder, pool, events)
             planets[plid] = planet
 
+        if pool and events is not None:
+            for plid in pool:
+                events.append(PlanetDestroyed(plid))
         return planets, remainder
 
 
@@ -224,6 +260,9 @@ class Ship(Entity):
         DOCKED = 2
         UNDOCKING = 3
 
+    __slots__ = ('docking_status', 'planet', '_docking_progress', '_weapon_cooldown',
+                 'thrust_cmd', 'role', 'nav_blocker', 'row', '_parsed_docking')
+
     def __init__(self, player_id, ship_id, x, y, hp, vel_x, vel_y,
                  docking_status, planet, progress, cooldown):
         self.id = ship_id
@@ -233,12 +272,16 @@ class Ship(Entity):
         self.radius = constants.SHIP_RADIUS
         self.health = hp
         self.docking_status = docking_status
+        #as the engine last sent it; docking_status may be changed by commands
+        self._parsed_docking = docking_status
         self.planet = planet if (docking_status is not Ship.DockingStatus.UNDOCKED) else None
         self._docking_progress = progress
         self._weapon_cooldown = cooldown
 
         self.thrust_cmd = None
         self.role = 0
+        self.nav_blocker = None
+        self.row = -1
 
     def thrust(self, magnitude, angle):
         """
@@ -331,7 +374,14 @@ class Ship(Entity):
         '''
         aux_list = undocked enemies
         '''
-        closest_point_target = self.closest_point_to(target)
+        #seed the heading search from the shared flow field toward target
+        seeds = gstate.flows.seeds(target, self)
+        #aim for this ship's own docking slot, not the planet's nearest point
+        if isinstance(target, Planet):
+            target = gstate.dock_rings.slot(self, target)
+        #head for the next waypoint around any planets in the way
+        target = gstate.paths.next_waypoint(self, target)
+        closest_point_target = game_map.geometry.closest_point(self, target)
         dist_to_closest = self.calculate_distance_between(closest_point_target)
 
         angle = self.calculate_angle_between(closest_point_target)
@@ -342,127 +392,221 @@ class Ship(Entity):
 
         #Find nearest enem ships
         nearby_enems = [e for e in gstate.undocked_enems
-                        if self.calculate_distance_between(e) <= 5 + constants.MAX_SPEED]
+                        if game_map.geometry.distance(self, e) <= 5 + constants.MAX_SPEED]
         nearby_allies = [s for s in game_map.get_me().all_ships()
                          if (s.role == 1 or s.role == 2)
-                         and self.calculate_distance_between(s) <= 5 + constants.MAX_SPEED]
+                         and game_map.geometry.distance(self, s) <= 5 + constants.MAX_SPEED]
         #if there are nearby enemies, and outnumbered, evade them
         if nearby_enems and (len(nearby_enems) >= len(nearby_allies)):
             #add enemy thrust vectors to target vector
             #assume enemy thrusts toward my ship
+            x, y = new_target.x, new_target.y
             for e in nearby_enems:
-                e_angl = e.calculate_angle_between(self)
+                e_angl = game_map.geometry.angle(e, self)
                 e_magn = constants.MAX_SPEED
-                new_target = new_target + Position(math.cos(math.radians(e_angl))*e_magn,
-                                                   math.sin(math.radians(e_angl))*e_magn)
-            closest_point_target = self.closest_point_to(new_target)
-            dist_to_closest = self.calculate_distance_between(closest_point_target)
-
-            angle = self.calculate_angle_between(closest_point_target)
-            vel = speed if (dist_to_closest >= speed) else int(dist_to_closest)
-            new_target_dx = math.cos(math.radians(angle)) * vel
-            new_target_dy = math.sin(math.radians(angle)) * vel
-            new_target = Position(self.x + new_target_dx, self.y + new_target_dy)
-            t = self.navigate_iter(game_map, new_target, vel, 3, 20)
-            if t is None:
-                t = self.navigate_iter(game_map, new_target, vel, 6, 20)
-            if t is None:
-                t = self.navigate_iter(game_map, new_target, vel, 18, 20)
-            if t is None:
-                return self.thrust(0, 0)
-            else:
-                return t
+                x += math.cos(math.radians(e_angl))*e_magn
+                y += math.sin(math.radians(e_angl))*e_magn
+            vel, x, y = self._step_toward(x, y, 0, speed)
+            new_target = Position(x, y)
+            return self.navigate_tiers(game_map, gstate, new_target, vel, _TIERS)
         #else attack docked enemies
         else:
             vel = distance
-            t = self.navigate_iter(game_map, new_target, vel, 3, 20, aux_list=nearby_enems)
-            if t is None:
-                vel = max(vel-2, 1)
-                t = self.navigate_iter(game_map, new_target, vel, 6, 20, aux_list=nearby_enems)
-            if t is None:
-                vel = max(vel-2, 1)
-                t = self.navigate_iter(game_map, new_target, vel, 18, 20, aux_list=nearby_enems)
-            if t is None:
-                return self.thrust(0, 0)
-            else:
-                return t
+            return self.navigate_tiers(game_map, gstate, new_target, vel, _TIERS,
+                                       slow_down=True, aux_list=nearby_enems, seeds=seeds)
 
-    def navigate_iter(self, gmap, target, vel, angular_step, iter, aux_list=[], ignore_list=[]):
+    def navigate_iter(self, gmap, target, vel, angular_step, iter, aux_list=[], ignore_list=[],
+                      seeds=()):
         '''
+        Sweep headings around the direction of target, alternating sides with
+        growing steps, and return the first thrust without conflicts.
+
+        seeds are preferred headings (e.g. from a flow field), tried once the
+        straight line has failed and before the sweep.
         '''
         angle_coef = 0
         max_corrections = iter
+        #candidates are plain floats, only the first one is the caller's target
+        tx, ty = target.x, target.y
         while max_corrections >= 0:
-            angle = self.calculate_angle_between(target)
-
-            test_thrust = Thrust(self, vel, angle)
-            thrust_conflict = self.thrust_overlap(gmap, test_thrust)
-
-            ignore = ()
-            obstacles = gmap.obstacles_between(self, target, ignore)
-            if ignore_list:
-                obstacles = [o for o in obstacles if o not in ignore_list]
-
-            if aux_list and (self.role == 1  or self.role == 2 or self.role == 3):
-                aux_conflict = self.evade_enems(gmap, test_thrust, aux_list)
-            else:
-                aux_conflict = False
-
-            if any([obstacles, thrust_conflict, aux_conflict]):
-                new_target_dx = math.cos(math.radians(angle
-                                                      + angle_coef*angular_step))*vel
-                new_target_dy = math.sin(math.radians(angle
-                                                      + angle_coef*angular_step))*vel
-                target = Position(self.x + new_target_dx, self.y + new_target_dy)
-
-                max_corrections += -1
-                angle_coef = (abs(angle_coef) + 1) * (-1)**(max_corrections)
-            else:
+            angle = math.degrees(math.atan2(ty - self.y, tx - self.x)) % 360
+
+            conflict = self._move_conflicts_xy(gmap, tx, ty, vel, angle, aux_list, ignore_list,
+                                               target)
+            if not conflict:
                 return self.thrust(vel, angle)
+            if self.nav_blocker is None:
+                self.nav_blocker = conflict
+            target = None
+
+            for seed in seeds:
+                sx = self.x + math.cos(math.radians(seed))*vel
+                sy = self.y + math.sin(math.radians(seed))*vel
+                if not self._move_conflicts_xy(gmap, sx, sy, vel, seed, aux_list, ignore_list):
+                    return self.thrust(vel, seed)
+            seeds = ()
+
+            tx = self.x + math.cos(math.radians(angle + angle_coef*angular_step))*vel
+            ty = self.y + math.sin(math.radians(angle + angle_coef*angular_step))*vel
+
+            max_corrections += -1
+            angle_coef = (abs(angle_coef) + 1) * (-1)**(max_corrections)
 
         return None
 
+    def move_conflicts(self, gmap, target, vel, angle, aux_list=[], ignore_list=[]):
+        '''
+        Check a candidate move against friendly thrusts, obstacles and
+        (for miners and attackers) the predicted moves of aux_list enemies
+
+        :return: None if the move is fine, else what it runs into, e.g.
+                 ('friendly', None), ('planet', 3), ('edge', None) or ('enemy', None)
+        '''
+        return self._move_conflicts_xy(gmap, target.x, target.y, vel, angle, aux_list,
+                                       ignore_list, target)
+
+    def _move_conflicts_xy(self, gmap, tx, ty, vel, angle, aux_list=[], ignore_list=[],
+                           target=None):
+        '''
+        move_conflicts for a candidate end point (tx, ty), without building a
+        Position or Thrust for it
+        '''
+        vx = vel*math.cos(math.radians(angle))
+        vy = vel*math.sin(math.radians(angle))
+        if self._overlap_xy(gmap, self.x, self.y, vx, vy):
+            return ('friendly', None)
+
+        o = gmap.first_obstacle_xy(self, tx, ty, target, ignore_list)
+        if o is not None:
+            return (o.__class__.__name__.lower(), o.id)
+        if gmap.out_of_bounds_xy(tx, ty):
+            return ('edge', None)
+
+        if aux_list and (self.role == 1  or self.role == 2 or self.role == 3):
+            if self._evade_xy(gmap, self.x, self.y, vx, vy, aux_list):
+                return ('enemy', None)
+        return None
+
+    def _step_toward(self, x, y, radius, speed, min_distance=1):
+        '''
+        Float version of closest_point_to (x, y, radius) followed by the speed
+        clamp every navigate_* uses
+
+        :return: (vel, x, y) of the step toward that point
+        '''
+        a = math.atan2(self.y - y, self.x - x)
+        r = radius + min_distance
+        px, py = x + r*math.cos(a), y + r*math.sin(a)
+        dist = math.hypot(px - self.x, py - self.y)
+        angle = math.atan2(py - self.y, px - self.x)
+        vel = speed if (dist >= speed) else int(dist)
+        return vel, self.x + math.cos(angle)*vel, self.y + math.sin(angle)*vel
+
+    def navigate_tiers(self, gmap, gstate, target, vel, tiers, slow_down=False,
+                       aux_list=[], ignore_list=[], seeds=()):
+        '''
+        Run navigate_iter over (angular_step, iterations) tiers, slowing down
+        by 2 between tiers if slow_down, and stop (thrust(0, 0)) if all fail.
+
+        Warm started from the ship's navigation memory: last turn's detour
+        is the first heading tried after the straight line, and a ship that
+        failed every tier last turn from the same spot toward the same
+        heading stops straight away.
+
+        A ship following its cohort's leader (see hlt.cohort) only checks
+        its move along the cohort's route, and searches as above if that
+        move is blocked.
+        '''
+        self.nav_blocker = None
+        goal_angle = self.calculate_angle_between(target)
+        follow = gstate.cohorts.follow(self, goal_angle, vel)
+        if follow is not None:
+            speed, angle = follow
+            fx = self.x + math.cos(math.radians(angle))*speed
+            fy = self.y + math.sin(math.radians(angle))*speed
+            if not self._move_conflicts_xy(gmap, fx, fy, speed, angle, aux_list, ignore_list):
+                gstate.nav_stats['cohort'] += 1
+                gstate.nav_record(self, goal_angle, blocked=False, blocker=None)
+                return self.thrust(speed, angle)
+        memory = gstate.nav_recall(self)
+
+        warm = None
+        if memory is not None:
+            if memory.should_skip(gstate.turn, self, goal_angle):
+                gstate.nav_stats['skipped'] += 1
+                return self.thrust(0, 0)
+            if memory.blocked and memory.magnitude:
+                warm = memory.warm_angle(goal_angle)
+        seeds = ([] if warm is None else [warm]) + list(seeds)
+
+        for i, (angular_step, iterations) in enumerate(tiers):
+            if i and slow_down:
+                vel = max(vel-2, 1)
+            t = self.navigate_iter(gmap, target, vel, angular_step, iterations,
+                                   aux_list=aux_list, ignore_list=ignore_list, seeds=seeds)
+            if t is not None:
+                gstate.nav_record(self, goal_angle, blocked=self.nav_blocker is not None,
+                                  blocker=self.nav_blocker,
+                                  warm=warm is not None and self.thrust_cmd.angle == round(warm))
+                gstate.cohorts.record(self)
+                return t
+
+        gstate.nav_record(self, goal_angle, blocked=True, blocker=self.nav_blocker,
+                          failed=True)
+        return self.thrust(0, 0)
+
     def navigate_attacker(self, target, game_map, gstate, speed, avoid_obstacles=True,
                           max_corrections=90, angular_step=1, ignore_ships=False,
                           ignore_planets=False, aux_list=[], aux_list2=[]):
         '''
 
         '''
+        #in an active fight, take the first move of the skirmish search's
+        #best line (see hlt.skirmish)
+        move = gstate.skirmishes.move(self)
+        if move is not None:
+            vel = int(self.calculate_distance_between(move))
+            if not vel:
+                return self.thrust(0, 0)
+            return self.navigate_tiers(game_map, gstate, move, vel, _TIERS, slow_down=True)
+
         #Find nearby enem ships
         nearby_enems = [e for e in gstate.undocked_enems
-                        if self.calculate_distance_between(e) <= 5 + 2*constants.MAX_SPEED]
+                        if game_map.geometry.distance(self, e) <= 5 + 2*constants.MAX_SPEED]
 
-        #if not closest ship to target, go to closest ship
-        if self.id != gstate.enem_nearest_atck[target.id]:
-            target = game_map.get_me().get_ship(gstate.enem_nearest_atck[target.id])
+        #if not leading the attack on target, go to the lead attacker
+        lead = gstate.attack_plan.leads.get(target.id, self.id)
+        if self.id != lead:
+            target = game_map.get_me().get_ship(lead)
             if target.thrust_cmd:
                 target = Position(target.thrust_cmd.x1, target.thrust_cmd.y1)
                 target.radius = constants.SHIP_RADIUS
         #else wait for reinforcements before attacking
         else:
+            #chase where the target will be when we can reach it
+            if target.docking_status is Ship.DockingStatus.UNDOCKED:
+                target = gstate.intercepts.point(self.id, target)
             if nearby_enems:
-                #Find nearby ally ships
-                nearby_allies = [s for s in game_map.get_me().all_ships()
-                                 if s.role == 2
-                                 and self.calculate_distance_between(s) <= 5]
-                if len(nearby_enems) >= .8*len(nearby_allies):
+                #engage only if the local fight is predicted to go our way
+                engage, _ = gstate.engagements
+                if not combat.favourable(engage.get(self.id), margin=1.25):
                     #find nearest ally not in nearby_allies
                     far_allies = [s for s in game_map.get_me().all_ships()
                                   if s.role == 2
-                                  and self.calculate_distance_between(s) > 5]
+                                  and game_map.geometry.distance(self, s) > 5]
                     #If no allied undocked ships, head for the docks
                     if not far_allies:
                         far_allies = [s for s in game_map.get_me().all_ships()
                                       if s.role == 1]
                     #Else move to nearest undocked ally
                     else:
-                        target = min(far_allies, key=self.calculate_distance_between)
+                        target = min(far_allies, key=game_map.geometry.distance_from(self))
                         #Aim for their future position
                         if target.thrust_cmd:
                             target = Position(target.thrust_cmd.x1, target.thrust_cmd.y1)
                             target.radius = constants.SHIP_RADIUS
 
-        closest_point_target = self.closest_point_to(target)
+        closest_point_target = game_map.geometry.closest_point(self, target)
         dist_to_closest = self.calculate_distance_between(closest_point_target)
         #backtrack from moving enemy ships
         # if isinstance(target, Ship) and (target.docking_status is Ship.DockingStatus.UNDOCKED) \
@@ -482,17 +626,8 @@ class Ship(Entity):
         new_target_dy = math.sin(math.radians(angle))*vel
         new_target = Position(self.x + new_target_dx, self.y + new_target_dy)
 
-        t = self.navigate_iter(game_map, new_target, vel, 3, 20, aux_list=nearby_enems)
-        if t is None:
-            vel = max(vel-2, 1)
-            t = self.navigate_iter(game_map, new_target, vel, 6, 20, aux_list=nearby_enems)
-        if t is None:
-            vel = max(vel-2, 1)
-            t = self.navigate_iter(game_map, new_target, vel, 18, 20, aux_list=nearby_enems)
-        if t is None:
-            return self.thrust(0, 0)
-        else:
-            return t
+        return self.navigate_tiers(game_map, gstate, new_target, vel, _TIERS,
+                                   slow_down=True, aux_list=nearby_enems)
 
     def navigate_squadron(self, target, game_map, gstate, speed, avoid_obstacles=True,
                           max_corrections=90, angular_step=1, ignore_ships=False, 
@@ -503,7 +638,7 @@ class Ship(Entity):
         Hunt down target player while avoiding collisions with moving enemy ships.
         '''
         
-        closest_point_target = self.closest_point_to(target)
+        closest_point_target = game_map.geometry.closest_point(self, target)
         dist_to_closest = self.calculate_distance_between(closest_point_target)
         
         angle = self.calculate_angle_between(closest_point_target)
@@ -513,19 +648,11 @@ class Ship(Entity):
         new_target = Position(self.x + new_target_dx, self.y + new_target_dy)
         
         nearby_enems = [e for e in aux_list2
-                        if self.calculate_distance_between(e) <= 2*constants.MAX_SPEED]
-
-        t = self.navigate_iter(game_map, new_target, vel, 1, 60, nearby_enems, ignore_list=ignore_list)
-        if t is None:
-            vel = max(vel-2, 1)
-            t = self.navigate_iter(game_map, new_target, vel, 3, 60, nearby_enems, ignore_list=ignore_list)
-        if t is None:
-            vel = max(vel-2, 1)
-            t = self.navigate_iter(game_map, new_target, vel, 6, 60, nearby_enems, ignore_list=ignore_list)
-        if t is None:
-            return self.thrust(0, 0)
-        else:
-            return t
+                        if game_map.geometry.distance(self, e) <= 2*constants.MAX_SPEED]
+
+        return self.navigate_tiers(game_map, gstate, new_target, vel, _SQUADRON_TIERS,
+                                   slow_down=True, aux_list=nearby_enems,
+                                   ignore_list=ignore_list)
 
     def navigate_guardian(self, target, game_map, gstate, speed, avoid_obstacles=True,
                           max_corrections=90, angular_step=1, ignore_ships=False,
@@ -533,7 +660,7 @@ class Ship(Entity):
         '''
 
         '''
-        closest_point_target = self.closest_point_to(target)
+        closest_point_target = game_map.geometry.closest_point(self, target)
         dist_to_closest = self.calculate_distance_between(closest_point_target)
 
         angle = self.calculate_angle_between(closest_point_target)
@@ -543,17 +670,8 @@ class Ship(Entity):
         new_target = Position(self.x + new_target_dx, self.y + new_target_dy)
 
         vel = distance
-        t = self.navigate_iter(game_map, new_target, vel, 3, 20)
-        if t is None:
-            vel = max(vel-2, 1)
-            t = self.navigate_iter(game_map, new_target, vel, 6, 20)
-        if t is None:
-            vel = max(vel-2, 1)
-            t = self.navigate_iter(game_map, new_target, vel, 18, 20)
-        if t is None:
-            return self.thrust(0, 0)
-        else:
-            return t
+        return self.navigate_tiers(game_map, gstate, new_target, vel, _TIERS,
+                                   slow_down=True)
 
     def navigate_corner(self, target, game_map, gstate, speed, avoid_obstacles=True,
                        max_corrections=90, angular_step=1, ignore_ships=False,
@@ -561,136 +679,54 @@ class Ship(Entity):
         '''
         aux_list = undocked enemies
         '''
-        closest_point_target = self.closest_point_to(target)
-        dist_to_closest = self.calculate_distance_between(closest_point_target)
-
-        angle = self.calculate_angle_between(closest_point_target)
-        distance = speed if (dist_to_closest >= speed) else int(dist_to_closest)
-        new_target_dx = math.cos(math.radians(angle)) * distance
-        new_target_dy = math.sin(math.radians(angle)) * distance
-        new_target = Position(self.x + new_target_dx, self.y + new_target_dy)
-
-        #Find nearest enem ships
+        move = gstate.potential_field.move(self)
+        #if pushed around by enemies, follow the field (see hlt.potential)
+        if move.pushed:
+            return self.navigate_tiers(game_map, gstate, move.target, move.vel, _FIELD_TIERS,
+                                       seeds=move.headings)
+        #else head for the corner, attacking docked enemies on the way
+        seeds = gstate.flows.seeds(target, self)
         nearby_enems = [e for e in gstate.undocked_enems
-                        if self.calculate_distance_between(e) <= 5 + constants.MAX_SPEED]
-        nearby_allies = [s for s in game_map.get_me().all_ships()
-                         if (s.role == 1 or s.role == 2)
-                         and self.calculate_distance_between(s) <= 5 + constants.MAX_SPEED]
-        #if there are nearby enemies, and outnumbered, evade them
-        if len(nearby_enems) >= len(nearby_allies):
-            #add enemy thrust vectors to target vector
-            #assume enemy thrusts toward my ship
-            for e in nearby_enems:
-                e_angl = e.calculate_angle_between(self)
-                e_magn = constants.MAX_SPEED
-                new_target = new_target + Position(math.cos(math.radians(e_angl))*e_magn,
-                                                   math.sin(math.radians(e_angl))*e_magn)
-            closest_point_target = self.closest_point_to(new_target)
-            dist_to_closest = self.calculate_distance_between(closest_point_target)
-
-            angle = self.calculate_angle_between(closest_point_target)
-            vel = speed if (dist_to_closest >= speed) else int(dist_to_closest)
-            new_target_dx = math.cos(math.radians(angle)) * vel
-            new_target_dy = math.sin(math.radians(angle)) * vel
-            new_target = Position(self.x + new_target_dx, self.y + new_target_dy)
-            t = self.navigate_iter(game_map, new_target, vel, 3, 20)
-            if t is None:
-                t = self.navigate_iter(game_map, new_target, vel, 6, 20)
-            if t is None:
-                t = self.navigate_iter(game_map, new_target, vel, 18, 20)
-            if t is None:
-                return self.thrust(0, 0)
-            else:
-                return t
-        #else attack docked enemies
-        else:
-            vel = distance
-            t = self.navigate_iter(game_map, new_target, vel, 3, 20, aux_list=nearby_enems)
-            if t is None:
-                vel = max(vel-2, 1)
-                t = self.navigate_iter(game_map, new_target, vel, 6, 20, aux_list=nearby_enems)
-            if t is None:
-                vel = max(vel-2, 1)
-                t = self.navigate_iter(game_map, new_target, vel, 18, 20, aux_list=nearby_enems)
-            if t is None:
-                return self.thrust(0, 0)
-            else:
-                return t
+                        if game_map.geometry.distance(self, e) <= 5 + constants.MAX_SPEED]
+        return self.navigate_tiers(game_map, gstate, move.target, move.vel, _TIERS,
+                                   slow_down=True, aux_list=nearby_enems, seeds=seeds)
 
     def navigate_flee(self, target, game_map, gstate, speed):
         '''
-        aux_list = undocked enemies
+        Step toward target, the end of the potential field's step for this
+        ship, trying the field's moves in rank order if the way is blocked
         '''
-        closest_point_target = self.closest_point_to(target)
-        dist_to_closest = self.calculate_distance_between(closest_point_target)
-
-        angle = self.calculate_angle_between(closest_point_target)
-        distance = speed if (dist_to_closest >= speed) else int(dist_to_closest)
-        new_target_dx = math.cos(math.radians(angle)) * distance
-        new_target_dy = math.sin(math.radians(angle)) * distance
-        new_target = Position(self.x + new_target_dx, self.y + new_target_dy)
-
-        #Find nearest enem ships
-        nearby_enems = [e for e in gstate.undocked_enems
-                        if self.calculate_distance_between(e) <= 5 + constants.MAX_SPEED]
-        nearby_allies = [s for s in game_map.get_me().all_ships()
-                         if (s.role == 1 or s.role == 2)
-                         and self.calculate_distance_between(s) <= 5 + constants.MAX_SPEED]
-        #if there are nearby enemies, and outnumbered, evade them
-        if nearby_enems and (len(nearby_enems) >= len(nearby_allies)):
-            #add enemy thrust vectors to target vector
-            #assume enemy thrusts toward my ship
-            for e in nearby_enems:
-                e_angl = e.calculate_angle_between(self)
-                e_magn = constants.MAX_SPEED
-                new_target = new_target + Position(math.cos(math.radians(e_angl))*e_magn,
-                                                   math.sin(math.radians(e_angl))*e_magn)
-            closest_point_target = self.closest_point_to(new_target)
-            dist_to_closest = self.calculate_distance_between(closest_point_target)
-
-            angle = self.calculate_angle_between(closest_point_target)
-            vel = speed if (dist_to_closest >= speed) else int(dist_to_closest)
-            new_target_dx = math.cos(math.radians(angle)) * vel
-            new_target_dy = math.sin(math.radians(angle)) * vel
-            new_target = Position(self.x + new_target_dx, self.y + new_target_dy)
-            t = self.navigate_iter(game_map, new_target, vel, 3, 120)
-            if t is None:
-                return self.thrust(0, 0)
-            else:
-                return t
-        #else attack docked enemies
-        else:
-            vel = distance
-            t = self.navigate_iter(game_map, new_target, vel, 3, 120)
-            if t is None:
-                return self.thrust(0, 0)
-            else:
-                return t
+        move = gstate.potential_field.move(self)
+        return self.navigate_tiers(game_map, gstate, target, move.vel, _FIELD_TIERS,
+                                   seeds=move.headings)
 
     def thrust_overlap(self, gmap, thrust):
         '''
         Check if proposed thrust collides with previous commands
         '''
-        for s in gmap.get_me().all_ships():
+        return self._overlap_xy(gmap, thrust.x0, thrust.y0, thrust.vx, thrust.vy)
+
+    def _overlap_xy(self, gmap, x0, y0, vx0, vy0):
+        '''
+        thrust_overlap for a thrust given as start point and velocity
+        '''
+        limit = (2.05*self.radius)**2
+        #Need not look at distant ships
+        for s in gmap.geometry.within(self, gmap.get_me().all_ships(),
+                                      2*constants.MAX_SPEED, 'mine'):
             #Need not look at self
             if s.id == self.id:
                 continue
-            #Need not look at distant ships
-            if self.calculate_distance_between(s) > 2*constants.MAX_SPEED:
-                continue
             #Need not look at stationary ships
-            if s.thrust_cmd is None:
+            t1 = s.thrust_cmd
+            if t1 is None:
                 continue
-            x0, y0 = thrust.x0, thrust.y0
-            vx0, vy0 = thrust.vx, thrust.vy
-
-            x1, y1 = s.thrust_cmd.x0, s.thrust_cmd.y0
-            vx1, vy1 = s.thrust_cmd.vx, s.thrust_cmd.vy
+            x1, y1 = t1.x0, t1.y0
+            vx1, vy1 = t1.vx, t1.vy
             for t in range(0, 23):
                 dx = x0 - x1 + t*(vx0 - vx1)/20.
                 dy = y0 - y1 + t*(vy0 - vy1)/20.
-                r = math.sqrt(dx**2 + dy**2)
-                if r <= 2.05*self.radius:
+                if dx*dx + dy*dy <= limit:
                     return True
 
         return False
@@ -699,24 +735,27 @@ class Ship(Entity):
         '''
         Check if proposed thrust collides with enemy commands
         '''
+        return self._evade_xy(gmap, thrust.x0, thrust.y0, thrust.vx, thrust.vy, enems)
+
+    def _evade_xy(self, gmap, x0, y0, vx0, vy0, enems=[]):
+        '''
+        evade_enems for a thrust given as start point and velocity
+        '''
         for e in enems:
             #Need not look at distant ships
-            if self.calculate_distance_between(e) > 2*constants.MAX_SPEED:
+            if gmap.geometry.distance(self, e) > 2*constants.MAX_SPEED:
                 continue
             #Need not look at stationary ships
-            if e.thrust_cmd is None:
+            t1 = e.thrust_cmd
+            if t1 is None:
                 continue
-
-            x0, y0 = thrust.x0, thrust.y0
-            vx0, vy0 = thrust.vx, thrust.vy
-
-            x1, y1 = e.thrust_cmd.x0, e.thrust_cmd.y0
-            vx1, vy1 = e.thrust_cmd.vx, e.thrust_cmd.vy
+            limit = (2.05*e.radius)**2
+            x1, y1 = t1.x0, t1.y0
+            vx1, vy1 = t1.vx, t1.vy
             for t in range(0, 22):
                 dx = x0 - x1 + t*(vx0 - vx1)/20.
                 dy = y0 - y1 + t*(vy0 - vy1)/20.
-                r = math.sqrt(dx**2 + dy**2)
-                if r <= 2.05*e.radius:
+                if dx*dx + dy*dy <= limit:
                     return True
 
         return False
@@ -746,12 +785,14 @@ class Ship(Entity):
         self.planet = planets.get(self.planet)  # If not will just reset to none
 
     @staticmethod
-    def _parse_single(player_id, tokens):
+    def _parse_single(player_id, tokens, pool=None, events=None):
         """
         Parse a single ship given tokenized input from the game environment.
 
         :param int player_id: The id of the player who controls the ships
         :param list[tokens]: The remaining tokens
+        :param dict[int, Ship] pool: Last turn's ships; the object for this id is reused (and removed)
+        :param list events: If given, spawn and docking changes are appended to it
         :return: The ship ID, ship object, and unused tokens.
         :rtype: int, Ship, list[str]
         """
@@ -761,30 +802,45 @@ class Ship(Entity):
         sid = int(sid)
         docked = Ship.DockingStatus(int(docked))
 
-        ship = Ship(player_id,
-                    sid,
-                    float(x), float(y),
-                    int(hp),
-                    float(vel_x), float(vel_y),
-                    docked, int(docked_planet),
-                    int(progress), int(cooldown))
+        #reuse last turn's object for this id, if any
+        ship = pool.pop(sid, None) if pool else None
+        if ship is None:
+            ship = Ship.__new__(Ship)
+            if events is not None:
+                events.append(ShipSpawned(sid, player_id))
+        elif events is not None and ship._parsed_docking is not docked:
+            events.append(ShipDockingChanged(sid, player_id, ship._parsed_docking, docked))
+        Ship.__init__(ship, player_id,
+                      sid,
+                      float(x), float(y),
+                      int(hp),
+                      float(vel_x), float(vel_y),
+                      docked, int(docked_planet),
+                      int(progress), int(cooldown))
 
         return sid, ship, remainder
 
     @staticmethod
-    def _parse(player_id, tokens):
+    def _parse(player_id, tokens, pool=None, events=None):
         """
         Parse ship data given a tokenized input.
 
         :param int player_id: The id of the player who owns the ships
         :param list[str] tokens: The tokenized input
+        :param dict[int, Ship] pool: The player's ships last turn, whose objects are reused
+        :param list events: If given, ship events are appended to it
         :return: The dict of Players and unused tokens.
         :rtype: (dict, list[str])
         """
         ships = {}
+        pool = dict(pool) if pool else None
         num_ships, *remainder = tokens
         for _ in range(int(num_ships)):
-            ship_id, ships[ship_id], remainder = Ship._parse_single(player_id, remainder)
+            ship_id, ships[ship_id], remainder = Ship._parse_single(player_id, remainder,
+                                                                    pool, events)
+        if pool and events is not None:
+            for sid in pool:
+                events.append(ShipDestroyed(sid, player_id))
         return ships, remainder
 
     def __str__(self):
@@ -803,6 +859,7 @@ class Position(Entity):
     :ivar health: Unused.
     :ivar owner: Unused.
     """
+    __slots__ = ()
 
     def __init__(self, x, y):
         self.x = x
@@ -823,6 +880,8 @@ class Thrust:
     '''
     Class for holding thrust info
     '''
+    __slots__ = ('id', 'magnitude', 'angle', 'vx', 'vy', 'x0', 'y0', 'x1', 'y1')
+
     def __init__(self, ship, magnitude, angle):
         self.id = ship.id
         self.magnitude = int(magnitude)
@@ -841,128 +900,124 @@ class Thrust:
 class Squadron:
     '''
     Class for grouping together attacking ships into co-moving squadrons
+
+    Members take the slots of a formation.template around (x, y), facing
+    the target player as it was when the squadron was made. Once formed the
+    squadron moves as a rigid body: one navigation query for the bounding
+    circle of the formation, its thrust copied to every member, and a
+    member navigated on its own only when its copy of the move conflicts.
     '''
+    #distance from its slot at which a member counts as in formation
+    SLOT_TOLERANCE = .5
+
     def __init__(self, gstate, target_player_id, squad_id, ship_ids):
         self.gstate = gstate
         self.id = squad_id
         self.target_player_id = target_player_id
-        self.ship_ids = ship_ids
-        self.first_pass = 0
-        self.second_pass = 0
-        self.x = 0
-        self.y = 0
-
-        #set roles, remove ships from other state lists
-        for sid in self.ship_ids:
-            gstate.clean_ship(sid)
-            gstate.set_ship_role(sid, 3)
-
-
-    def form_squadron(self):
+        self.ship_ids = []
+        self.slots = {} #ship id -> slot index
+        self.offsets = [] #slot offsets from (x, y), by slot index
+        self.free_slots = [] #slots left by members that are gone
+        self.joining = set() #members not yet in their slot
+        self.formed = False
+
+        #centre the formation on the ships, facing their nearest enemy
+        ships = [gstate.gmap.get_me().get_ship(sid) for sid in ship_ids]
+        self.x = sum(s.x for s in ships)/len(ships)
+        self.y = sum(s.y for s in ships)/len(ships)
+        enems = gstate.gmap.get_player(target_player_id).all_ships()
+        self.heading = 0
+        if enems:
+            centre = Position(self.x, self.y)
+            self.heading = centre.calculate_angle_between(
+                min(enems, key=centre.calculate_distance_between))
+
+        #ships furthest forward take the forward slots
+        c, s = math.cos(math.radians(self.heading)), math.sin(math.radians(self.heading))
+        ships.sort(key=lambda ship: -(ship.x*c + ship.y*s))
+        forward = sorted(range(len(ships)), key=lambda i: -formation.template(len(ships))[i][0])
+        for ship, slot in zip(ships, forward):
+            self.add_member(ship, slot)
+
+    def add_member(self, ship, slot=None):
         '''
-        set roles to squadron attacker (3)
-        form up at central location with angle
+        Take ship into the squadron, in the given slot or the next free one
         '''
-        #establish target
-        enems = self.gstate.gmap.get_player(self.target_player_id).all_ships()
-        ship = self.gstate.gmap.get_me().get_ship(self.ship_ids[0])
-        target = min(enems, key=ship.calculate_distance_between)
-
-        cmds = []
-        #left/right
-        if (target.y < ship.y + 20) and (target.y > ship.y - 20):
-            logging.warning('determined left/right config')
-        #up/down
-        else:
-            logging.warning('determined up/down config')
-            if self.first_pass == 0:
-                if target.y < ship.y:
-                    logging.info('detected down')
-                    th = 180
-                else:
-                    th = 0
-                #order ships by distance
-                ships = [self.gstate.gmap.get_me().get_ship(sid) for sid in self.ship_ids]
-                ships.sort(key=target.calculate_distance_between)
-                ship1 = ships[0]
-                ship2 = ships[1]
-                ship3 = ships[2]
-                self.ship_ids = [ship1.id, ship2.id, ship3.id]
-
-                #ship one goes 4 units toward enemy
-                cmds.append(ship1.thrust(4, 90+th))
-
-                #ship two goes left
-                cmds.append(ship2.thrust(7, 131.538+th))
-
-                #ship three goes right
-                cmds.append(ship3.thrust(5, 57.4493+th))
-
-                self.first_pass = 1
-            else:
-                if target.y < ship.y:
-                    logging.info('detected down')
-                    th = 180
-                else:
-                    th = 0
-                #order ships by distance
-                ships = [self.gstate.gmap.get_me().get_ship(sid) for sid in self.ship_ids]
-                ships.sort(key=target.calculate_distance_between)
-                ship1 = ships[0]
-                ship2 = ships[1]
-                ship3 = ships[2]
-
-                #ship one does nothing
-                cmds.append(ship1.thrust(0, 90+th))
-
-                #ship two goes down 7 unit
-                cmds.append(ship2.thrust(4, 26.1099+th))
-
-                #ship two goes down 7 unit
-                cmds.append(ship3.thrust(6, 105.369+th))
-
-                self.x = ship1.x
-                self.y = ship1.y
-
-                self.second_pass = 1
-                logging.warning('Form up squadron')
-        return cmds
-
+        self.gstate.clean_ship(ship.id)
+        self.gstate.set_ship_role(ship.id, 3)
+        self.gstate.ships_targets[ship.id] = self.id
+        if slot is None:
+            slot = self.free_slots.pop() if self.free_slots else len(self.ship_ids)
+        while len(self.offsets) <= slot:
+            self.offsets.append(formation.slot(len(self.offsets), self.heading))
+        self.slots[ship.id] = slot
+        self.ship_ids.append(ship.id)
+        self.joining.add(ship.id)
+
+    def remove_member(self, ship_id):
+        '''
+        Drop ship_id from the squadron, freeing its slot
+        '''
+        slot = self.slots.pop(ship_id, None)
+        if slot is None:
+            return
+        self.ship_ids.remove(ship_id)
+        self.free_slots.append(slot)
+        self.joining.discard(ship_id)
+
+    def slot_position(self, ship_id):
+        '''
+        Current position of ship_id's slot
+        '''
+        dx, dy = self.offsets[self.slots[ship_id]]
+        return self.x + dx, self.y + dy
 
     def navigate(self, undocked_enems):
         '''
         issue thrust commands to each ship
         '''
-        if self.second_pass == 0:
-            return self.form_squadron()
-        else:
-            #establish target
-            enems = [e for e in self.gstate.gmap.get_player(self.target_player_id).all_ships()
-                     if e.docking_status != Ship.DockingStatus.UNDOCKED]
-            if not enems:
-                enems = self.gstate.gmap.get_player(self.target_player_id).all_ships()
-
-            #if enemy is eliminated, convert to miners
-            if not enems:
-                self.disband_squadron()
-                logging.warning('squadron disband')
-                return []
-            else:
-                #create a virtual ship to control the others
-                ship = Ship(0, -1, self.x, self.y, 999, 0, 0,
-                            Ship.DockingStatus.UNDOCKED, None, 0, 0)
-                ship.role = 3
-                ship.radius = 1.75
-                target = min(enems, key=ship.calculate_distance_between)
-                ships = [self.gstate.gmap.get_me().get_ship(sid) for sid in self.ship_ids]
-
-            cmds = []
-            #navigate furthest ship to target
-            thrust = ship.navigate(
+        gmap = self.gstate.gmap
+        #establish target
+        enems = [e for e in gmap.get_player(self.target_player_id).all_ships()
+                 if e.docking_status != Ship.DockingStatus.UNDOCKED]
+        if not enems:
+            enems = gmap.get_player(self.target_player_id).all_ships()
+
+        #if enemy is eliminated (or every member is lost), convert to miners
+        if not enems or not self.ship_ids:
+            self.disband_squadron()
+            logging.warning('squadron disband')
+            return []
+
+        ships = [gmap.get_me().get_ship(sid) for sid in self.ship_ids]
+        for s in ships:
+            x, y = self.slot_position(s.id)
+            if math.hypot(s.x - x, s.y - y) <= self.SLOT_TOLERANCE:
+                self.joining.discard(s.id)
+            elif self.formed:
+                #knocked out of place, catch up on its own
+                self.joining.add(s.id)
+        if not self.formed and not self.joining:
+            self.formed = True
+            logging.warning('Form up squadron')
+
+        cmds = []
+        body = [s for s in ships if s.id not in self.joining] if self.formed else []
+        body_ids = set(s.id for s in body)
+        if body:
+            #create a virtual ship covering the formation to control the others
+            ship = Ship(0, -1, self.x, self.y, 999, 0, 0,
+                        Ship.DockingStatus.UNDOCKED, None, 0, 0)
+            ship.role = 3
+            ship.radius = formation.bounding_radius(
+                [self.offsets[self.slots[s.id]] for s in body]) + self.SLOT_TOLERANCE
+            target = min(enems, key=ship.calculate_distance_between)
+            #slow down while anyone is catching up
+            ship.navigate(
                 target,
-                self.gstate.gmap,
+                gmap,
                 self.gstate,
-                speed=int(constants.MAX_SPEED),
+                speed=int(constants.MAX_SPEED/2) if self.joining else int(constants.MAX_SPEED),
                 ignore_ships=False,
                 ignore_planets=False,
                 max_corrections=180,
@@ -971,13 +1026,55 @@ class Squadron:
                 aux_list2=undocked_enems,
                 ignore_list=ships)
 
-            magn, angl = ship.thrust_cmd.magnitude, ship.thrust_cmd.angle
-            self.x = self.x + math.cos(math.radians(angl))*magn
-            self.y = self.y + math.sin(math.radians(angl))*magn
-            for s in ships:
-                cmds.append(s.thrust(magn, angl))
+            magn, angl = (ship.thrust_cmd.magnitude, ship.thrust_cmd.angle) \
+                if ship.thrust_cmd else (0, 0)
+            dx, dy = math.cos(math.radians(angl))*magn, math.sin(math.radians(angl))*magn
+            self.x, self.y = self.x + dx, self.y + dy
+            for s in body:
+                #repair members whose copy of the move runs into something
+                if magn and s._move_conflicts_xy(gmap, s.x + dx, s.y + dy, magn, angl,
+                                                 ignore_list=ships):
+                    cmd = self._repair(s, ships, undocked_enems)
+                else:
+                    cmd = s.thrust(magn, angl)
+                if cmd:
+                    cmds.append(cmd)
+
+        #everyone else heads for their slot
+        for s in ships:
+            if s.id not in body_ids:
+                cmd = self._repair(s, ships, undocked_enems)
+                if cmd:
+                    cmds.append(cmd)
         return cmds
 
+    def _repair(self, ship, ships, undocked_enems):
+        '''
+        Command moving one member toward its slot on its own: straight there
+        if the move is clear, otherwise through the ship's navigation
+        '''
+        x, y = self.slot_position(ship.id)
+        dist = math.hypot(x - ship.x, y - ship.y)
+        angl = round(math.degrees(math.atan2(y - ship.y, x - ship.x))) % 360
+        #whole thrusts only: take the one landing nearest the slot
+        magn = min(min(int(dist) + 1, int(constants.MAX_SPEED)), int(dist),
+                   key=lambda m: math.hypot(ship.x + math.cos(math.radians(angl))*m - x,
+                                            ship.y + math.sin(math.radians(angl))*m - y))
+        if not magn:
+            return None
+        tx = ship.x + math.cos(math.radians(angl))*magn
+        ty = ship.y + math.sin(math.radians(angl))*magn
+        if not ship._move_conflicts_xy(self.gstate.gmap, tx, ty, magn, angl, ignore_list=ships):
+            return ship.thrust(magn, angl)
+        return ship.navigate(Position(x, y),
+                             self.gstate.gmap,
+                             self.gstate,
+                             speed=magn,
+                             max_corrections=180,
+                             angular_step=3,
+                             aux_list2=undocked_enems,
+                             ignore_list=ships)
+
     def disband_squadron(self):
         '''
         reassign roles
@@ -985,7 +1082,4 @@ class Squadron:
         self.gstate.disband_squadron(self)
         self.ship_ids = []
 
-    def add_member(self, ship):
-        pass
-
     
\ No newline at end of file
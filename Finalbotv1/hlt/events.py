@@ -0,0 +1,17 @@
+'''
+Typed events emitted by the map parser.
+
+Map._parse reuses last turn's entity object for every id it sees again and
+records what changed on the way into Map.events, so State can keep its
+collections up to date without recomputing them every turn. Owners are
+player ids (None for unowned planets), docking states are
+Ship.DockingStatus members.
+'''
+from collections import namedtuple
+
+ShipSpawned = namedtuple('ShipSpawned', ['ship_id', 'owner'])
+ShipDestroyed = namedtuple('ShipDestroyed', ['ship_id', 'owner'])
+ShipDockingChanged = namedtuple('ShipDockingChanged', ['ship_id', 'owner', 'old', 'new'])
+PlanetOwnerChanged = namedtuple('PlanetOwnerChanged', ['planet_id', 'old', 'new'])
+PlanetDockedChanged = namedtuple('PlanetDockedChanged', ['planet_id', 'old', 'new'])
+PlanetDestroyed = namedtuple('PlanetDestroyed', ['planet_id'])
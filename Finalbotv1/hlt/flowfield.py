@@ -0,0 +1,193 @@
+import logging
+import math
+import time
+
+import numpy as np
+
+from . import constants, entity
+from .planner import finish
+
+#neighbor offsets (in cells) and their step lengths, knight moves included
+#so headings come in 16 directions rather than 8
+_OFFSETS = [(di, dj, math.hypot(di, dj)) for di, dj in
+            [(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1),
+             (2, 1), (1, 2), (-1, 2), (-2, 1), (-2, -1), (-1, -2), (1, -2), (2, -1)]]
+
+
+def _shifted(cost, di, dj):
+    '''
+    Return an array whose [i, j] entry is cost[i+di, j+dj] (inf off the grid)
+    '''
+    nx, ny = cost.shape
+    out = np.full_like(cost, np.inf)
+    out[max(-di, 0):nx - max(di, 0), max(-dj, 0):ny - max(dj, 0)] = \
+        cost[max(di, 0):nx - max(-di, 0), max(dj, 0):ny - max(-dj, 0)]
+    return out
+
+
+def relax(blocked, goal):
+    '''
+    Relax path costs outward from the goal cells around the blocked ones,
+    yielding after every sweep
+
+    :return: the cost of every cell (inf where the goal can't be reached)
+    '''
+    cost = np.full(blocked.shape, np.inf)
+    cost[goal] = 0.
+    while True:
+        new = cost
+        for di, dj, w in _OFFSETS:
+            new = np.minimum(new, _shifted(cost, di, dj) + w)
+        new[blocked] = np.inf
+        new[goal] = 0.
+        if np.array_equal(new, cost):
+            return cost
+        cost = new
+        yield
+
+
+class FlowField:
+    '''
+    Direction field toward a single target over a coarse grid.
+
+    Costs are relaxed outward from the goal cells around the blocked
+    (planet) cells, and each cell stores the heading of its cheapest
+    neighbor, so looking up a heading is a single array index.
+    '''
+    def __init__(self, cost, goal, cell):
+        self.cell = cell
+        self.cost = cost
+
+        steps = np.stack([_shifted(cost, di, dj) + w for di, dj, w in _OFFSETS])
+        best = np.argmin(steps, axis=0)
+        angles = np.array([math.degrees(math.atan2(dj, di)) % 360 for di, dj, _ in _OFFSETS])
+        self.headings = angles[best]
+        #no heading at the goal or where the goal can't be reached
+        self.headings[goal | ~np.isfinite(cost)] = np.nan
+
+    @classmethod
+    def build(cls, blocked, goal, cell):
+        '''
+        Generator building the field a relaxation sweep at a time, see
+        hlt.planner
+        '''
+        cost = yield from relax(blocked, goal)
+        return cls(cost, goal, cell)
+
+    def heading(self, x, y):
+        '''
+        Return the preferred heading in degrees at (x, y), or None
+        '''
+        i, j = int(x/self.cell), int(y/self.cell)
+        if i < 0 or j < 0 or i >= self.headings.shape[0] or j >= self.headings.shape[1]:
+            return None
+        angle = self.headings[i, j]
+        if angle != angle:
+            return None
+        return float(angle)
+
+
+class FlowFieldService:
+    '''
+    Builds flow fields on demand and keeps them, keyed by target, for the rest
+    of the game. Fields are only thrown away if a planet is destroyed.
+
+    Given a hlt.planner.PlanQueue, a missing field is queued there instead
+    of built on the spot, and there is no field for its target until the
+    queue has finished it (at most max_age turns later).
+    '''
+    def __init__(self, cell=4., queue=None, max_age=2):
+        self.cell = cell
+        self.queue = queue
+        self.max_age = max_age
+        self.planet_ids = ()
+        self.planets = []
+        self.blocked = np.zeros((0, 0), dtype=bool)
+        self.cx = np.zeros(0)
+        self.cy = np.zeros(0)
+        self.fields = {}
+
+    def update(self, gmap):
+        '''
+        Rebuild the obstacle grid if the planet set has changed
+        '''
+        planet_ids = tuple(sorted(p.id for p in gmap.all_planets()))
+        if planet_ids == self.planet_ids:
+            return
+        self.planet_ids = planet_ids
+        self.planets = [gmap.get_planet(pid) for pid in planet_ids]
+
+        nx = int(math.ceil(gmap.width/self.cell))
+        ny = int(math.ceil(gmap.height/self.cell))
+        self.cx = (np.arange(nx) + .5)[:, None]*self.cell
+        self.cy = (np.arange(ny) + .5)[None, :]*self.cell
+        blocked = np.zeros((nx, ny), dtype=bool)
+        for p in self.planets:
+            r = p.radius + constants.SHIP_RADIUS + .5*self.cell
+            blocked |= (self.cx - p.x)**2 + (self.cy - p.y)**2 <= r**2
+        self.blocked = blocked
+        self.fields = {}
+        if self.queue is not None:
+            self.queue.cancel(lambda key: key[0] == 'flow')
+
+    def _key(self, target):
+        if isinstance(target, entity.Planet):
+            return ('p', target.id)
+        return ('q', int(target.x), int(target.y))
+
+    def _goal(self, target):
+        '''
+        Grid cells that count as having arrived at the target.
+
+        For planets this is the docking ring, otherwise the target's own cell
+        (or the nearest free cell if that one is blocked).
+        '''
+        d2 = (self.cx - target.x)**2 + (self.cy - target.y)**2
+        if isinstance(target, entity.Planet):
+            goal = (d2 <= (target.radius + constants.DOCK_RADIUS)**2) & ~self.blocked
+            if goal.any():
+                return goal
+        d2 = np.where(self.blocked, np.inf, d2)
+        goal = np.zeros(self.blocked.shape, dtype=bool)
+        goal[np.unravel_index(np.argmin(d2), d2.shape)] = True
+        return goal
+
+    def field(self, target):
+        '''
+        Return the flow field toward target, building (or queueing) it on
+        first use, or None while it is queued
+        '''
+        key = self._key(target)
+        field = self.fields.get(key)
+        if field is None:
+            if self.queue is None:
+                start = time.time()
+                goal = self._goal(target)
+                field = FlowField(finish(relax(self.blocked, goal)), goal, self.cell)
+                logging.info('FlowFieldService: field for '+str(key)+' built in '
+                             +str(time.time()-start)+' seconds')
+            else:
+                plan = ('flow',) + key
+                self.queue.submit(plan, lambda: FlowField.build(self.blocked, self._goal(target),
+                                                                self.cell), self.max_age)
+                field = self.queue.take(plan)
+                if field is None:
+                    return None
+            self.fields[key] = field
+        return field
+
+    def heading(self, target, x, y):
+        '''
+        Return the preferred heading at (x, y) toward target, or None
+        '''
+        if not self.blocked.size:
+            return None
+        field = self.field(target)
+        return None if field is None else field.heading(x, y)
+
+    def seeds(self, target, ship):
+        '''
+        Return the list of headings a navigation search should try first
+        '''
+        angle = self.heading(target, ship.x, ship.y)
+        return [] if angle is None else [angle]
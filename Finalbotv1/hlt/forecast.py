@@ -0,0 +1,113 @@
+'''
+Production and fleet size forecasts.
+
+Every DOCKED ship adds BASE_PRODUCTIVITY to its planet's production each
+turn, and a planet spawns a ship each time its production reaches
+_SHIP_COST. FleetForecast tracks which ships produce where, from the map
+events, and projects every player's ship count and production rate
+for the next horizon turns.
+'''
+import numpy as np
+
+from . import constants
+from .entity import Ship
+from .events import ShipDestroyed, ShipDockingChanged
+
+#production a planet spends on a new ship (12 turns of one docked ship)
+_SHIP_COST = 12*constants.BASE_PRODUCTIVITY
+
+
+class FleetForecast:
+    '''
+    Projected fleet sizes and production rates of every player.
+
+    :ivar ships: (players, horizon + 1) array, ship count of each player
+                 after t turns (t=0 is now)
+    :ivar rate: (players, horizon + 1) array, ships per turn each player
+                produces t turns from now
+    '''
+    def __init__(self, horizon=30):
+        self.horizon = horizon
+        self.docked = {} #ship id -> planet row, for producing ships
+        self.docking = {} #ship id -> planet row, for docking ships
+        self.ships = np.zeros((0, horizon + 1))
+        self.rate = np.zeros((0, horizon + 1))
+
+    def rebuild(self, gmap):
+        '''
+        Recollect the producing and docking ships from scratch
+        '''
+        self.docked, self.docking = {}, {}
+        for player in gmap.all_players():
+            for ship in player.all_ships():
+                self._track(ship, ship.docking_status)
+
+    def _track(self, ship, status):
+        if status is Ship.DockingStatus.DOCKED:
+            self.docked[ship.id] = ship.planet.row
+        elif status is Ship.DockingStatus.DOCKING:
+            self.docking[ship.id] = ship.planet.row
+
+    def update(self, gmap, rebuild=False):
+        '''
+        Apply this turn's map events and redo the projection
+        '''
+        if rebuild:
+            self.rebuild(gmap)
+        else:
+            for event in gmap.events:
+                if isinstance(event, ShipDockingChanged):
+                    self.docked.pop(event.ship_id, None)
+                    self.docking.pop(event.ship_id, None)
+                    self._track(gmap.get_player(event.owner).get_ship(event.ship_id), event.new)
+                elif isinstance(event, ShipDestroyed):
+                    self.docked.pop(event.ship_id, None)
+                    self.docking.pop(event.ship_id, None)
+        self.project(gmap)
+
+    def project(self, gmap):
+        '''
+        Vectorized projection over planets and turns, summed per player
+        '''
+        store = gmap.store
+        planets = store.planets
+        n_planets, n_players = planets.size, len(gmap.all_players())
+        steps = np.arange(self.horizon + 1)
+
+        #docked ships producing at each planet on each future turn
+        producing = np.zeros((n_planets, self.horizon + 1))
+        producing += np.bincount(np.array(list(self.docked.values()), dtype=int),
+                                 minlength=n_planets)[:n_planets, None]
+        #docking ships join in once their docking progress runs out
+        for sid, row in self.docking.items():
+            left = store.ships.objects[store.ships.rows[sid]]._docking_progress
+            producing[row, steps > left] += 1
+
+        #production banked by each turn and the ships spawned from it
+        banked = planets.production[:n_planets, None] + constants.BASE_PRODUCTIVITY*np.concatenate(
+            [np.zeros((n_planets, 1)), np.cumsum(producing[:, :-1], axis=1)], axis=1)
+        spawned = np.floor(banked/_SHIP_COST)
+
+        owner = planets.owner[:n_planets]
+        owned = planets.alive[:n_planets] & (owner >= 0)
+        self.ships = np.zeros((n_players, self.horizon + 1))
+        self.rate = np.zeros((n_players, self.horizon + 1))
+        np.add.at(self.ships, owner[owned], spawned[owned])
+        np.add.at(self.rate, owner[owned], producing[owned]/12.)
+
+        ships = store.ships
+        alive = ships.alive[:ships.size]
+        self.ships += np.bincount(ships.owner[:ships.size][alive],
+                                  minlength=n_players)[:n_players, None]
+
+    def ships_at(self, player_id, turns):
+        '''
+        Projected ship count of player_id in turns turns (not counting losses)
+        '''
+        return self.ships[player_id, min(turns, self.horizon)]
+
+    def rate_at(self, player_id, turns):
+        '''
+        Projected ships per turn player_id produces in turns turns
+        '''
+        return self.rate[player_id, min(turns, self.horizon)]
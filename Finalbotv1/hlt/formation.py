@@ -0,0 +1,52 @@
+'''
+Squadron formation templates.
+
+A template is a list of slot offsets around the squadron's centre, in a
+frame where +x points at the enemy. Slots are taken from a hex lattice in
+order of distance from the centre (forward slots first among equals), so
+the template for n + 1 ships is the template for n plus one slot and a
+squadron can grow without moving anyone.
+'''
+import math
+from functools import lru_cache
+
+from . import constants
+
+#distance between the centres of neighbouring slots, with room for ships
+#up to half a unit out of place
+SPACING = 2*constants.SHIP_RADIUS + 1.25
+
+
+@lru_cache(maxsize=None)
+def _lattice(rings):
+    '''
+    Hex lattice points out to rings rows from the centre, in slot order
+    '''
+    points = [((i + j/2.)*SPACING, j*math.sqrt(3)/2*SPACING)
+              for i in range(-rings, rings + 1) for j in range(-rings, rings + 1)]
+    points.sort(key=lambda p: (round(math.hypot(*p), 6), -round(p[0], 6), round(p[1], 6)))
+    return tuple(points)
+
+
+def template(n):
+    '''
+    Slot offsets for n ships
+    '''
+    #enough rings to hold every point nearer than the n-th slot
+    return _lattice(int(math.sqrt(n)) + 2)[:n]
+
+
+def slot(index, heading):
+    '''
+    Offset of slot index for a formation facing heading (degrees)
+    '''
+    x, y = template(index + 1)[index]
+    c, s = math.cos(math.radians(heading)), math.sin(math.radians(heading))
+    return x*c - y*s, x*s + y*c
+
+
+def bounding_radius(offsets):
+    '''
+    Radius of the circle around the centre holding ships at every offset
+    '''
+    return max((math.hypot(x, y) for x, y in offsets), default=0.) + constants.SHIP_RADIUS
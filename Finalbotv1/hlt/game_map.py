@@ -1,7 +1,8 @@
 import logging
 import math
 
-from . import collision, entity, constants
+from . import collision, entity, constants, geometry, store
+from .events import ShipDestroyed
 
 
 class Map:
@@ -24,6 +25,10 @@ class Map:
         self.height = height
         self._players = {}
         self._planets = {}
+        self.geometry = geometry.GeometryCache() #pairwise geometry, cleared every turn
+        self.store = store.EntityStore() #columnar copy of the entities, reloaded every turn
+        self._views = {} #cached entity lists, cleared every turn
+        self.events = [] #what changed since the previous parse, see events.py
 
     def get_me(self):
         """
@@ -42,10 +47,10 @@ class Map:
 
     def all_players(self):
         """
-        :return: List of all players
-        :rtype: list[Player]
+        :return: All players (cached for the turn, do not modify)
+        :rtype: tuple[Player]
         """
-        return list(self._players.values())
+        return self._view('players', lambda: tuple(self._players.values()))
 
     def get_planet(self, planet_id):
         """
@@ -57,10 +62,19 @@ class Map:
 
     def all_planets(self):
         """
-        :return: List of all planets
-        :rtype: list[entity.Planet]
+        :return: All planets (cached for the turn, do not modify)
+        :rtype: tuple[entity.Planet]
         """
-        return list(self._planets.values())
+        return self._view('planets', lambda: tuple(self._planets.values()))
+
+    def _view(self, name, build):
+        """
+        Return the cached entity tuple name, building it on first use this turn
+        """
+        view = self._views.get(name)
+        if view is None:
+            view = self._views[name] = build()
+        return view
 
     def nearby_entities_by_distance(self, entity):
         """
@@ -92,37 +106,38 @@ class Map:
         :return: nothing
         """
         tokens = map_string.split()
+        self.geometry.clear()
+        self._views = {}
+        self.events = []
 
-        self._players, tokens = Player._parse(tokens)
-        self._planets, tokens = entity.Planet._parse(tokens)
+        #entity objects are reused from the previous parse where ids match
+        self._players, tokens = Player._parse(tokens, self._players, self.events)
+        self._planets, tokens = entity.Planet._parse(tokens, self._planets, self.events)
 
         assert(len(tokens) == 0)  # There should be no remaining tokens at this point
         self._link()
+        self.store.load(self)
 
     def _all_ships(self):
         """
         Helper function to extract all ships from all players
 
-        :return: List of ships
-        :rtype: List[Ship]
+        :return: All ships (cached for the turn, do not modify)
+        :rtype: tuple[Ship]
         """
-        all_ships = []
-        for player in self.all_players():
-            all_ships.extend(player.all_ships())
-        return all_ships
+        return self._view('ships', lambda: tuple(
+            s for player in self.all_players() for s in player.all_ships()))
 
     def all_enem_ships(self):
         """
         Helper function to extract all ships from all enemy players
 
-        :return: List of ships
-        :rtype: List[Ship]
+        :return: All enemy ships (cached for the turn, do not modify)
+        :rtype: tuple[Ship]
         """
-        all_ships = []
-        for player in self.all_players():
-            if player != self.get_me():
-                all_ships.extend(player.all_ships())
-        return all_ships
+        return self._view('enem_ships', lambda: tuple(
+            s for player in self.all_players() if player != self.get_me()
+            for s in player.all_ships()))
 
     def _intersects_entity(self, target):
         """
@@ -151,8 +166,8 @@ class Map:
         :rtype: list[entity.Entity]
         """
         obstacles = []
-        entities = ([] if issubclass(entity.Planet, ignore) else self.all_planets()) \
-            + ([] if issubclass(entity.Ship, ignore) else self._all_ships())
+        entities = (() if issubclass(entity.Planet, ignore) else self.all_planets()) \
+            + (() if issubclass(entity.Ship, ignore) else self._all_ships())
 
         for foreign_entity in entities:
             if foreign_entity == ship or foreign_entity == target:
@@ -178,6 +193,47 @@ class Map:
             obstacles.append(target)
         return obstacles
 
+    def first_obstacle_xy(self, ship, x, y, target=None, ignore_list=()):
+        """
+        obstacles_between for a segment from ship to (x, y), without building
+        the entity list or any Position. Map edges are left to out_of_bounds_xy.
+
+        :param entity.Ship ship: Source entity
+        :param float x: Segment end x-coordinate
+        :param float y: Segment end y-coordinate
+        :param entity.Entity target: Entity not counted as an obstacle, if any
+        :param list ignore_list: The first obstacle does not count if it is in here
+        :return: The first planet or stationary ship in the way, or None
+        :rtype: entity.Entity
+        """
+        fudg = ship.radius + .05
+        x0, y0 = ship.x, ship.y
+        for group in [self._planets.values()] + [p._ships.values() for p in self._players.values()]:
+            for foreign_entity in group:
+                if foreign_entity == ship or foreign_entity == target:
+                    continue
+
+                #skip moving ships
+                if isinstance(foreign_entity, entity.Ship) and foreign_entity.thrust_cmd is not None:
+                    continue
+                if collision.intersect_segment_circle_xy(x0, y0, x, y,
+                                                         foreign_entity.x, foreign_entity.y,
+                                                         foreign_entity.radius, fudge=fudg):
+                    #only one obstacle is necessary
+                    return None if foreign_entity in ignore_list else foreign_entity
+        return None
+
+    def out_of_bounds_xy(self, x, y):
+        """
+        Check whether (x, y) is too close to the map edge for a ship
+
+        :rtype: bool
+        """
+        return x < 2*constants.SHIP_RADIUS \
+            or x > self.width - (2*constants.SHIP_RADIUS) \
+            or y < 2*constants.SHIP_RADIUS \
+            or y > self.height - (2*constants.SHIP_RADIUS)
+
 
 class Player:
     """
@@ -190,13 +246,16 @@ class Player:
         """
         self.id = player_id
         self._ships = ships
+        self._all_ships = None
 
     def all_ships(self):
         """
-        :return: A list of all ships which belong to the user
-        :rtype: list[entity.Ship]
+        :return: All ships which belong to the user (cached, do not modify)
+        :rtype: tuple[entity.Ship]
         """
-        return list(self._ships.values())
+        if self._all_ships is None:
+            self._all_ships = tuple(self._ships.values())
+        return self._all_ships
 
     def get_ship(self, ship_id):
         """
@@ -207,35 +266,51 @@ class Player:
         return self._ships.get(ship_id)
 
     @staticmethod
-    def _parse_single(tokens):
+    def _parse_single(tokens, pool=None, events=None):
         """
         Parse one user given an input string from the Halite engine.
 
         :param list[str] tokens: The input string as a list of str from the Halite engine.
+        :param dict[int, Player] pool: Last turn's players; the object for this id is reused (and removed)
+        :param list events: If given, ship events are appended to it
         :return: The parsed player id, player object, and remaining tokens
         :rtype: (int, Player, list[str])
         """
         player_id, *remainder = tokens
         player_id = int(player_id)
-        ships, remainder = entity.Ship._parse(player_id, remainder)
-        player = Player(player_id, ships)
+        player = pool.pop(player_id, None) if pool else None
+        ships, remainder = entity.Ship._parse(player_id, remainder,
+                                              player._ships if player else None, events)
+        if player is None:
+            player = Player(player_id, ships)
+        else:
+            player.__init__(player_id, ships)
         return player_id, player, remainder
 
     @staticmethod
-    def _parse(tokens):
+    def _parse(tokens, pool=None, events=None):
         """
         Parse an entire user input string from the Halite engine for all users.
 
         :param list[str] tokens: The input string as a list of str from the Halite engine.
+        :param dict[int, Player] pool: Last turn's players, whose objects (and ships) are reused
+        :param list events: If given, ship events are appended to it
         :return: The parsed players in the form of player dict, and remaining tokens
         :rtype: (dict, list[str])
         """
         num_players, *remainder = tokens
         num_players = int(num_players)
         players = {}
+        pool = dict(pool) if pool else None
 
         for _ in range(num_players):
-            player, players[player], remainder = Player._parse_single(remainder)
+            player, players[player], remainder = Player._parse_single(remainder, pool, events)
+
+        #players missing from the input lose all their ships
+        if pool and events is not None:
+            for player in pool.values():
+                for sid in player._ships:
+                    events.append(ShipDestroyed(sid, player.id))
 
         return players, remainder
 
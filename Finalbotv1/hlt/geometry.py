@@ -0,0 +1,126 @@
+import math
+
+from . import entity
+
+
+class GeometryCache:
+    '''
+    Turn scoped memo of pairwise distances, angles and closest points.
+
+    Ships are keyed by id and planets by -1 - id. Positions, and anything
+    else without a game id, are keyed by coordinates quantized to 1/QUANT
+    units, plus their radius. The Map clears the cache whenever it parses a turn.
+
+    :ivar hits: Lookups served from the cache this turn
+    :ivar misses: Lookups that had to be computed this turn
+    '''
+    QUANT = 100.
+
+    def __init__(self):
+        self._dist = {}
+        self._angle = {}
+        self._closest = {}
+        self._near = {}
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        '''
+        Invalidate everything (called on parse)
+        '''
+        self._dist = {}
+        self._angle = {}
+        self._closest = {}
+        self._near = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, e):
+        eid = e.id
+        if eid is None or eid < 0:
+            return (round(e.x*self.QUANT), round(e.y*self.QUANT), e.radius)
+        if e.__class__ is entity.Planet:
+            return -1 - eid
+        return eid
+
+    def distance(self, a, b):
+        '''
+        Cached a.calculate_distance_between(b)
+        '''
+        ka, kb = self._key(a), self._key(b)
+        row = self._dist.get(ka)
+        if row is None:
+            row = self._dist[ka] = {}
+        d = row.get(kb)
+        if d is None:
+            self.misses += 1
+            d = math.sqrt((b.x - a.x)**2 + (b.y - a.y)**2)
+            row[kb] = d
+            self._dist.setdefault(kb, {})[ka] = d
+        else:
+            self.hits += 1
+        return d
+
+    def within(self, a, entities, radius, tag):
+        '''
+        Cached list of the entities within radius of a.
+
+        tag names the entities list (e.g. 'mine' for my ships) and must
+        always refer to the same list within a turn.
+        '''
+        key = (self._key(a), tag, radius)
+        near = self._near.get(key)
+        if near is None:
+            self.misses += 1
+            near = [e for e in entities if self.distance(a, e) <= radius]
+            self._near[key] = near
+        else:
+            self.hits += 1
+        return near
+
+    def distance_from(self, a):
+        '''
+        Return a key function for min/sort by (cached) distance from a
+        '''
+        return lambda b: self.distance(a, b)
+
+    def angle(self, a, b):
+        '''
+        Cached a.calculate_angle_between(b)
+        '''
+        ka, kb = self._key(a), self._key(b)
+        angle = self._angle.get((ka, kb))
+        if angle is None:
+            self.misses += 1
+            angle = math.degrees(math.atan2(b.y - a.y, b.x - a.x)) % 360
+            self._angle[(ka, kb)] = angle
+            self._angle[(kb, ka)] = (angle + 180) % 360
+        else:
+            self.hits += 1
+        return angle
+
+    def closest_point(self, a, target, min_distance=1):
+        '''
+        Cached a.closest_point_to(target, min_distance). The returned
+        Position is shared, so callers must not modify it.
+        '''
+        key = (self._key(a), self._key(target), min_distance)
+        point = self._closest.get(key)
+        if point is None:
+            self.misses += 1
+            angle = self.angle(target, a)
+            radius = target.radius + min_distance
+            point = entity.Position(target.x + radius*math.cos(math.radians(angle)),
+                                    target.y + radius*math.sin(math.radians(angle)))
+            self._closest[key] = point
+        else:
+            self.hits += 1
+        return point
+
+    def stats(self):
+        '''
+        Hit/miss counters for the profiler
+        '''
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_rate': round(self.hits/total, 3) if total else 0.}
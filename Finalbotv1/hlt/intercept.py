@@ -0,0 +1,66 @@
+'''
+Batched intercept points.
+
+Targets are assumed to keep last turn's velocity (the move update_enems
+estimates from their previous position). A pursuer can reach a point k
+turns ahead if it is within k full thrusts of MAX_SPEED, so the earliest
+intercept is the first k at which the target's predicted position is in
+reach. All pursuer/target pairs are solved at once.
+'''
+import numpy as np
+
+from . import constants
+from .entity import Position
+
+
+def solve(px, py, tx, ty, vx, vy, standoff, horizon=10):
+    '''
+    Earliest intercept of targets moving at (vx, vy) by pursuers at
+    (px, py). Arguments broadcast against each other, e.g. pursuers as
+    (A, 1) columns and targets as (1, E) rows.
+
+    :param standoff: Distance short of the target's centre that counts as reached
+    :param horizon: Last turn considered; targets out of reach by then are
+                    met at their horizon position
+    :return: (turns, x, y) arrays, the intercept turn and the target's
+             predicted centre at that turn
+    '''
+    shape = np.broadcast(px, tx).shape
+    k = np.arange(horizon + 1).reshape((-1,) + (1,)*len(shape))
+    fx = np.broadcast_to(tx + vx*k, (horizon + 1,) + shape)
+    fy = np.broadcast_to(ty + vy*k, (horizon + 1,) + shape)
+    reach = np.hypot(fx - px, fy - py) - standoff <= k*constants.MAX_SPEED
+    turns = np.where(reach.any(axis=0), reach.argmax(axis=0), horizon)
+    return (turns, np.take_along_axis(fx, turns[None], axis=0)[0],
+            np.take_along_axis(fy, turns[None], axis=0)[0])
+
+
+class Intercepts:
+    '''
+    Intercepts of every enemy ship by each of my undocked ships, solved in
+    one batch from the entity store
+    '''
+    def __init__(self, store, horizon=10):
+        ships = store.ships
+        mine = np.nonzero(store.mask('mine') & store.mask('undocked'))[0]
+        enems = np.nonzero(store.mask('enemy'))[0]
+        self.pursuers = {ships.objects[r].id: i for i, r in enumerate(mine)}
+        self.targets = {ships.objects[r].id: j for j, r in enumerate(enems)}
+
+        vx, vy = ships.x[enems] - ships.px[enems], ships.y[enems] - ships.py[enems]
+        self.turns, self.x, self.y = solve(
+            ships.x[mine][:, None], ships.y[mine][:, None],
+            ships.x[enems][None, :], ships.y[enems][None, :], vx[None, :], vy[None, :],
+            standoff=2*constants.SHIP_RADIUS + 1, horizon=horizon)
+
+    def point(self, ship_id, target):
+        '''
+        Predicted position of target where ship_id can first meet it, as a
+        ship sized Position (target itself if the pair wasn't solved)
+        '''
+        i, j = self.pursuers.get(ship_id), self.targets.get(target.id)
+        if i is None or j is None:
+            return target
+        point = Position(float(self.x[i, j]), float(self.y[i, j]))
+        point.radius = constants.SHIP_RADIUS
+        return point
@@ -68,29 +68,52 @@ class Game:
         logging.basicConfig(filename=log_file, level=logging.DEBUG, filemode='w')
         logging.info("Initialized bot {}".format(name))
 
-    def __init__(self, name):
+    def __init__(self, name, send_name=True):
         """
         Initialize the bot with the given name.
 
         :param name: The name of the bot.
+        :param send_name: Whether to send the name now. The engine waits for it
+                          before the first turn, so the init phase can be spent
+                          on initial_map until send_name() is called.
         """
         tag = int(self._get_string())
         Game._set_up_logging(tag, name)
         width, height = [int(x) for x in self._get_string().strip().split()]
-        self._send_string(name)
-        self._done_sending()
+        self._name = name
+        self._name_sent = False
+        if send_name:
+            self.send_name()
         self.map = game_map.Map(tag, width, height)
-        self.update_map()
+        self.map._parse(self._get_string())
         self.initial_map = copy.deepcopy(self.map)
 
-    def update_map(self):
+    def send_name(self):
+        """
+        Send the bot's name, ending the init phase (once only).
+
+        :return: nothing
+        """
+        if not self._name_sent:
+            self._send_string(self._name)
+            self._done_sending()
+            self._name_sent = True
+
+    def update_map(self, received=None):
         """
         Parse the map given by the engine.
         
+        :param received: If given, called once the map has been read and
+                         before it is parsed (e.g. to stop idle-time work)
         :return: new parsed map
         :rtype: game_map.Map
         """
         import logging
+        #the first turn only comes once the engine has the name
+        self.send_name()
+        map_string = self._get_string()
+        if received is not None:
+            received()
         logging.info("---NEW TURN---")
-        self.map._parse(self._get_string())
+        self.map._parse(map_string)
         return self.map
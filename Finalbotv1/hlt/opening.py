@@ -0,0 +1,262 @@
+'''
+Monte Carlo opening evaluator.
+
+During the init phase both openings are played out many times from the
+initial map with a crude, self-contained rules model (no engine binary):
+ships fly straight at their target, dock, produce and shoot as in the
+real game, with jittered headings and a nearest rival that rushes with
+probability RUSH_PRIOR. Rollouts run in batches on a process pool until
+the time budget is spent, then the workers are stopped, batches still
+running included, so none of them is left using the CPU once the game
+starts. evaluate returns the opening with the best mean score and how
+confident that is.
+'''
+import itertools
+import logging
+import math
+import multiprocessing
+import os
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from . import constants
+
+ALL_IN = 'all_in'
+SCALING = 'scaling'
+OPENINGS = (ALL_IN, SCALING)
+
+#seconds of the init phase spent on rollouts
+BUDGET = 5.
+#turns played out by each rollout
+HORIZON = 60
+#rollouts per pool task
+BATCH = 4
+#chance that the nearest rival rushes us
+RUSH_PRIOR = .25
+#scaling ships turn on enemies this close
+DEFEND_RADIUS = 3*constants.MAX_SPEED
+#sd of the heading noise, degrees
+JITTER = 10.
+#score of being wiped out (or wiping out every rival), on top of the ship
+#difference: eliminated players rank last whatever the counts
+ELIMINATION = 20
+#z score of the difference in means above which the verdict is trusted
+CONFIDENT_Z = 2.
+
+_SHIP_COST = 12*constants.BASE_PRODUCTIVITY
+_FIGHT_RANGE = constants.WEAPON_RADIUS + 2*constants.SHIP_RADIUS
+
+#rollout count, mean and sd of the score (my ships - best rival's), and
+#fraction of rollouts ahead
+Stats = namedtuple('Stats', 'n mean sd wins')
+#best opening, z score of its lead over the other, opening -> Stats
+Verdict = namedtuple('Verdict', 'opening z stats')
+
+
+def snapshot(gmap):
+    '''
+    Picklable copy of what the rollouts need from the map
+    '''
+    me = gmap.get_me().id
+    n_players = len(gmap.all_players())
+    ships = [s for p in gmap.all_players() for s in p.all_ships()]
+    planets = gmap.all_planets()
+    return {'me': me,
+            'rival': (me + 2)%4 if n_players > 2 else (me + 1)%2,
+            'players': [p.id for p in gmap.all_players()],
+            'width': gmap.width, 'height': gmap.height,
+            'x': np.array([s.x for s in ships]), 'y': np.array([s.y for s in ships]),
+            'owner': np.array([s.owner.id for s in ships]),
+            'px': np.array([p.x for p in planets]), 'py': np.array([p.y for p in planets]),
+            'pr': np.array([p.radius for p in planets]),
+            'spots': np.array([p.num_docking_spots for p in planets])}
+
+
+def rollout(snap, opening, rng, horizon=HORIZON):
+    '''
+    Play opening for horizon turns from snap
+
+    :return: my ship count minus the largest rival's at the end, less
+             ELIMINATION if I was wiped out (plus if every rival was)
+    '''
+    me, rival = snap['me'], snap['rival']
+    foe = {p: -1 for p in snap['players']}
+    foe[me] = rival if opening == ALL_IN else -1
+    if rng.random() < RUSH_PRIOR:
+        foe[rival] = me
+
+    px, py, pr, spots = snap['px'], snap['py'], snap['pr'], snap['spots']
+    powner = np.full(len(px), -1)
+    prod = np.zeros(len(px))
+    x, y, owner = snap['x'].copy(), snap['y'].copy(), snap['owner'].copy()
+    hp = np.full(len(x), float(constants.MAX_SHIP_HEALTH))
+    state = np.zeros(len(x), dtype=int) #0 undocked, 1 docking, 2 docked
+    timer = np.zeros(len(x), dtype=int)
+    claim = np.full(len(x), -1)
+    alive = np.ones(len(x), dtype=bool)
+    speed = constants.MAX_SPEED
+
+    for _ in range(horizon):
+        d = np.hypot(x[:, None] - x[None, :], y[:, None] - y[None, :])
+        enemy = (owner[:, None] != owner[None, :]) & alive[None, :] & alive[:, None]
+        free = alive & (state == 0)
+        ships_foe = np.array([foe[o] for o in owner])
+
+        #rushers chase their foe's nearest ship, scalers defend themselves
+        d_foe = np.where(enemy & (owner[None, :] == ships_foe[:, None]), d, np.inf)
+        d_any = np.where(enemy, d, np.inf)
+        d_fight = np.where((ships_foe >= 0)[:, None], d_foe, d_any)
+        near = np.argmin(d_fight, axis=1)
+        gap = d_fight[np.arange(len(x)), near]
+        fight = free & ((ships_foe >= 0) | (gap < DEFEND_RADIUS)) & np.isfinite(gap)
+        tx, ty = x[near], y[near]
+        stop = np.full(len(x), 2.)
+
+        #the rest fly to a planet they can dock at
+        for i in np.nonzero(free & ~fight)[0]:
+            c = claim[i]
+            taken = np.bincount(claim[alive & (owner == owner[i]) & (claim >= 0)],
+                                minlength=len(px))
+            if c < 0 or powner[c] not in (-1, owner[i]) or taken[c] > spots[c]:
+                ok = ((powner == -1) | (powner == owner[i])) & (taken < spots)
+                if not ok.any():
+                    claim[i] = -1
+                    continue
+                c = claim[i] = np.argmin(np.where(ok, np.hypot(px - x[i], py - y[i]), np.inf))
+            tx[i], ty[i], stop[i] = px[c], py[c], pr[c] + constants.DOCK_RADIUS/2
+
+        moving = free & (fight | (claim >= 0))
+        dist = np.hypot(tx - x, ty - y)
+        step = np.where(moving, np.clip(dist - stop, 0, speed), 0)
+        angle = np.arctan2(ty - y, tx - x) + np.radians(rng.normal(0, JITTER, len(x)))
+        x = np.clip(x + step*np.cos(angle), 0, snap['width'])
+        y = np.clip(y + step*np.sin(angle), 0, snap['height'])
+
+        #dock, produce, spawn
+        c = np.maximum(claim, 0)
+        arrive = free & ~fight & (claim >= 0) \
+            & (np.hypot(px[c] - x, py[c] - y) - pr[c] <= constants.DOCK_RADIUS)
+        for i in np.nonzero(arrive)[0]:
+            if powner[claim[i]] in (-1, owner[i]):
+                powner[claim[i]] = owner[i]
+                state[i], timer[i] = 1, constants.DOCK_TURNS
+        timer[state == 1] -= 1
+        state[(state == 1) & (timer <= 0)] = 2
+        docked = np.bincount(claim[alive & (state == 2)], minlength=len(px))
+        prod += constants.BASE_PRODUCTIVITY*docked
+        for p in np.nonzero(prod >= _SHIP_COST)[0]:
+            prod[p] -= _SHIP_COST
+            a = math.atan2(snap['height']/2 - py[p], snap['width']/2 - px[p])
+            r = pr[p] + constants.SPAWN_RADIUS
+            x = np.append(x, px[p] + r*math.cos(a))
+            y = np.append(y, py[p] + r*math.sin(a))
+            owner = np.append(owner, powner[p])
+            hp = np.append(hp, float(constants.MAX_SHIP_HEALTH))
+            state, timer = np.append(state, 0), np.append(timer, 0)
+            claim, alive = np.append(claim, -1), np.append(alive, True)
+
+        #undocked ships split their damage between the enemies in range
+        d = np.hypot(x[:, None] - x[None, :], y[:, None] - y[None, :])
+        hit = (d <= _FIGHT_RANGE) & (owner[:, None] != owner[None, :]) \
+            & (alive & (state == 0))[:, None] & alive[None, :]
+        targets = hit.sum(axis=1)
+        hp -= (hit*(constants.WEAPON_DAMAGE/np.maximum(targets, 1))[:, None]).sum(axis=0)
+        dead = alive & (hp <= 0)
+        if dead.any():
+            alive &= ~dead
+            held = np.bincount(claim[alive & (state > 0)], minlength=len(px))
+            lost = (powner >= 0) & (held == 0)
+            powner[lost], prod[lost] = -1, 0
+        counts = np.bincount(owner[alive], minlength=max(snap['players']) + 1)
+        if not counts[me] or counts.sum() == counts[me]:
+            break
+
+    counts = np.bincount(owner[alive], minlength=max(snap['players']) + 1)
+    rivals = [counts[p] for p in snap['players'] if p != me]
+    score = float(counts[me] - max(rivals))
+    if not counts[me]:
+        score -= ELIMINATION
+    elif not max(rivals):
+        score += ELIMINATION
+    return score
+
+
+def _batch(snap, opening, seeds, horizon):
+    return [rollout(snap, opening, np.random.default_rng(s), horizon) for s in seeds]
+
+
+def _verdict(scores):
+    stats = {}
+    for opening, s in scores.items():
+        s = np.array(s)
+        stats[opening] = Stats(len(s), float(s.mean()) if len(s) else 0.,
+                               float(s.std(ddof=1)) if len(s) > 1 else 0.,
+                               float((s > 0).mean()) if len(s) else 0.)
+    best, other = sorted(OPENINGS, key=lambda o: -stats[o].mean)
+    a, b = stats[best], stats[other]
+    if min(a.n, b.n) < 2:
+        z = 0.
+    else:
+        se = math.sqrt(a.sd**2/a.n + b.sd**2/b.n)
+        z = (a.mean - b.mean)/se if se else (math.inf if a.mean > b.mean else 0.)
+    return Verdict(best, z, stats)
+
+
+def evaluate(gmap, budget=BUDGET, horizon=HORIZON, workers=None):
+    '''
+    Roll out both openings from gmap on a process pool until budget
+    seconds have passed, or in process if no pool can be started or a
+    rollout on it fails
+
+    :return: Verdict
+    '''
+    deadline = time.time() + budget
+    snap = snapshot(gmap)
+    scores = {o: [] for o in OPENINGS}
+    seeds = itertools.count()
+    openings = itertools.cycle(OPENINGS)
+
+    def task():
+        return next(openings), [next(seeds) for _ in range(BATCH)]
+
+    workers = workers or os.cpu_count() or 1
+    try:
+        pool = multiprocessing.get_context('fork').Pool(workers)
+    except (OSError, ValueError) as e:
+        logging.warning('Opening: no process pool ('+str(e)+'), rolling out in process')
+        pool = None
+
+    if pool is not None:
+        pending = [] #(opening, result) in submission order
+        try:
+            while time.time() < deadline:
+                while len(pending) < 2*workers:
+                    opening, batch = task()
+                    pending.append((opening, pool.apply_async(_batch, (snap, opening, batch,
+                                                                       horizon))))
+                pending[0][1].wait(max(deadline - time.time(), 0))
+                for opening, result in [p for p in pending if p[1].ready()]:
+                    pending.remove((opening, result))
+                    scores[opening].extend(result.get())
+        except Exception as e:
+            #a failed batch or a broken pool leaves the rest of the budget to
+            #the in process rollouts below
+            logging.warning('Opening: rollouts on the pool failed ('+repr(e)
+                            +'), rolling out in process')
+        finally:
+            #batches still running are dropped rather than waited for
+            pool.terminate()
+            pool.join()
+
+    while time.time() < deadline:
+        opening, batch = task()
+        scores[opening].extend(_batch(snap, opening, batch, horizon))
+
+    verdict = _verdict(scores)
+    for opening, s in verdict.stats.items():
+        logging.info('Opening: '+opening+' n '+str(s.n)+' mean '+str(round(s.mean, 2))
+                     +' sd '+str(round(s.sd, 2))+' wins '+str(round(s.wins, 2)))
+    logging.info('Opening: best '+verdict.opening+' z '+str(round(verdict.z, 2)))
+    return verdict
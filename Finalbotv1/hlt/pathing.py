@@ -0,0 +1,246 @@
+import logging
+import math
+import time
+
+import numpy as np
+
+from . import constants, entity
+from .planner import finish
+
+
+class PathPlanner:
+    '''
+    Visibility graph path planner over the static planet set.
+
+    Nodes are tangent points on a ring around every planet. Which nodes can
+    see each other, and the shortest paths between them, are computed once
+    (and again only if a planet is destroyed). A ship then only has to find
+    which nodes it can see to get its next waypoint.
+
+    Given a hlt.planner.PlanQueue, rebuilds after the first are queued
+    there and the old graph (which only has extra planets) stays in use
+    until the new one is done, at most max_age turns later.
+    '''
+    #what a rebuilt graph replaces
+    _GRAPH = ('width', 'height', 'planet_ids', 'px', 'py', 'pr',
+              'nx', 'ny', 'node_planet', 'dist', 'succ', '_goal_cache')
+
+    def __init__(self, n_tangents=8, margin=0.6, queue=None, max_age=2):
+        self.n_tangents = n_tangents
+        self.margin = margin
+        self.queue = queue
+        self.max_age = max_age
+
+        self.width = 0
+        self.height = 0
+        self.planet_ids = ()
+        self.px = np.zeros(0)
+        self.py = np.zeros(0)
+        self.pr = np.zeros(0)
+
+        self.nx = np.zeros(0) #node x coordinates
+        self.ny = np.zeros(0) #node y coordinates
+        self.node_planet = np.zeros(0, dtype=int) #planet id each node rings
+        self.dist = np.zeros((0, 0)) #shortest path lengths between nodes
+        self.succ = np.zeros((0, 0), dtype=int) #first hop of each shortest path
+
+        self._goal_cache = {} #goal key -> (visible nodes, distances)
+
+    def update(self, gmap):
+        '''
+        Rebuild the graph if the planet set has changed since the last call
+        '''
+        planet_ids = tuple(sorted(p.id for p in gmap.all_planets()))
+        if planet_ids == self.planet_ids:
+            return
+        planets = [gmap.get_planet(pid) for pid in planet_ids]
+        if self.queue is None or not self.planet_ids:
+            finish(self._build(gmap.width, gmap.height, planets))
+            return
+
+        key = ('paths', planet_ids)
+        self.queue.cancel(lambda k: k[0] == 'paths' and k != key)
+        self.queue.submit(key, lambda: PathPlanner(self.n_tangents, self.margin)._build(
+            gmap.width, gmap.height, planets), self.max_age)
+        graph = self.queue.take(key)
+        if graph is not None:
+            for name in self._GRAPH:
+                setattr(self, name, getattr(graph, name))
+
+    def _build(self, width, height, planets):
+        '''
+        Generator building the graph over planets, see hlt.planner
+
+        :return: self
+        '''
+        start = time.time()
+        self.width, self.height = width, height
+        self.planet_ids = tuple(p.id for p in planets)
+        self.px = np.array([p.x for p in planets])
+        self.py = np.array([p.y for p in planets])
+        self.pr = np.array([p.radius for p in planets])
+
+        self._build_nodes(planets)
+        yield
+        yield from self._build_paths()
+        self._goal_cache = {}
+        logging.info('PathPlanner: '+str(len(self.nx))+' nodes built in '
+                     +str(time.time()-start)+' seconds')
+        return self
+
+    def _build_nodes(self, planets):
+        '''
+        Place tangent points around each planet.
+
+        The ring radius is chosen so that the chord between two adjacent
+        nodes still clears the planet by a ship radius.
+        '''
+        fudge = constants.SHIP_RADIUS + self.margin
+        ring = 1./math.cos(math.pi/self.n_tangents)
+        nx, ny, owner = [], [], []
+        for p in planets:
+            r = (p.radius + fudge)*ring
+            for k in range(self.n_tangents):
+                theta = 2*math.pi*(k + .5)/self.n_tangents
+                nx.append(p.x + r*math.cos(theta))
+                ny.append(p.y + r*math.sin(theta))
+                owner.append(p.id)
+        nx, ny, owner = np.array(nx), np.array(ny), np.array(owner, dtype=int)
+
+        #drop nodes that fall off the map or inside another planet
+        keep = (nx > 2*constants.SHIP_RADIUS) & (nx < self.width - 2*constants.SHIP_RADIUS) \
+            & (ny > 2*constants.SHIP_RADIUS) & (ny < self.height - 2*constants.SHIP_RADIUS)
+        if len(self.px):
+            d = np.hypot(nx[:, None] - self.px[None, :], ny[:, None] - self.py[None, :])
+            keep &= (d > self.pr[None, :] + constants.SHIP_RADIUS).all(axis=1)
+        self.nx, self.ny, self.node_planet = nx[keep], ny[keep], owner[keep]
+
+    def _blocked(self, x0, y0, x1, y1):
+        '''
+        Vectorized segment/planet test.
+
+        Segment endpoints broadcast against each other, the planet axis is
+        appended last. Returns True where a segment passes through a planet.
+        '''
+        fudge = constants.SHIP_RADIUS + .05
+        dx, dy = x1 - x0, y1 - y0
+        a = dx*dx + dy*dy
+        a = np.where(a == 0, 1e-9, a)
+        cx = self.px - x0[..., None]
+        cy = self.py - y0[..., None]
+        t = np.clip((cx*dx[..., None] + cy*dy[..., None])/a[..., None], 0., 1.)
+        ex = cx - t*dx[..., None]
+        ey = cy - t*dy[..., None]
+        return (ex*ex + ey*ey <= (self.pr + fudge)**2).any(axis=-1)
+
+    def _build_paths(self, chunk=16):
+        '''
+        All pairs shortest paths between nodes (Floyd-Warshall), yielding
+        every chunk pivots
+        '''
+        n = len(self.nx)
+        x0, y0 = self.nx[:, None], self.ny[:, None]
+        x1, y1 = self.nx[None, :], self.ny[None, :]
+        x0, x1 = np.broadcast_arrays(x0, x1)
+        y0, y1 = np.broadcast_arrays(y0, y1)
+        dist = np.hypot(x1 - x0, y1 - y0)
+        if len(self.px):
+            dist[self._blocked(x0, y0, x1, y1)] = np.inf
+        np.fill_diagonal(dist, 0.)
+
+        succ = np.tile(np.arange(n), (n, 1))
+        for k in range(n):
+            via = dist[:, k, None] + dist[None, k, :]
+            better = via < dist
+            dist = np.where(better, via, dist)
+            succ = np.where(better, succ[:, k, None], succ)
+            if k % chunk == chunk - 1:
+                yield
+        self.dist = dist
+        self.succ = succ
+
+    def _visible_from(self, x, y):
+        '''
+        Return the indices of the nodes visible from (x, y), and their distances
+        '''
+        if not len(self.nx):
+            return np.zeros(0, dtype=int), np.zeros(0)
+        x0 = np.full(len(self.nx), float(x))
+        y0 = np.full(len(self.ny), float(y))
+        seen = ~self._blocked(x0, y0, self.nx, self.ny) if len(self.px) \
+            else np.ones(len(self.nx), dtype=bool)
+        idx = np.nonzero(seen)[0]
+        return idx, np.hypot(self.nx[idx] - x, self.ny[idx] - y)
+
+    def _goal_nodes(self, target):
+        '''
+        Nodes from which the target can be reached directly.
+
+        Planets are reached from their own ring, other targets from every node
+        that can see them. Both are static, so they are cached.
+        '''
+        if isinstance(target, entity.Planet):
+            key = ('p', target.id)
+        else:
+            key = (round(target.x, 1), round(target.y, 1))
+        goal = self._goal_cache.get(key)
+        if goal is None:
+            if isinstance(target, entity.Planet):
+                idx = np.nonzero(self.node_planet == target.id)[0]
+                goal = (idx, np.zeros(len(idx)))
+            else:
+                goal = self._visible_from(target.x, target.y)
+            self._goal_cache[key] = goal
+        return goal
+
+    def is_clear(self, ship, target):
+        '''
+        Check whether the straight line from ship to target misses every planet.
+        The target itself is not counted as an obstacle.
+        '''
+        if not len(self.px):
+            return True
+        if isinstance(target, entity.Planet):
+            goal = ship.closest_point_to(target)
+        else:
+            goal = target
+        blocked = self._blocked(np.array(float(ship.x)), np.array(float(ship.y)),
+                                np.array(float(goal.x)), np.array(float(goal.y)))
+        return not bool(blocked)
+
+    def next_waypoint(self, ship, target):
+        '''
+        Return the point the ship should head for next on its way to target.
+
+        This is the target itself when the path is clear, otherwise the first
+        tangent point of the shortest path through the graph.
+        '''
+        if not len(self.nx) or self.is_clear(ship, target):
+            return target
+
+        start, d_start = self._visible_from(ship.x, ship.y)
+        #a node the ship is already sitting on is no use as a waypoint
+        away = d_start > 1.
+        start, d_start = start[away], d_start[away]
+        goal, d_goal = self._goal_nodes(target)
+        if not len(start) or not len(goal):
+            return target
+
+        cost = d_start[:, None] + self.dist[np.ix_(start, goal)] + d_goal[None, :]
+        i, j = np.unravel_index(np.argmin(cost), cost.shape)
+        if not np.isfinite(cost[i, j]):
+            return target
+        node = start[i]
+        return entity.Position(float(self.nx[node]), float(self.ny[node]))
+
+    def path(self, source, target):
+        '''
+        Return the full list of waypoints between two nodes
+        '''
+        if not np.isfinite(self.dist[source, target]):
+            return []
+        path = [source]
+        while source != target:
+            source = int(self.succ[source, target])
+            path.append(source)
+        return [entity.Position(float(self.nx[n]), float(self.ny[n])) for n in path]
@@ -0,0 +1,139 @@
+'''
+Anytime planning queue.
+
+Expensive plans (flow fields, the path graph) are written as generators
+that yield between chunks of work, and are queued rather than worked out
+in full the moment they're needed. Each turn, once the commands are
+built, the time left in the turn goes to advancing the queue, oldest plan
+first, and later turns pick up whatever finished. A plan still unfinished
+max_age turns after it was queued is advanced on the spot when taken, but
+only up to the turn's deadline, so a forced plan can't spike a turn
+either. If that isn't enough the consumer keeps using its previous
+result until the plan finishes.
+'''
+import time
+from collections import OrderedDict, defaultdict
+
+#seconds into the turn the queue may run until
+TURN_BUDGET = 1.5
+
+
+def finish(steps):
+    '''
+    Run a plan's generator to the end, for its result
+    '''
+    try:
+        while True:
+            next(steps)
+    except StopIteration as stop:
+        return stop.value
+
+
+class Plan:
+    '''
+    One queued plan
+
+    :ivar steps: The plan's generator, returning the result
+    :ivar queued: Turn the plan was queued on
+    '''
+    __slots__ = ('steps', 'queued', 'max_age', 'done', 'result')
+
+    def __init__(self, steps, queued, max_age):
+        self.steps = steps
+        self.queued = queued
+        self.max_age = max_age
+        self.done = False
+        self.result = None
+
+
+class PlanQueue:
+    '''
+    Plans by key, in the order they were queued
+
+    :ivar deadline: time.time() forced plans may run until this turn (None:
+                    until done)
+    '''
+    def __init__(self):
+        self.turn = 0
+        self.deadline = None
+        self.plans = OrderedDict()
+        self.counts = defaultdict(int)
+
+    def start_turn(self, turn, deadline=None):
+        self.turn = turn
+        self.deadline = deadline
+        self.counts = defaultdict(int)
+
+    def __contains__(self, key):
+        return key in self.plans
+
+    def submit(self, key, make, max_age=2):
+        '''
+        Queue the plan make() returns under key, unless key is queued already
+        '''
+        if key not in self.plans:
+            self.plans[key] = Plan(make(), self.turn, max_age)
+            self.counts['queued'] += 1
+
+    def cancel(self, match):
+        '''
+        Drop every plan whose key match(key) is true for
+        '''
+        for key in [key for key in self.plans if match(key)]:
+            del self.plans[key]
+            self.counts['cancelled'] += 1
+
+    def take(self, key):
+        '''
+        Result of plan key, removing it from the queue, or None if it isn't
+        done yet (it is advanced until the turn's deadline if max_age turns
+        old)
+        '''
+        plan = self.plans.get(key)
+        if plan is None:
+            return None
+        if not plan.done and self.turn - plan.queued >= plan.max_age:
+            self._advance(plan, self.deadline)
+            self.counts['forced'] += 1
+        if not plan.done:
+            return None
+        del self.plans[key]
+        return plan.result
+
+    def run(self, deadline):
+        '''
+        Advance queued plans, oldest first, until deadline (a time.time())
+        '''
+        start = time.time()
+        for plan in list(self.plans.values()):
+            if time.time() >= deadline:
+                break
+            if not plan.done:
+                self._advance(plan, deadline)
+        self.counts['run_ms'] += int(1000*(time.time() - start))
+
+    def _advance(self, plan, deadline):
+        '''
+        Step plan until it is done or deadline has passed (None: until done)
+        '''
+        try:
+            while deadline is None or time.time() < deadline:
+                next(plan.steps)
+                self.counts['steps'] += 1
+        except StopIteration as stop:
+            plan.done, plan.result = True, stop.value
+            self.counts['finished'] += 1
+
+    def pending(self):
+        '''
+        Number of queued plans not done yet
+        '''
+        return sum(1 for plan in self.plans.values() if not plan.done)
+
+    def stats(self):
+        '''
+        This turn's queue activity and the plans still pending
+        '''
+        stats = dict(self.counts)
+        stats['pending'] = self.pending()
+        return stats
@@ -0,0 +1,205 @@
+'''
+Batched potential field for fleeing and cornering ships.
+
+Each flee or corner ship is pulled toward its goal and pushed away from
+nearby enemies (when they outnumber my miners and attackers around it),
+from nearby enemy clusters and from its nearest ally. The forces on all of
+them are summed at once from the entity store, and the discrete move set
+(every HEADING_STEP degrees at the ship's speed) is scored for all of them
+in one go: moves that end off the map or cross a planet are dropped and the
+rest are ranked by how well they follow the field. navigate_flee and
+navigate_corner try the moves in that order instead of sweeping headings.
+'''
+import math
+from collections import namedtuple
+
+import numpy as np
+
+from . import constants
+from .entity import Position, Ship
+
+#reach of each kind of push
+ENEMY_RADIUS = 5 + constants.MAX_SPEED
+CLUSTER_RADIUS = 5*constants.MAX_SPEED
+ALLY_RADIUS = 2*constants.MAX_SPEED
+#spacing of the headings in the move set
+HEADING_STEP = 3
+
+#goal: pull toward the goal, at most one full thrust
+#enemy, cluster, ally: MAX_SPEED push per enemy, per ship in a cluster and
+#from the nearest ally
+#threat: penalty for ending a move near an enemy's predicted position, 0
+#ranks moves by heading alone
+Weights = namedtuple('Weights', 'goal enemy cluster ally threat')
+
+#the defaults reproduce the per ship loops the field replaced
+WEIGHTS = {5: Weights(goal=1., enemy=1., cluster=0., ally=0., threat=0.),
+           6: Weights(goal=1., enemy=1., cluster=1., ally=1., threat=0.)}
+
+#vel and target of the step along the field, headings of the feasible moves
+#in rank order, pushed if anything but the goal acted on the ship
+Move = namedtuple('Move', 'vel target headings pushed')
+
+
+def nearest_corner(gmap, ship):
+    corners = [Position(1., 1.), Position(1., gmap.height-1.),
+               Position(gmap.width-1., 1.), Position(gmap.width-1., gmap.height-1.)]
+    return min(corners, key=gmap.geometry.distance_from(ship))
+
+
+def corner_goal(gmap, gstate, ship):
+    '''
+    Next point toward the ship's corner, around any planets in the way
+    '''
+    target = gstate.ships_targets.get(ship.id)
+    if target is None:
+        target = gstate.ships_targets[ship.id] = nearest_corner(gmap, ship)
+    return gmap.geometry.closest_point(ship, gstate.paths.next_waypoint(ship, target))
+
+
+def flee_goal(gmap, gstate, ship):
+    '''
+    The nearest planet, or nowhere while enemy clusters are close
+    '''
+    if gstate.enem_clusters.near(ship, CLUSTER_RADIUS):
+        return ship
+    planet = min(gmap.all_planets(), key=gmap.geometry.distance_from(ship))
+    return gmap.geometry.closest_point(ship, planet)
+
+
+GOALS = {5: corner_goal, 6: flee_goal}
+
+
+def _unit(dx, dy):
+    d = np.hypot(dx, dy)
+    d = np.where(d > 0, d, np.inf)
+    return dx/d, dy/d
+
+
+class PotentialField:
+    '''
+    Field moves of my flee and corner ships, solved together the first time
+    one of them asks this turn
+
+    :ivar moves: Ship id -> Move
+    '''
+    def __init__(self, gmap, gstate, weights=WEIGHTS):
+        self.gmap = gmap
+        self.gstate = gstate
+        self.weights = weights
+        self.moves = {}
+
+    def move(self, ship):
+        '''
+        Move of ship, solving it with every other flee and corner ship not
+        yet solved (ships that changed role since join the next batch)
+        '''
+        move = self.moves.get(ship.id)
+        if move is None:
+            me = self.gmap.get_me()
+            batch = [s for s in (me.get_ship(sid) for role in self.weights
+                                 for sid in self.gstate.role_members[role])
+                     if s is not None and s.id not in self.moves and s.id != ship.id
+                     and s.docking_status is Ship.DockingStatus.UNDOCKED]
+            self._solve([ship] + batch)
+            move = self.moves[ship.id]
+        return move
+
+    def _solve(self, ships):
+        store = self.gmap.store
+        table = store.ships
+        speed = constants.MAX_SPEED
+        w = np.array([self.weights.get(s.role, self.weights[6]) for s in ships]).T
+        sx = np.array([s.x for s in ships])
+        sy = np.array([s.y for s in ships])
+        rows = np.array([s.row for s in ships])
+        goals = [GOALS.get(s.role, flee_goal)(self.gmap, self.gstate, s) for s in ships]
+
+        #pull toward the goal, one thrust at most
+        dx = np.array([g.x for g in goals]) - sx
+        dy = np.array([g.y for g in goals]) - sy
+        pull = np.minimum(np.hypot(dx, dy), speed)
+        ux, uy = _unit(dx, dy)
+        fx, fy = w[0]*pull*ux, w[0]*pull*uy
+        px, py = np.zeros(len(ships)), np.zeros(len(ships))
+
+        #every near enemy, if they outnumber my miners and attackers around
+        enems = np.nonzero(store.mask('enemy') & store.mask('undocked'))[0]
+        friends = np.nonzero(store.role_mask(1) | store.role_mask(2))[0]
+        ex, ey = table.x[enems], table.y[enems]
+        dx, dy = sx[:, None] - ex[None, :], sy[:, None] - ey[None, :]
+        near = np.hypot(dx, dy) <= ENEMY_RADIUS
+        backup = np.hypot(sx[:, None] - table.x[friends][None, :],
+                          sy[:, None] - table.y[friends][None, :]) <= ENEMY_RADIUS
+        near &= (near.sum(axis=1) >= backup.sum(axis=1))[:, None]
+        ux, uy = _unit(dx, dy)
+        px += w[1]*speed*(ux*near).sum(axis=1)
+        py += w[1]*speed*(uy*near).sum(axis=1)
+
+        #every near cluster, by its size
+        clusters = self.gstate.enem_clusters.clusters
+        cx = np.array([c.x for c in clusters])
+        cy = np.array([c.y for c in clusters])
+        dx, dy = sx[:, None] - cx[None, :], sy[:, None] - cy[None, :]
+        near = np.hypot(dx, dy) - np.array([c.radius for c in clusters]) <= CLUSTER_RADIUS
+        size = np.array([c.size for c in clusters])*near
+        ux, uy = _unit(dx, dy)
+        px += w[2]*speed*(ux*size).sum(axis=1)
+        py += w[2]*speed*(uy*size).sum(axis=1)
+
+        #the nearest ally
+        allies = np.nonzero(store.mask('mine'))[0]
+        dx, dy = sx[:, None] - table.x[allies][None, :], sy[:, None] - table.y[allies][None, :]
+        d = np.hypot(dx, dy)
+        d[rows[:, None] == allies[None, :]] = np.inf
+        if len(allies) > 1:
+            j = np.argmin(d, axis=1)
+            i = np.arange(len(ships))
+            near = d[i, j] <= ALLY_RADIUS
+            ux, uy = _unit(dx[i, j], dy[i, j])
+            px += w[3]*speed*ux*near
+            py += w[3]*speed*uy*near
+
+        fx, fy = fx + px, fy + py
+        force = np.hypot(fx, fy)
+        heading = np.arctan2(fy, fx)
+        #stop one unit short of the field's end point, like _step_toward
+        vel = np.where(force - 1 >= speed, speed, np.floor(np.maximum(force - 1, 0)))
+
+        #the move set, ends (N, H)
+        angles = np.radians(np.arange(0, 360, HEADING_STEP))
+        mx = vel[:, None]*np.cos(angles)[None, :]
+        my = vel[:, None]*np.sin(angles)[None, :]
+        tx, ty = sx[:, None] + mx, sy[:, None] + my
+        score = np.cos(angles[None, :] - heading[:, None])
+
+        edge = 2*constants.SHIP_RADIUS
+        feasible = (tx >= edge) & (tx <= self.gmap.width - edge) \
+            & (ty >= edge) & (ty <= self.gmap.height - edge)
+
+        #moves passing within reach of a planet, (N, H, P)
+        planets = store.planets
+        alive = np.nonzero(planets.alive[:planets.size])[0]
+        qx = planets.x[alive][None, None, :] - sx[:, None, None]
+        qy = planets.y[alive][None, None, :] - sy[:, None, None]
+        length = np.maximum(vel*vel, 1e-9)[:, None, None]
+        t = np.clip((qx*mx[..., None] + qy*my[..., None])/length, 0, 1)
+        gap = np.hypot(qx - t*mx[..., None], qy - t*my[..., None])
+        feasible &= ~(gap <= (planets.radius[alive] + constants.SHIP_RADIUS + .05)).any(axis=2)
+
+        if w[4].any() and len(enems):
+            #where enemies end up if they keep last turn's move
+            nx = 2*ex - table.px[enems]
+            ny = 2*ey - table.py[enems]
+            d = np.hypot(tx[..., None] - nx, ty[..., None] - ny)
+            score -= w[4][:, None]*np.maximum(1 - d/ENEMY_RADIUS, 0).sum(axis=2)
+
+        order = np.argsort(-score, axis=1, kind='stable')
+        steps = np.degrees(angles)
+        for i, ship in enumerate(ships):
+            target = Position(ship.x + math.cos(heading[i])*vel[i],
+                              ship.y + math.sin(heading[i])*vel[i])
+            headings = [float(steps[k]) for k in order[i] if feasible[i, k]]
+            self.moves[ship.id] = Move(int(vel[i]), target, headings,
+                                       bool(px[i] or py[i]))
+        self.gstate.profiler.count('field_batches')
@@ -0,0 +1,63 @@
+import logging
+import time
+from collections import defaultdict
+
+
+class Profiler:
+    '''
+    Collects per turn counters and timings and logs them at the end of the turn.
+
+    Other components can register a stats source: a function returning a
+    dict, polled when the turn's report is built.
+    '''
+    def __init__(self):
+        self.turn = -1
+        self.counters = defaultdict(int)
+        self.timings = defaultdict(float)
+        self.sources = {}
+
+    def start_turn(self, turn):
+        '''
+        Reset the per turn counters and timings
+        '''
+        self.turn = turn
+        self.counters = defaultdict(int)
+        self.timings = defaultdict(float)
+
+    def register(self, name, source):
+        '''
+        Add a stats source, replacing any previous source of the same name
+        '''
+        self.sources[name] = source
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def add_time(self, name, seconds):
+        self.timings[name] += seconds
+
+    def timed(self, name, func, *args, **kwargs):
+        '''
+        Call func, adding its run time to timings[name]
+        '''
+        start = time.time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.timings[name] += time.time() - start
+
+    def report(self):
+        '''
+        Return this turn's counters, timings and registered stats
+        '''
+        report = {'turn': self.turn}
+        if self.counters:
+            report['counters'] = dict(self.counters)
+        if self.timings:
+            report['timings'] = {k: round(v, 4) for k, v in self.timings.items()}
+        for name, source in self.sources.items():
+            report[name] = source()
+        return report
+
+    def log(self):
+        logging.info('Profiler: '+str(self.report()))
@@ -0,0 +1,184 @@
+'''
+Beam search for local skirmishes.
+
+My attackers with an enemy within ENGAGE_RADIUS are grouped with their
+neighbours into skirmishes. For each one, a beam of joint moves is
+searched DEPTH turns ahead. Every ship takes one of MOVES relative to its
+nearest enemy, and the enemies close in as in hlt.combat. Each step is
+scored with the combat model: the damage dealt less RISK times the damage
+taken, less CRASH for every ship that ends on a friend, in a planet or
+off the map. navigate_attacker aims for the first move of the best line.
+Skirmishes the deadline leaves no time for are skipped, and their ships
+navigate as before.
+'''
+import time
+
+import numpy as np
+
+from . import combat, constants
+from .clusters import components
+from .entity import Position
+
+ENGAGE_RADIUS = 5 + 2*constants.MAX_SPEED
+#turns searched and lines kept after each
+DEPTH = 3
+BEAM = 6
+#random joint moves tried from each line, besides all ships taking the same move
+SAMPLES = 8
+#(heading from the nearest enemy in degrees, speed) of each move
+MOVES = ((0, constants.MAX_SPEED), (45, constants.MAX_SPEED), (-45, constants.MAX_SPEED),
+         (90, constants.MAX_SPEED), (-90, constants.MAX_SPEED), (180, constants.MAX_SPEED),
+         (0, constants.MAX_SPEED//2), (0, 0))
+#weight of damage taken against damage dealt
+RISK = 2.
+#penalty per ship ending a move on a friend, in a planet or off the map
+CRASH = 2*constants.WEAPON_DAMAGE
+#share of the turn budget (hlt.planner.TURN_BUDGET) the search may use,
+#leaving the rest to route the other ships
+SHARE = .8
+
+
+class Skirmishes:
+    '''
+    First moves of the best lines found for this turn's skirmishes, all
+    searched the first time an attacker asks
+
+    :ivar moves: Ship id -> Position to thrust to
+    :ivar deadline: time.time() after which no more skirmishes are searched
+    '''
+    def __init__(self, gmap, gstate, deadline):
+        self.gmap = gmap
+        self.gstate = gstate
+        self.deadline = deadline
+        self.moves = None
+
+    def move(self, ship):
+        '''
+        Where ship should thrust to this turn, or None if it isn't in a
+        searched skirmish
+        '''
+        if self.moves is None:
+            self.moves = {}
+            self._plan()
+        return self.moves.get(ship.id)
+
+    def _plan(self):
+        store = self.gmap.store
+        ships = store.ships
+        mine = np.nonzero(store.role_mask(2) & store.mask('undocked'))[0]
+        enems = np.nonzero(store.mask('enemy'))[0]
+        if not len(mine) or not len(enems):
+            return
+        d = store.distances(mine, enems)
+        engaged = (d <= ENGAGE_RADIUS).any(axis=1)
+        mine, d = mine[engaged], d[engaged]
+        if not len(mine):
+            return
+
+        labels = components(ships.x[mine], ships.y[mine], ENGAGE_RADIUS)
+        rng = np.random.default_rng(self.gstate.turn)
+        for label in np.unique(labels):
+            members = labels == label
+            if time.time() >= self.deadline:
+                self.gstate.profiler.count('skirmishes_skipped')
+                continue
+            rows = mine[members]
+            near = enems[(d[members] <= ENGAGE_RADIUS).any(axis=0)]
+            first = self._search(rows, near, rng)
+            if first is None:
+                self.gstate.profiler.count('skirmishes_skipped')
+                continue
+            self.gstate.profiler.count('skirmishes')
+            for r, x, y in zip(rows, *first):
+                self.moves[ships.objects[r].id] = Position(float(x), float(y))
+
+    def _search(self, rows, enem_rows, rng):
+        '''
+        Beam search over joint moves of my ships at rows against the
+        enemies at enem_rows
+
+        :return: (x, y) arrays of the best line's first move, or None if
+                 the deadline came before the first turn was searched
+        '''
+        ships = self.gmap.store.ships
+        planets = self.gmap.store.planets
+        alive_p = np.nonzero(planets.alive[:planets.size])[0]
+        plx, ply = planets.x[alive_p], planets.y[alive_p]
+        plr = planets.radius[alive_p] + constants.SHIP_RADIUS
+        n = len(rows)
+        offsets = np.radians([m[0] for m in MOVES])
+        speeds = np.array([m[1] for m in MOVES], dtype=float)
+
+        #one line to start with; every array is (lines, ships)
+        ax, ay = ships.x[rows][None, :], ships.y[rows][None, :]
+        ah = ships.health[rows][None, :].astype(float)
+        acd = ships.cooldown[rows][None, :]
+        ex, ey = ships.x[enem_rows][None, :], ships.y[enem_rows][None, :]
+        eh = ships.health[enem_rows][None, :].astype(float)
+        ecd = ships.cooldown[enem_rows][None, :]
+        edock = (ships.docking[enem_rows] != 0)[None, :]
+        adock = np.zeros((1, n), dtype=bool)
+        score = np.zeros(1)
+        first = None
+
+        for depth in range(DEPTH):
+            if time.time() >= self.deadline:
+                break
+            lines = len(score)
+            #joint moves: each move for every ship, then random mixes
+            uniform = np.broadcast_to(np.arange(len(MOVES))[None, :, None],
+                                      (lines, len(MOVES), n))
+            mixed = rng.integers(len(MOVES), size=(lines, SAMPLES, n))
+            joint = np.concatenate([uniform, mixed], axis=1).reshape(-1, n)
+            parent = np.repeat(np.arange(lines), len(MOVES) + SAMPLES)
+
+            a_alive, e_alive = ah > 0, eh > 0
+            #heading of each ship to its nearest living enemy
+            de = np.hypot(ax[:, :, None] - ex[:, None, :], ay[:, :, None] - ey[:, None, :])
+            de = np.where(e_alive[:, None, :], de, np.inf)
+            near = np.argmin(de, axis=2)
+            heading = np.arctan2(np.take_along_axis(ey, near, axis=1) - ay,
+                                 np.take_along_axis(ex, near, axis=1) - ax)
+
+            angle = heading[parent] + offsets[joint]
+            step = np.where(a_alive[parent], speeds[joint], 0.)
+            nx = ax[parent] + step*np.cos(angle)
+            ny = ay[parent] + step*np.sin(angle)
+            #enemies close in on where my ships were
+            mx, my = combat.approach(ex[parent], ey[parent], e_alive[parent], edock[parent],
+                                     ax[parent], ay[parent], a_alive[parent], adock[parent])
+
+            #crashes into friends, planets and the map edge
+            live = a_alive[parent]
+            df = np.hypot(nx[:, :, None] - nx[:, None, :], ny[:, :, None] - ny[:, None, :])
+            bump = (df < 2*constants.SHIP_RADIUS + .1) & live[:, :, None] & live[:, None, :]
+            bump &= ~np.eye(n, dtype=bool)[None]
+            crash = bump.any(axis=2)
+            for fx, fy in ((nx, ny), ((nx + ax[parent])/2, (ny + ay[parent])/2)):
+                crash |= (np.hypot(fx[..., None] - plx, fy[..., None] - ply) <= plr).any(axis=2)
+            crash |= (nx < 1) | (nx > self.gmap.width - 1) | (ny < 1) | (ny > self.gmap.height - 1)
+            crash &= live
+
+            d = np.hypot(nx[:, :, None] - mx[:, None, :], ny[:, :, None] - my[:, None, :])
+            to_enemy, a_fired = combat.volley(d, live & (acd[parent] <= 0), e_alive[parent])
+            to_ally, e_fired = combat.volley(d.transpose(0, 2, 1),
+                                             e_alive[parent] & ~edock[parent] & (ecd[parent] <= 0),
+                                             live)
+            dealt = np.minimum(to_enemy, np.maximum(eh[parent], 0)).sum(axis=1)
+            taken = np.minimum(to_ally, np.maximum(ah[parent], 0)).sum(axis=1)
+            child = score[parent] + dealt - RISK*taken - CRASH*crash.sum(axis=1)
+
+            keep = np.argsort(-child, kind='stable')[:BEAM]
+            p = parent[keep]
+            first = (nx[keep], ny[keep]) if first is None else (first[0][p], first[1][p])
+            ax, ay, ex, ey = nx[keep], ny[keep], mx[keep], my[keep]
+            ah, eh = ah[p] - to_ally[keep], eh[p] - to_enemy[keep]
+            acd = np.where(a_fired[keep], constants.WEAPON_COOLDOWN, acd[p]) - 1
+            ecd = np.where(e_fired[keep], constants.WEAPON_COOLDOWN, ecd[p]) - 1
+            edock = edock[p]
+            adock = adock[p]
+            score = child[keep]
+
+        if first is None:
+            return None
+        return first[0][0], first[1][0]
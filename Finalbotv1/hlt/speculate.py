@@ -0,0 +1,137 @@
+'''
+Speculative work while waiting for the engine.
+
+Once the commands are sent the bot blocks on the engine's next map, and
+that wait is otherwise wasted. Speculator.start hands a worker thread a
+copy of the ships and the commands just sent. The worker predicts where
+every ship will be next turn: mine by applying their thrusts as the
+engine does, the enemies by repeating their last move. It works out the
+distances between all of them at those positions, then spends the rest of
+the wait advancing the plan queue (see hlt.planner).
+
+The worker only reads its own copy of the ships, and the queue is left to
+it until Speculator.stop, which Game.update_map calls once the map has
+arrived, before parsing it. Speculator.settle then checks each prediction
+against the real position. The distances between ships within TOLERANCE
+of their prediction are handed to the store (see
+EntityStore.seed_distances), and the rest are worked out again.
+'''
+import math
+import threading
+import time
+from collections import defaultdict, namedtuple
+
+import numpy as np
+
+#how far off a predicted position may be and still count as right (the
+#engine sends positions to 4 decimals)
+TOLERANCE = .001
+#seconds of queued plans run between checks for the map
+SLICE = .005
+
+#ship rows, predicted positions, which are mine, distance matrix
+Guess = namedtuple('Guess', 'rows x y mine d')
+
+
+def thrusts(commands, ship_rows):
+    '''
+    Velocity of each ship thrusting in commands
+
+    :param ship_rows: Ship id -> store row
+    :return: row -> (vx, vy)
+    '''
+    moves = {}
+    for command in commands:
+        parts = command.split()
+        if len(parts) == 4 and parts[0] == 't':
+            row = ship_rows.get(int(parts[1]))
+            if row is not None:
+                speed, angle = int(parts[2]), math.radians(int(parts[3]))
+                moves[row] = (speed*math.cos(angle), speed*math.sin(angle))
+    return moves
+
+
+class Speculator:
+    '''
+    Worker thread predicting the next turn while the engine plays this one
+
+    :ivar queue: hlt.planner.PlanQueue advanced while waiting, or None
+    '''
+    def __init__(self, queue=None):
+        self.queue = queue
+        self.counts = defaultdict(int)
+        self._thread = None
+        self._stop = threading.Event()
+        self._guess = None
+        self._started = 0
+
+    def start(self, gmap, commands):
+        '''
+        Start predicting from gmap, after commands were sent
+        '''
+        self.stop()
+        self.counts = defaultdict(int)
+        store = gmap.store
+        ships = store.ships
+        rows = np.nonzero(store.mask('alive'))[0]
+        snap = (rows, ships.x[rows], ships.y[rows], ships.px[rows], ships.py[rows],
+                store.mask('mine')[rows])
+        self._guess = None
+        self._stop.clear()
+        self._started = time.time()
+        self._thread = threading.Thread(target=self._work, daemon=True,
+                                        args=(snap, thrusts(commands, ships.rows)))
+        self._thread.start()
+
+    def stop(self):
+        '''
+        Stop the worker and wait for it (it is between steps within a SLICE)
+        '''
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.counts['wait_ms'] += int(1000*(time.time() - self._started))
+
+    def _work(self, snap, moves):
+        start = time.time()
+        rows, x, y, px, py, mine = snap
+        #my ships stop unless they thrust, enemies keep their last move
+        vx, vy = np.where(mine, 0., x - px), np.where(mine, 0., y - py)
+        for i, row in enumerate(rows):
+            if row in moves:
+                vx[i], vy[i] = moves[row]
+        gx, gy = x + vx, y + vy
+        d = np.hypot(gx[:, None] - gx[None, :], gy[:, None] - gy[None, :])
+        self._guess = Guess(rows, gx, gy, mine, d)
+
+        if self.queue is not None:
+            steps = self.queue.counts['steps']
+            while not self._stop.is_set() and self.queue.pending():
+                self.queue.run(time.time() + SLICE)
+            self.counts['plan_steps'] += self.queue.counts['steps'] - steps
+        self.counts['work_ms'] += int(1000*(time.time() - start))
+
+    def settle(self, store):
+        '''
+        Check the predictions against the map just loaded into store, and
+        seed its distances with the ones that held
+        '''
+        guess, self._guess = self._guess, None
+        if guess is None:
+            return
+        ships = store.ships
+        err = np.hypot(ships.x[guess.rows] - guess.x, ships.y[guess.rows] - guess.y)
+        fresh = ships.alive[guess.rows] & (err <= TOLERANCE)
+        store.seed_distances(guess.rows, guess.d, fresh)
+        self.counts['mine'] += int(guess.mine.sum())
+        self.counts['mine_right'] += int((fresh & guess.mine).sum())
+        self.counts['enemy'] += int((~guess.mine).sum())
+        self.counts['enemy_right'] += int((fresh & ~guess.mine).sum())
+
+    def stats(self):
+        '''
+        The last wait's work and how many predictions held
+        '''
+        return dict(self.counts)
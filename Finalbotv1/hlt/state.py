@@ -4,22 +4,83 @@ import time
 from collections import defaultdict
 
 import hlt
+from hlt.derived import derived
+from hlt.events import (PlanetDestroyed, PlanetDockedChanged, PlanetOwnerChanged,
+                        ShipDestroyed, ShipDockingChanged, ShipSpawned)
+
+
+class NavMemory:
+    '''
+    What a ship's navigation chose last turn, used to warm start the next
+    turn's heading search
+
+    :ivar turn: Turn the record was written
+    :ivar x: Ship x-coordinate when the move was chosen
+    :ivar y: Ship y-coordinate when the move was chosen
+    :ivar goal_angle: Straight line heading to the target at the time
+    :ivar angle: Heading chosen
+    :ivar magnitude: Thrust magnitude chosen (0 if the ship was stopped)
+    :ivar blocked: Whether the straight line was blocked
+    :ivar blocker: What blocked it, e.g. ('planet', 3) or ('friendly', None)
+    :ivar failed: Whether every navigation tier failed
+    '''
+    def __init__(self, turn, ship, goal_angle, blocked, blocker, failed):
+        self.turn = turn
+        self.x = ship.x
+        self.y = ship.y
+        self.goal_angle = goal_angle
+        if ship.thrust_cmd is not None and not failed:
+            self.angle = ship.thrust_cmd.angle
+            self.magnitude = ship.thrust_cmd.magnitude
+        else:
+            self.angle = goal_angle
+            self.magnitude = 0
+        self.blocked = blocked
+        self.blocker = blocker
+        self.failed = failed
+
+    def warm_angle(self, goal_angle):
+        '''
+        Last turn's detour applied to this turn's straight line heading
+        '''
+        return (goal_angle + self.angle - self.goal_angle) % 360
+
+    def should_skip(self, turn, ship, goal_angle):
+        '''
+        Negative cache: a ship that failed every tier last turn and hasn't
+        moved since, still heading the same way, will fail again. Only the
+        turn right after a failure is skipped, so it retries every other turn.
+        '''
+        if not self.failed or self.turn != turn - 1:
+            return False
+        if abs(ship.x - self.x) > .01 or abs(ship.y - self.y) > .01:
+            return False
+        return abs((goal_angle - self.goal_angle + 180) % 360 - 180) < 1
+
 
 class State:
     '''
     Stores state info
 
+    Planet, enemy and role collections are kept up to date from the map's
+    parse events (see apply_events) rather than recomputed every turn. With
+    debug set, every turn is cross-checked against a full recompute.
+
+    Values declared with @derived are computed on first read and kept until
+    one of their dependencies changes: 'turn' (every turn) or 'planets'
+    (a planet changed owner, docked ships or was destroyed).
+
     TODO:
      manage ship roles
      manage planets
     '''
-    def __init__(self):
+    def __init__(self, debug=False):
         self.start = 0
+        self.debug = debug
 
         self.gmap = None
         self.turn = -1
         self.n_players = 0
-        self.player_docks = {}
 
         self.leftright = None #0 = left start, 1 = right start
 
@@ -38,9 +99,13 @@ class State:
         self.plan_miners = defaultdict(list) #miners assigned to planet
         self.plan_guards = defaultdict(list) #guardians assigned to planet
         self.plan_enems = defaultdict(list) #enemys attacking my planets
-        self.plan_nearest_enem = {} #nearest enemy to each planet
-        self.plan_prod = {} #current ship output rates
-        self.max_production = 0
+        self.planner = hlt.planner.PlanQueue() #plans worked on with the turn's spare time
+        self.paths = hlt.pathing.PathPlanner(queue=self.planner) #waypoints around planets
+        self.flows = hlt.flowfield.FlowFieldService(queue=self.planner) #shared headings to targets
+        self.speculator = hlt.speculate.Speculator(self.planner) #works ahead while the engine plays
+        self.fleet = hlt.forecast.FleetForecast() #projected fleet sizes and production
+        self.cohorts = hlt.cohort.Cohorts() #ships sharing a destination, rebuilt per turn
+        self.dock_rings = hlt.dockring.DockRings() #docking slots around each planet
 
         self.all_ships = [] #Specifically ships belonging to me
         self.ships_roles = {}
@@ -53,10 +118,23 @@ class State:
         self.ships_init = []
         self.ships_hunt = [] #not yet implemented
         self.ships_gath = [] #not yet implemented
+        self.role_members = defaultdict(dict) #role -> ship ids, in assignment order
+        self.ships_born = [] #my ships spawned since last turn
+        self.ships_lost = [] #my ships destroyed since last turn
 
         self.squadrons = {}
         self.squadron_cnt = 0
 
+        self.nav_memory = {} #last navigation result per ship
+        self.nav_stats = defaultdict(int) #navigation outcomes this turn
+        self.ships_unplaced = set() #miners left without a planet this turn
+
+        self.profiler = hlt.profiler.Profiler()
+        self.derived = hlt.derived.DerivedCache(State) #cached @derived values
+        self.profiler.register('derived', self.derived.stats)
+        self.profiler.register('planner', self.planner.stats)
+        self.profiler.register('speculate', self.speculator.stats)
+
         self.nships = 0 #for tracking current number of ships
         self.ship_count = 3 #for assigning ship roles
 
@@ -64,8 +142,14 @@ class State:
         self.all_enems_ids = []
         self.docked_enems = []
         self.undocked_enems = []
-        self.enems_positions = {}
-        self.enem_nearest_atck = {}
+        self.enems_positions = {} #enemy id -> (x, y) last turn
+        self._enems = {} #enemy id -> ship, kept up to date from map events
+        self._docked = {}
+        self._undocked = {}
+        self.enems_add = [] #enemy ships spawned since last turn
+        self.enems_rem = [] #enemy ships destroyed since last turn
+        self._enems_dirty = True
+        self._planets_dirty = True
 
     def update(self, gmap):
         '''
@@ -73,9 +157,21 @@ class State:
         '''
         self.start = time.time()
         self.gmap = gmap
+        self.profiler.start_turn(self.turn + 1)
+        self.profiler.register('geometry', gmap.geometry.stats)
+        self.profiler.register('distances', lambda: gmap.store.dist_stats)
+        self.speculator.settle(gmap.store)
 
         self.turn += 1
+        self.planner.start_turn(self.turn, self.start + hlt.planner.TURN_BUDGET)
         self.n_players = len(self.gmap.all_players())
+        self.nav_stats = defaultdict(int)
+        self.ships_unplaced = set()
+        self.derived.start_turn()
+        self.derived.changed('turn')
+        self.apply_events()
+        self.fleet.update(self.gmap, rebuild=self.turn == 0)
+        self.dock_rings.update(self.gmap, rebuild=self.turn == 0)
 
         self.update_planets_1()
         logging.warning('Planets')
@@ -85,6 +181,8 @@ class State:
         logging.warning('Ships')
         self.update_planets_2()
         logging.warning('Planets 2')
+        if self.debug:
+            self.check_events()
 
         #print log info
         logging.info('Turn: '+str(self.turn)+'. State updated in '
@@ -93,9 +191,132 @@ class State:
         logging.info('n_attackers '+str(len(self.ships_atck)))
         logging.info('n_guardians '+str(len(self.ships_guar)))
         logging.info('n_corners '+str(len(self.ships_corn)))
-        for player_id in self.player_docks.keys():
-            logging.info('player '+str(player_id)+' production '
-                         + str(self.player_docks[player_id]))
+        for player in self.gmap.all_players():
+            logging.info('player '+str(player.id)+' production '
+                         +str(self.fleet.rate_at(player.id, 0))+' ships in '
+                         +str(self.fleet.horizon)+' turns '
+                         +str(self.fleet.ships_at(player.id, self.fleet.horizon)))
+
+    def apply_events(self):
+        '''
+        Bring the event driven collections up to date with this turn's map
+        events. The first turn (and any turn without a previous one) is
+        rebuilt from scratch instead.
+        '''
+        self.ships_born, self.ships_lost = [], []
+        self.enems_add, self.enems_rem = [], []
+        if self.turn == 0:
+            self.rebuild_collections()
+            return
+
+        my_id = self.gmap.my_id
+        undocked = hlt.entity.Ship.DockingStatus.UNDOCKED
+        for event in self.gmap.events:
+            kind = type(event)
+            if kind is ShipSpawned:
+                if event.owner == my_id:
+                    self.ships_born.append(event.ship_id)
+                    continue
+                e = self.gmap.get_player(event.owner).get_ship(event.ship_id)
+                self._enems[e.id] = e
+                if e.docking_status is undocked:
+                    self._undocked[e.id] = e
+                else:
+                    self._docked[e.id] = e
+                self.enems_add.append(e)
+                self._enems_dirty = True
+            elif kind is ShipDestroyed:
+                if event.owner == my_id:
+                    self.ships_lost.append(event.ship_id)
+                    continue
+                e = self._enems.pop(event.ship_id, None)
+                self._docked.pop(event.ship_id, None)
+                self._undocked.pop(event.ship_id, None)
+                if e is not None:
+                    self.enems_rem.append(e)
+                self._enems_dirty = True
+            elif kind is ShipDockingChanged:
+                if event.owner == my_id or (event.old is undocked) == (event.new is undocked):
+                    continue
+                e = self._enems.get(event.ship_id)
+                if e is None:
+                    continue
+                if event.new is undocked:
+                    self._docked.pop(e.id, None)
+                    self._undocked[e.id] = e
+                else:
+                    self._undocked.pop(e.id, None)
+                    self._docked[e.id] = e
+                self._enems_dirty = True
+            elif kind in (PlanetOwnerChanged, PlanetDockedChanged, PlanetDestroyed):
+                self._planets_dirty = True
+                self.derived.changed('planets')
+
+    def rebuild_collections(self):
+        '''
+        Recompute the event driven collections from the whole map
+        '''
+        ships = [s.id for s in self.gmap.get_me().all_ships()]
+        old = set(self.all_ships)
+        new = set(ships)
+        self.ships_born = [sid for sid in ships if sid not in old]
+        self.ships_lost = [sid for sid in self.all_ships if sid not in new]
+
+        undocked = hlt.entity.Ship.DockingStatus.UNDOCKED
+        enems = self.gmap.all_enem_ships()
+        self.enems_add = [e for e in enems if e.id not in self._enems]
+        ids = set(e.id for e in enems)
+        self.enems_rem = [e for e in self._enems.values() if e.id not in ids]
+        self._enems = {e.id: e for e in enems}
+        self._docked = {e.id: e for e in enems if e.docking_status is not undocked}
+        self._undocked = {e.id: e for e in enems if e.docking_status is undocked}
+        self._enems_dirty = True
+        self._planets_dirty = True
+        self.derived.changed('planets')
+
+        self.role_members = defaultdict(dict)
+        for sid, role in self.ships_roles.items():
+            self.role_members[role][sid] = None
+
+    def check_events(self):
+        '''
+        Debug cross-check of the event driven collections against a full
+        recompute. Mismatches are logged and replaced by the recomputed values.
+        '''
+        me = self.gmap.get_me()
+        undocked = hlt.entity.Ship.DockingStatus.UNDOCKED
+        enems = self.gmap.all_enem_ships()
+        planets = self.gmap.all_planets()
+        expected = {
+            'all_enems': set(e.id for e in enems),
+            'docked_enems': set(e.id for e in enems if e.docking_status is not undocked),
+            'undocked_enems': set(e.id for e in enems if e.docking_status is undocked),
+            'plan_empty': [p.id for p in planets if p.owner is None],
+            'plan_enem': [p.id for p in planets if p.owner != me and p.owner is not None],
+            'plan_uncap': [p.id for p in planets if p.owner != me],
+            'plan_cap': [p.id for p in planets if p.owner == me and not p.is_full()],
+            'plan_cap_cont': [p.id for p in planets if p.owner == me],
+            'all_ships': [s.id for s in me.all_ships()],
+        }
+        for role in range(7):
+            expected['role '+str(role)] = [sid for sid in self.ships_roles
+                                           if self.ships_roles[sid] == role]
+        in_sync = True
+        for name, want in expected.items():
+            if name.startswith('role '):
+                have = list(self.role_members[int(name[5:])])
+            else:
+                have = [x.id if hasattr(x, 'id') else x for x in getattr(self, name)]
+            if isinstance(want, set):
+                have = set(have)
+            if have != want:
+                logging.error('State: '+name+' out of sync with map events, have '
+                              +str(have)+', expected '+str(want))
+                in_sync = False
+        if not in_sync:
+            self.rebuild_collections()
+            self.update_planets_1()
+            self.update_enem_lists()
 
     def assess_planets(self):
         '''
@@ -130,24 +351,17 @@ class State:
         Update state information regarding planets that doesn't rely on
         ship state
         '''
-        #clear player docking numbers
-        for player in self.gmap.all_players():
-            self.player_docks[player.id] = 0
-
-        self.max_production = 0
-        for p in self.gmap.all_planets():
-            self.max_production += p.num_docking_spots/12.
-            if p.is_owned():
-                self.plan_prod[p.id] = p.current_production
-                self.player_docks[p.owner.id] += len(p.all_docked_ships())/12.
-
         planets = [p.id for p in self.gmap.all_planets()]
+        self.paths.update(self.gmap)
+        self.flows.update(self.gmap)
         planets_rem = [pid for pid in self.all_planets if pid not in planets]
         self.all_planets = planets
 
-        for pid in planets:
-            self.plan_prod[pid] = len(self.gmap.get_planet(pid).all_docked_ships())/12.
-
+        #planet objects are reused between turns, so the lists only change
+        #when a planet changes owner, fills up or is destroyed
+        if not self._planets_dirty:
+            return
+        self._planets_dirty = False
         self.plan_empty = [planet for planet in self.gmap.all_planets()
                            if planet.owner is None]
         self.plan_enem = [planet for planet in self.gmap.all_planets()
@@ -161,6 +375,87 @@ class State:
         self.plan_cap_cont = [planet for planet in self.gmap.all_planets()
                               if planet.owner == self.gmap.get_me()]
 
+    @derived('planets')
+    def max_production(self):
+        '''
+        Ship output rate with every docking spot filled
+        '''
+        return sum(p.num_docking_spots/12. for p in self.gmap.all_planets())
+
+    @derived('planets')
+    def plan_prod(self):
+        '''
+        Current ship output rate of each planet
+        '''
+        return {p.id: len(p.all_docked_ships())/12. for p in self.gmap.all_planets()}
+
+    @derived('turn')
+    def plan_nearest_enem(self):
+        '''
+        Nearest enemy ship to each planet
+        '''
+        if not self.all_enems:
+            return {}
+        return {p.id: min(self.all_enems, key=self.gmap.geometry.distance_from(p))
+                for p in self.gmap.all_planets()}
+
+    @derived('turn')
+    def enem_clusters(self):
+        '''
+        Undocked enemy ships grouped by weapon range, see
+        hlt.clusters.EnemyClusters
+        '''
+        return hlt.clusters.EnemyClusters(self.gmap.store)
+
+    @derived('turn')
+    def attack_plan(self):
+        '''
+        Targets of my attackers, assigned together the first time an
+        attacker asks this turn, see hlt.targeting.AttackPlan
+        '''
+        return hlt.targeting.AttackPlan(self.gmap.store)
+
+    @derived('turn')
+    def engagements(self):
+        '''
+        Predicted local fights around each of my undocked ships, as
+        (engage, dock) dicts of ship id -> hlt.combat.Outcome
+        '''
+        return hlt.combat.local_engagements(self.gmap.store)
+
+    @derived('turn')
+    def dock_safety(self):
+        '''
+        Docking forecast for each of my undocked ships, see
+        hlt.docking.DockingForecast.safety
+        '''
+        return hlt.docking.DockingForecast(self.gmap.store)
+
+    @derived('turn')
+    def potential_field(self):
+        '''
+        Moves of my flee and corner ships along the potential field, see
+        hlt.potential.PotentialField.move
+        '''
+        return hlt.potential.PotentialField(self.gmap, self)
+
+    @derived('turn')
+    def skirmishes(self):
+        '''
+        Moves of my attackers in active fights, see
+        hlt.skirmish.Skirmishes.move
+        '''
+        return hlt.skirmish.Skirmishes(self.gmap, self, self.start
+                                       + hlt.skirmish.SHARE*hlt.planner.TURN_BUDGET)
+
+    @derived('turn')
+    def intercepts(self):
+        '''
+        Where each of my undocked ships can first meet each enemy ship, see
+        hlt.intercept.Intercepts.point
+        '''
+        return hlt.intercept.Intercepts(self.gmap.store)
+
     def update_planets_2(self):
         '''
         Update state information regarding planets that relies on
@@ -169,12 +464,15 @@ class State:
         Trigger hiding in corner for 4p games
         Summon/release guardians
         '''
-        #Initiate retreat if conditions are met
+        #Initiate retreat if conditions are met, judged on the production
+        #rates once the ships docking now are done
         if self.n_players > 2:
             my_id = self.gmap.get_me().id
             nearest_id = (my_id + 2)%4
-            if (self.player_docks[nearest_id] > 2*self.player_docks[my_id]) \
-                and (self.player_docks[nearest_id] > 1):
+            docks = [self.fleet.rate_at(player_id, hlt.constants.DOCK_TURNS)
+                     for player_id in range(self.n_players)]
+            if (docks[nearest_id] > 2*docks[my_id]) \
+                and (docks[nearest_id] > 1):
                 logging.info('Initiate retreat')
                 for sid in self.all_ships:
                     if self.ships_roles[sid] != 5:
@@ -182,7 +480,7 @@ class State:
                         self.ships_corn.append(sid)
             else:
                 for player_id in [(my_id + 1)%4, (my_id + 3)%4]:
-                    if self.player_docks[player_id] > .6*self.max_production:
+                    if docks[player_id] > .6*self.max_production:
                         logging.info('Initiate retreat')
                         for sid in self.all_ships:
                             if self.ships_roles[sid] != 5:
@@ -192,21 +490,19 @@ class State:
         #Clear planets' nearby enemy dicts
         planets = self.gmap.all_planets()
         for p in planets:
-            if self.all_enems:
-                self.plan_nearest_enem[p.id] = min(self.all_enems,
-                                                   key=p.calculate_distance_between)
             self.plan_enems.get(p.id, []).clear()
 
-        enems = self.undocked_enems[:]
-        while enems and planets:
-            e = enems.pop()
-            near_p = min(planets, key=e.calculate_distance_between)
+        #one nearest planet per enemy cluster rather than per enemy ship
+        for cluster in (self.enem_clusters.clusters if planets else []):
+            centre = hlt.entity.Position(cluster.x, cluster.y)
+            near_p = min(planets, key=self.gmap.geometry.distance_from(centre))
             if near_p.owner == self.gmap.get_me():
                 s = near_p.all_docked_ships()[0]
             else:
                 s = near_p
-            if s.calculate_distance_between(e) < near_p.radius + 2*hlt.constants.MAX_SPEED:
-                self.plan_enems[near_p.id].append(e)
+            for e in cluster.members:
+                if self.gmap.geometry.distance(s, e) < near_p.radius + 2*hlt.constants.MAX_SPEED:
+                    self.plan_enems[near_p.id].append(e)
 
         hlt.strategy.queue_guardians(self.gmap, self)
 
@@ -214,30 +510,24 @@ class State:
         '''
         Update state information regarding my ships
         '''
-        ships = [s.id for s in self.gmap.get_me().all_ships()]
-        ships_add = [sid for sid in ships if sid not in self.all_ships]
-        ships_rem = [sid for sid in self.all_ships if sid not in ships]
-        self.all_ships = ships
+        self.all_ships = list(self.gmap.get_me()._ships)
         self.nships = len(self.all_ships)
-        self.add_ships(ships_add)
-        self.rem_ships(ships_rem)
-
-        self.ships_mine = [sid for sid in self.ships_roles.keys()
-                           if self.ships_roles[sid] == 1]
-        self.ships_atck = [sid for sid in self.ships_roles.keys()
-                           if self.ships_roles[sid] == 2]
-        self.ships_guar = [sid for sid in self.ships_roles.keys()
-                           if self.ships_roles[sid] == 4]
-        self.ships_corn = [sid for sid in self.ships_roles.keys()
-                           if self.ships_roles[sid] == 5]
-        self.ships_flee = [sid for sid in self.ships_roles.keys()
-                           if self.ships_roles[sid] == 6]
+        self.add_ships(self.ships_born)
+        self.rem_ships(self.ships_lost)
+
+        #role_members is kept by set_ship_role and clean_ship
+        self.ships_mine = list(self.role_members[1])
+        self.ships_atck = list(self.role_members[2])
+        self.ships_guar = list(self.role_members[4])
+        self.ships_corn = list(self.role_members[5])
+        self.ships_flee = list(self.role_members[6])
 
         self.ships_hunt = [] #not yet implemented
         self.ships_gath = [] #not yet implemented
 
         for ship in self.gmap.get_me().all_ships():
             ship.role = self.ships_roles.get(ship.id, 0)
+            self.gmap.store.set_role(ship)
 
     def add_ships(self, ships):
         '''
@@ -275,7 +565,10 @@ class State:
         '''
         self.clean_ship(ship_id)
         self.ships_roles[ship_id] = role
-        self.gmap.get_me().get_ship(ship_id).role = role
+        self.role_members[role][ship_id] = None
+        ship = self.gmap.get_me().get_ship(ship_id)
+        ship.role = role
+        self.gmap.store.set_role(ship)
 
     def get_ship_role(self, ship_id):
         '''
@@ -290,35 +583,51 @@ class State:
         '''
         return self.ships_roles.get(ship_id, 0)
 
+    def nav_recall(self, ship):
+        '''
+        Return the ship's navigation memory from last turn (or this one), if any
+        '''
+        if ship.id is None or ship.id < 0:
+            return None
+        memory = self.nav_memory.get(ship.id)
+        if memory is None or memory.turn < self.turn - 1:
+            return None
+        return memory
+
+    def nav_record(self, ship, goal_angle, blocked, blocker, failed=False, warm=False):
+        '''
+        Store the outcome of a ship's navigation this turn
+        '''
+        if warm:
+            self.nav_stats['warm'] += 1
+        elif failed:
+            self.nav_stats['failed'] += 1
+        elif blocked:
+            self.nav_stats['detoured'] += 1
+        else:
+            self.nav_stats['straight'] += 1
+
+        if ship.id is None or ship.id < 0:
+            return
+        self.nav_memory[ship.id] = NavMemory(self.turn, ship, goal_angle,
+                                             blocked, blocker, failed)
+
     def update_enems(self):
         '''
         Update state information regarding enemy ships.
 
         Including enemy movement predictions
         '''
-        enems = [e for e in self.gmap.all_enem_ships()]
-        enems_ids = [e.id for e in self.gmap.all_enem_ships()]
-        enems_old = [e.id for e in enems if e.id in self.all_enems_ids]
-        enems_add = [e for e in enems if e.id not in self.all_enems_ids]
-        enems_rem = [e for e in self.all_enems if e.id not in enems_ids]
-        self.all_enems = enems
-        self.all_enems_ids = enems_ids
-        self.docked_enems = [e for e in self.all_enems if e.docking_status
-                             is not hlt.entity.Ship.DockingStatus.UNDOCKED]
-        self.undocked_enems = [e for e in self.all_enems if e.docking_status
-                               is hlt.entity.Ship.DockingStatus.UNDOCKED]
-        self.rem_enems(enems_rem)
+        self.update_enem_lists()
+        self.rem_enems(self.enems_rem)
 
         for e in self.gmap._all_ships():
             if e.owner.id == self.gmap.get_me().id:
                 continue
-            
-            _ = self.enem_nearest_atck.pop(e.id, 0)
-            self.enem_nearest_atck[e.id] = min(self.gmap.get_me().all_ships(),
-                                               key=e.calculate_distance_between).id
 
-            if e.id in enems_old:
-                x0, y0 = self.enems_positions[e.id].x, self.enems_positions[e.id].y
+            last = self.enems_positions.get(e.id)
+            if last is not None:
+                x0, y0 = last
                 dx, dy = e.x - x0, e.y - y0
                 magn = int(math.sqrt(dx**2 + dy**2))
                 if magn == 0:
@@ -330,23 +639,34 @@ class State:
             else:
                 e.thrust_cmd = None
 
-            self.enems_positions[e.id] = e
+            self.enems_positions[e.id] = (e.x, e.y)
 
-        self.add_enems(enems_add)
+        self.add_enems(self.enems_add)
+
+    def update_enem_lists(self):
+        '''
+        Refresh the enemy lists from the event driven dicts, if they changed
+        '''
+        if not self._enems_dirty:
+            return
+        self._enems_dirty = False
+        self.all_enems = list(self._enems.values())
+        self.all_enems_ids = list(self._enems)
+        self.docked_enems = list(self._docked.values())
+        self.undocked_enems = list(self._undocked.values())
 
     def add_enems(self, add):
         '''
         Store state data on newly created enemy ships
         '''
         for e in add:
-            self.enems_positions[e.id] = e
+            self.enems_positions[e.id] = (e.x, e.y)
 
     def rem_enems(self, rem):
         '''
         remove destoryed enemy ships from state storage
         '''
         for e in rem:
-            _ = self.enem_nearest_atck.pop(e.id, 0)
             _ = self.enems_positions.pop(e.id, 0)
 
 
@@ -354,7 +674,7 @@ class State:
         '''
         '''
         squad_id = self.squadron_cnt
-        self.squadrons[id] = hlt.entity.Squadron(self, target_player_id, squad_id, ship_ids)
+        self.squadrons[squad_id] = hlt.entity.Squadron(self, target_player_id, squad_id, ship_ids)
         self.squadron_cnt += 1
 
     def disband_squadron(self, squadron):
@@ -376,8 +696,14 @@ class State:
         '''
         #remove ships from roles dictionary
         role = self.ships_roles.pop(ship_id, None)
+        if role is not None:
+            _ = self.role_members[role].pop(ship_id, None)
         #remove ships from ships targets dictionary
         target_id = self.ships_targets.pop(ship_id, None)
+        #previous navigation doesn't carry over to a new role
+        _ = self.nav_memory.pop(ship_id, None)
+        #nor does a docking slot it was heading for
+        self.dock_rings.release(ship_id, reserved_only=True)
 
         #Miners
         if role == 1:
@@ -399,14 +725,11 @@ class State:
                 self.ships_atck.remove(ship_id)
             except ValueError:
                 pass
-        #Squadrons
+        #Squadrons, whose members keep their squadron id as target
         elif role == 3:
-            for squad_id in self.squadrons.keys():
-                squadron = self.squadrons[squad_id]
-                try:
-                    squadron.ship_ids.remove(ship_id)
-                except ValueError:
-                    pass
+            squadron = self.squadrons.get(target_id)
+            if squadron is not None:
+                squadron.remove_member(ship_id)
         #Guardians
         elif role == 4:
             #Try to remove from ships_guar list
@@ -0,0 +1,225 @@
+import numpy as np
+
+
+class Table:
+    '''
+    Growable struct-of-arrays table with one stable row per entity id.
+
+    Rows are handed out the first time an id is seen and kept for the rest
+    of the game (the rows of dead entities are flagged in alive and never
+    reused), so values can be carried over from one turn to the next.
+    '''
+    def __init__(self, columns, capacity=64):
+        self.columns = columns #column name -> dtype
+        self.rows = {} #entity id -> row
+        self.objects = [] #row -> entity object of the current turn, or None
+        self.size = 0
+        for name, dtype in columns.items():
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+
+    def row(self, entity_id):
+        '''
+        Return the row of entity_id, adding one if it is new
+        '''
+        row = self.rows.get(entity_id)
+        if row is None:
+            row = self.size
+            if row == len(self.alive):
+                self._grow()
+            self.rows[entity_id] = row
+            self.objects.append(None)
+            self.size += 1
+        return row
+
+    def _grow(self):
+        for name in self.columns:
+            old = getattr(self, name)
+            new = np.zeros(2*len(old), dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def view(self, name):
+        '''
+        Read-only view of a column, trimmed to the rows in use
+        '''
+        v = getattr(self, name)[:self.size]
+        v.flags.writeable = False
+        return v
+
+    def entities(self, mask):
+        '''
+        Return the entity objects of the rows selected by a boolean mask
+        '''
+        return [self.objects[r] for r in np.nonzero(mask)[0]]
+
+
+class EntityStore:
+    '''
+    Columnar copy of the map's ships and planets, refreshed on every parse.
+
+    Entity objects keep their plain attributes and remember their row in
+    .row; the arrays here are for the vectorized queries (masks, nearest
+    neighbours) that would otherwise be python loops over every ship.
+    '''
+    def __init__(self):
+        self.my_id = None
+        self.ships = Table({'x': float, 'y': float, 'px': float, 'py': float,
+                            'radius': float, 'health': int, 'owner': int,
+                            'docking': int, 'cooldown': int, 'role': int, 'alive': bool})
+        self.planets = Table({'x': float, 'y': float, 'radius': float, 'health': int,
+                              'owner': int, 'spots': int, 'docked': int, 'production': int,
+                              'alive': bool})
+        self._masks = {}
+        self._dist = None #(row -> index, matrix) over the alive ships
+        self._seed = None #(rows, matrix, fresh) offered by seed_distances
+        self.dist_stats = {}
+
+    def load(self, gmap):
+        '''
+        Copy this turn's entities into their rows. px, py keep each ship's
+        position from the turn before (or the current one for new ships).
+        '''
+        self.my_id = gmap.my_id
+        self._masks = {}
+        self._dist = None
+        self._seed = None
+        self.dist_stats = {}
+
+        ships = self.ships
+        was_alive = ships.alive[:ships.size].copy()
+        ships.px[:ships.size] = ships.x[:ships.size]
+        ships.py[:ships.size] = ships.y[:ships.size]
+        ships.alive[:] = False
+        rows, cols = [], ([], [], [], [], [], [], [])
+        for player in gmap._players.values():
+            for s in player._ships.values():
+                r = ships.row(s.id)
+                s.row = r
+                ships.objects[r] = s
+                rows.append(r)
+                for col, v in zip(cols, (s.x, s.y, s.radius, s.health, player.id,
+                                         s.docking_status.value, s._weapon_cooldown)):
+                    col.append(v)
+        if rows:
+            for name, col in zip(('x', 'y', 'radius', 'health', 'owner', 'docking', 'cooldown'),
+                                 cols):
+                getattr(ships, name)[rows] = col
+            ships.alive[rows] = True
+        fresh = ships.alive[:ships.size].copy()
+        fresh[:len(was_alive)] &= ~was_alive
+        ships.px[:ships.size][fresh] = ships.x[:ships.size][fresh]
+        ships.py[:ships.size][fresh] = ships.y[:ships.size][fresh]
+        for r in np.nonzero(~ships.alive[:ships.size])[0]:
+            ships.objects[r] = None
+
+        planets = self.planets
+        planets.alive[:] = False
+        for p in gmap._planets.values():
+            r = planets.row(p.id)
+            p.row = r
+            planets.objects[r] = p
+            planets.x[r], planets.y[r], planets.radius[r] = p.x, p.y, p.radius
+            planets.health[r], planets.spots[r] = p.health, p.num_docking_spots
+            planets.owner[r] = -1 if p.owner is None else p.owner.id
+            planets.docked[r] = len(p._docked_ship_ids)
+            planets.production[r] = p.current_production
+            planets.alive[r] = True
+        for r in np.nonzero(~planets.alive[:planets.size])[0]:
+            planets.objects[r] = None
+
+    def set_role(self, ship):
+        '''
+        Mirror a role change made on one of my ships
+        '''
+        if ship is not None and ship.row >= 0:
+            self.ships.role[ship.row] = ship.role
+
+    def mask(self, name):
+        '''
+        Boolean mask over ship rows: 'alive', 'mine', 'enemy', 'docked' or
+        'undocked'. Cached until the next load.
+        '''
+        mask = self._masks.get(name)
+        if mask is None:
+            ships = self.ships
+            alive = ships.alive[:ships.size]
+            if name == 'alive':
+                mask = alive.copy()
+            elif name == 'mine':
+                mask = alive & (ships.owner[:ships.size] == self.my_id)
+            elif name == 'enemy':
+                mask = alive & (ships.owner[:ships.size] != self.my_id)
+            elif name == 'docked':
+                mask = alive & (ships.docking[:ships.size] != 0)
+            elif name == 'undocked':
+                mask = alive & (ships.docking[:ships.size] == 0)
+            else:
+                raise ValueError('Unknown mask: '+name)
+            mask.flags.writeable = False
+            self._masks[name] = mask
+        return mask
+
+    def role_mask(self, role):
+        '''
+        Boolean mask of my ships with the given role (not cached, roles change
+        during the turn)
+        '''
+        return self.mask('mine') & (self.ships.role[:self.ships.size] == role)
+
+    def seed_distances(self, rows, d, fresh):
+        '''
+        Offer a distance matrix between the ship rows in rows worked out
+        ahead of this turn (see hlt.speculate). Only its entries between
+        rows flagged in fresh are kept by distances(), the rest are redone.
+        '''
+        self._seed = (rows, d, fresh)
+
+    def distances(self, src_rows, dst_rows):
+        '''
+        Distances between the alive ship rows src_rows and dst_rows, taken
+        from a matrix over every alive ship built on first use each turn
+        '''
+        if self._dist is None:
+            self._dist = self._pairwise()
+        index, d = self._dist
+        return d[np.ix_(index[src_rows], index[dst_rows])]
+
+    def _pairwise(self):
+        ships = self.ships
+        rows = np.nonzero(ships.alive[:ships.size])[0]
+        index = np.full(ships.size, -1)
+        index[rows] = np.arange(len(rows))
+        x, y = ships.x[rows], ships.y[rows]
+        d = np.empty((len(rows), len(rows)))
+
+        #rows the seed got right keep its distances between them
+        known = np.zeros(len(rows), dtype=bool)
+        if self._seed is not None:
+            seed_rows, seed_d, fresh = self._seed
+            pos = np.full(ships.size, -1)
+            pos[seed_rows] = np.arange(len(seed_rows))
+            pos = pos[rows]
+            known = pos >= 0
+            known[known] = fresh[pos[known]]
+            k = np.nonzero(known)[0]
+            d[np.ix_(k, k)] = seed_d[np.ix_(pos[k], pos[k])]
+        stale = np.nonzero(~known)[0]
+        if len(stale):
+            redo = np.hypot(x[stale][:, None] - x[None, :], y[stale][:, None] - y[None, :])
+            d[stale, :] = redo
+            d[:, stale] = redo.T
+        self.dist_stats = {'ships': len(rows), 'reused': int(known.sum())}
+        return index, d
+
+    def nearest_ships(self, src, dst):
+        '''
+        For every ship row in mask src, find the nearest ship row in mask dst
+
+        :return: (src rows, nearest dst rows, distances), empty if either mask is
+        '''
+        src_rows, dst_rows = np.nonzero(src)[0], np.nonzero(dst)[0]
+        if not len(src_rows) or not len(dst_rows):
+            return src_rows[:0], dst_rows[:0], np.zeros(0)
+        d = self.distances(src_rows, dst_rows)
+        best = np.argmin(d, axis=1)
+        return src_rows, dst_rows[best], d[np.arange(len(src_rows)), best]
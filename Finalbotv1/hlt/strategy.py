@@ -4,13 +4,23 @@ import random
 
 import hlt
 
-def first_turn(gmap, gstate):
+def first_turn(gmap, gstate, verdict=None, entry=None):
     '''
     Assign first commands to starting ships
+
+    verdict is the opening evaluator's (hlt.opening.evaluate), followed
+    over the distance rule when confident enough. entry is the opening
+    book's for this map (hlt.book), whose verdict, planet stats and miner
+    targets are taken instead of working them out.
     '''
 
     #Assess planets
-    gstate.assess_planets()
+    if entry is None:
+        gstate.assess_planets()
+    else:
+        hlt.book.apply_stats(gstate, entry)
+        verdict = hlt.opening.Verdict(entry.opening, entry.z, {})
+        logging.info('Strategic: opening from the book')
 
     #get init ships
     ships = gmap.get_me().all_ships()
@@ -26,10 +36,16 @@ def first_turn(gmap, gstate):
     min_enem = min(enems, key=lambda e: abs(e.y - gmap.height/2))
     min_dist = min_ship.calculate_distance_between(min_enem)
 
+    #If enemy spawns within 15*max_speed units (1*max_speed in 4p), go all in
+    all_in = min_dist < (15 if gstate.n_players == 2 else 1)*hlt.constants.MAX_SPEED
+    if verdict is not None and verdict.z >= hlt.opening.CONFIDENT_Z:
+        all_in = verdict.opening == hlt.opening.ALL_IN
+        logging.info('Strategic: rollouts favour '+verdict.opening+' (z '
+                     +str(round(verdict.z, 2))+')')
+
     # 2 player games
     if gstate.n_players == 2:
-        #If enemy spawns within 15*max_speed units, go all in
-        if min_dist < 15*hlt.constants.MAX_SPEED:
+        if all_in:
             logging.info('Strategic: Executing All-In opening')
             gstate.add_squadron(closest_player.id, gstate.all_ships)
         else:
@@ -43,7 +59,11 @@ def first_turn(gmap, gstate):
                     gstate.set_ship_role(ship_id, 1)
                     gstate.ships_mine.append(ship_id)
                 
-                if not p:
+                if entry is not None and ship_id in entry.miners:
+                    p = gmap.get_planet(entry.miners[ship_id])
+                    gstate.plan_miners[p.id].append(ship_id)
+                    gstate.ships_targets[ship_id] = p.id
+                elif not p:
                     p = queue_planets(gmap, gstate, ship_id)
                 elif len(gstate.plan_miners[p.id]) < p.num_docking_spots:
                     gstate.plan_miners[p.id].append(ship_id)
@@ -61,11 +81,7 @@ def first_turn(gmap, gstate):
             gstate.leftright = 1
             logging.info('Determined right start')
 
-        #If enemy spawns within 1*max_speed units, go all in
-        sid = gstate.all_ships[0]
-        ship = gstate.gmap.get_me().get_ship(sid)
-        enem = min(gstate.all_enems, key=ship.calculate_distance_between)
-        if min_dist < 1*hlt.constants.MAX_SPEED:
+        if all_in:
             logging.info('Strategic: Executing All-In opening')
             gstate.add_squadron(closest_player.id, gstate.all_ships)
         else:
@@ -79,7 +95,11 @@ def first_turn(gmap, gstate):
                     gstate.set_ship_role(ship_id, 1)
                     gstate.ships_mine.append(ship_id)
                 
-                if not p:
+                if entry is not None and ship_id in entry.miners:
+                    p = gmap.get_planet(entry.miners[ship_id])
+                    gstate.plan_miners[p.id].append(ship_id)
+                    gstate.ships_targets[ship_id] = p.id
+                elif not p:
                     p = queue_planets(gmap, gstate, ship_id)
                 elif len(gstate.plan_miners[p.id]) < p.num_docking_spots:
                     gstate.plan_miners[p.id].append(ship_id)
@@ -92,18 +112,23 @@ def assign_ship_role(gstate, ship_id, count):
     Assign roles to new ships based on game state.
     '''
     ship = gstate.gmap.get_me().get_ship(ship_id)
-    enem = min(gstate.all_enems, key=ship.calculate_distance_between)
+    enem = min(gstate.all_enems, key=gstate.gmap.geometry.distance_from(ship))
     mother = min(gstate.gmap.all_planets(),
-                 key=ship.calculate_distance_between)
-    pprod = gstate.plan_prod.get(mother.id, 0)
+                 key=gstate.gmap.geometry.distance_from(ship))
 
     if gstate.plan_enems[mother.id]:
         return 2
     else:
         if gstate.turn <= 30:
             return 1
-        else:
-            return count%2 + 1
+        #projected to fall behind an enemy's fleet: grow the economy first
+        fleet = gstate.fleet
+        my_id = gstate.gmap.get_me().id
+        rivals = [fleet.ships_at(p.id, fleet.horizon) for p in gstate.gmap.all_players()
+                  if p.id != my_id]
+        if rivals and max(rivals) > fleet.ships_at(my_id, fleet.horizon) + 1:
+            return 1
+        return count%2 + 1
 
 
 def queue_planets(gmap, gstate, ship_id):
@@ -156,21 +181,6 @@ def get_planet_priority(ship, gmap, gstate, target):
 
     return priority
 
-def queue_attackers(ship, gmap, gstate):
-    '''
-    '''
-    #find nearest of my planets, and nearest enemy to that planet
-    # s = None
-    # if gstate.plan_cap_cont:
-    #     p = min(gstate.plan_cap_cont, key=ship.calculate_distance_between)
-    #     s = gstate.plan_nearest_enem[p.id]
-    # else:
-    #     if gstate.all_enems:
-    s = min(gstate.all_enems, key=ship.calculate_distance_between)
-
-    #attack nearest enemy to nearest planet
-    return s
-
 def queue_guardians(gmap, gstate):
     '''
     '''
@@ -185,11 +195,11 @@ def queue_guardians(gmap, gstate):
             near_ships = [s for s in gmap.get_me().all_ships()
                           if (s.docking_status is hlt.entity.Ship.DockingStatus.UNDOCKED) \
                                and (s.role == 0 or s.role == 1 or s.role == 2) \
-                               and (p.calculate_distance_between(s) \
+                               and (gmap.geometry.distance(p, s) \
                                     < p.radius + 3*hlt.constants.MAX_SPEED)]
 
             while (n_enems > n_guard) and near_ships:
-                new_guard = min(near_ships, key=p.calculate_distance_between)
+                new_guard = min(near_ships, key=gmap.geometry.distance_from(p))
                 gstate.ships_guar.append(new_guard.id)
                 near_ships.remove(new_guard)
                 gstate.set_ship_role(new_guard.id, 4)
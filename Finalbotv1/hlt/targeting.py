@@ -0,0 +1,88 @@
+'''
+Attacker to target assignment.
+
+All my attackers are assigned to enemy ships in one go from the distance
+matrix, with a cap on attackers per target and docked enemies (which can't
+shoot back) counted as closer than they are.
+'''
+import numpy as np
+
+#attackers sent after one enemy ship
+TARGET_CAP = 3
+#docked enemies cost this fraction of their distance
+DOCKED_WEIGHT = .75
+
+
+def assign(cost, caps):
+    '''
+    Assign rows to columns, at most caps[j] rows to column j, by rounds of
+    proposals: every unassigned row proposes to its cheapest column with
+    room left and each column accepts its cheapest proposals that fit.
+    Rows still unassigned once every column is full get their cheapest
+    column regardless.
+
+    :return: column of each row (-1 if there are no columns)
+    '''
+    n, m = cost.shape
+    choice = np.full(n, -1)
+    if not m:
+        return choice
+    room = np.array(caps, dtype=int)
+    free = np.ones(n, dtype=bool)
+    while free.any() and (room > 0).any():
+        rows = np.nonzero(free)[0]
+        want = np.where(room[None, :] > 0, cost[rows], np.inf).argmin(axis=1)
+        #proposals grouped by column, cheapest first, ranked within the column
+        order = np.lexsort((cost[rows, want], want))
+        rows, want = rows[order], want[order]
+        rank = np.arange(len(want)) - np.searchsorted(want, want)
+        ok = rank < room[want]
+        choice[rows[ok]] = want[ok]
+        free[rows[ok]] = False
+        room -= np.bincount(want[ok], minlength=m)
+    if free.any():
+        choice[free] = cost[free].argmin(axis=1)
+    return choice
+
+
+class AttackPlan:
+    '''
+    This turn's assignment of my undocked attackers to enemy ships
+
+    :ivar targets: Attacker id -> enemy ship
+    :ivar leads: Enemy id -> id of the nearest attacker assigned to it
+    '''
+    def __init__(self, store, cap=TARGET_CAP):
+        ships = store.ships
+        self.store = store
+        atck = np.nonzero(store.role_mask(2) & store.mask('undocked'))[0]
+        enems = np.nonzero(store.mask('enemy'))[0]
+        self.targets, self.leads = {}, {}
+        if not len(atck) or not len(enems):
+            return
+
+        dist = store.distances(atck, enems)
+        cost = dist*np.where(ships.docking[enems] != 0, DOCKED_WEIGHT, 1.)[None, :]
+        choice = assign(cost, np.full(len(enems), cap))
+
+        lead_dist = {}
+        for i, j in enumerate(choice):
+            sid, enem = ships.objects[atck[i]].id, ships.objects[enems[j]]
+            self.targets[sid] = enem
+            if dist[i, j] < lead_dist.get(enem.id, np.inf):
+                lead_dist[enem.id] = dist[i, j]
+                self.leads[enem.id] = sid
+
+    def target(self, ship):
+        '''
+        Enemy ship assigned to ship, or the nearest enemy for ships that
+        became attackers after the plan was made (None if there are none)
+        '''
+        enem = self.targets.get(ship.id)
+        if enem is None:
+            ships = self.store.ships
+            enems = np.nonzero(self.store.mask('enemy'))[0]
+            if len(enems):
+                d = np.hypot(ships.x[enems] - ship.x, ships.y[enems] - ship.y)
+                enem = ships.objects[enems[d.argmin()]]
+        return enem
@@ -0,0 +1,76 @@
+'''
+Opening book lookups, against synthetic maps (see benchmarks/synthetic.py).
+
+    python -m pytest tests
+'''
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+import hlt
+from synthetic import Scenario
+
+
+def parse(scenario):
+    gmap = hlt.game_map.Map(0, scenario.width, scenario.height)
+    gmap._parse(scenario.map_string())
+    return gmap
+
+
+def stored(scenario, path):
+    '''
+    A book at path holding an entry for scenario's map, whose first ship
+    mines the biggest planet
+
+    :return: the book, the biggest planet's position
+    '''
+    gmap = parse(scenario)
+    planet = max(gmap.all_planets(), key=lambda p: p.radius)
+    ship = gmap.get_me().all_ships()[0]
+    book = hlt.book.OpeningBook(str(path))
+    book.put(hlt.book.layout(gmap),
+             hlt.book.Entry('scaling', 3., {name: 0 for name in hlt.book.PSTATS},
+                            {ship.id: planet.id}))
+    return book, (planet.x, planet.y)
+
+
+def test_jittered_layout_matches(tmp_path):
+    '''
+    Planets moved by up to a unit still find the entry, with its miner on
+    the same planet
+    '''
+    scenario = Scenario(2, seed=0)
+    book, where = stored(scenario, tmp_path)
+    rng = random.Random(0)
+    for p in scenario.planets:
+        p['x'] += rng.uniform(-1, 1)
+        p['y'] += rng.uniform(-1, 1)
+    gmap = parse(scenario)
+    entry = book.get(hlt.book.layout(gmap))
+
+    assert entry is not None
+    (sid, pid), = entry.miners.items()
+    planet = gmap.get_planet(pid)
+    assert abs(planet.x - where[0]) <= 1 and abs(planet.y - where[1]) <= 1
+
+
+def test_mirrored_layout_matches(tmp_path):
+    '''
+    The same map seen from the opposite seat is the same layout
+    '''
+    scenario = Scenario(2, seed=1)
+    book, _ = stored(scenario, tmp_path)
+    for entity in scenario.planets + list(scenario.ships.values()):
+        entity['x'] = scenario.width - entity['x']
+        entity['y'] = scenario.height - entity['y']
+
+    assert book.get(hlt.book.layout(parse(scenario))) is not None
+
+
+def test_other_layout_misses(tmp_path):
+    book, _ = stored(Scenario(2, seed=0), tmp_path)
+
+    assert book.get(hlt.book.layout(parse(Scenario(2, seed=7)))) is None
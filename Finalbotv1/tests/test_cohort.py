@@ -0,0 +1,67 @@
+'''
+Cohort navigation, on a synthetic map (see benchmarks/synthetic.py).
+
+    python -m pytest tests
+'''
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+import hlt
+from hlt.entity import Ship
+from synthetic import Scenario
+
+N = 6
+
+
+def navigate(monkeypatch, link_radius):
+    '''
+    Send N miners spawned side by side to the one planet, leaders first
+
+    :return: (navigate_iter calls, commands, nav_stats)
+    '''
+    logging.disable(logging.CRITICAL)
+    scenario = Scenario(2, seed=0, n_planets=1, ships_per_player=N)
+    gmap = hlt.game_map.Map(0, scenario.width, scenario.height)
+    gmap._parse(scenario.map_string())
+    gstate = hlt.state.State()
+    gstate.cohorts = hlt.cohort.Cohorts(link_radius)
+    gstate.update(gmap)
+    planet = gmap.all_planets()[0]
+    ships = gmap.get_me().all_ships()
+    for ship in ships:
+        gstate.set_ship_role(ship.id, 1)
+        gstate.ships_targets[ship.id] = planet.id
+    gstate.cohorts.build(gmap, gstate)
+
+    calls = []
+    navigate_iter = Ship.navigate_iter
+
+    def counted(ship, *args, **kwargs):
+        calls.append(ship.id)
+        return navigate_iter(ship, *args, **kwargs)
+
+    monkeypatch.setattr(Ship, 'navigate_iter', counted)
+    ships = sorted(ships, key=lambda s: not gstate.cohorts.is_leader(s.id))
+    commands = [s.navigate(planet, gmap, gstate, speed=int(hlt.constants.MAX_SPEED))
+                for s in ships]
+    return len(calls), commands, gstate.nav_stats
+
+
+def test_cohort_searches_once(monkeypatch):
+    '''
+    Only the leader of a cohort of N searches headings; the others follow
+    its route, each on a move of its own
+    '''
+    calls, commands, stats = navigate(monkeypatch, hlt.constants.MAX_SPEED)
+    alone, _, _ = navigate(monkeypatch, .1)
+
+    assert alone == N
+    assert calls == 1
+    assert stats['cohort'] == N - 1
+    moves = [c.split()[2:] for c in commands]
+    assert all(int(speed) > 0 for speed, _ in moves)
+    assert len(set(map(tuple, moves[1:]))) == N - 1
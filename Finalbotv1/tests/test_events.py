@@ -0,0 +1,47 @@
+'''
+Map parser events, against synthetic games (see benchmarks/synthetic.py).
+
+    python -m pytest tests
+'''
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+from hlt.entity import Ship
+from hlt.events import ShipDockingChanged
+from hlt.game_map import Map
+from synthetic import Scenario
+
+
+def test_docking_change_after_local_write():
+    '''
+    A ship the bot marked DOCKING itself still reports the engine's
+    UNDOCKED -> DOCKING change on the next parse
+    '''
+    scenario = Scenario(2, seed=0)
+    gmap = Map(0, scenario.width, scenario.height)
+    gmap._parse(scenario.map_string())
+    ship = gmap.get_me().all_ships()[0]
+
+    #as init_mine_step does after issuing a dock command
+    ship.docking_status = Ship.DockingStatus.DOCKING
+    scenario.ships[ship.id]['dock'] = 1
+    gmap._parse(scenario.map_string())
+
+    assert ShipDockingChanged(ship.id, 0, Ship.DockingStatus.UNDOCKED,
+                              Ship.DockingStatus.DOCKING) in gmap.events
+    assert gmap.get_me().get_ship(ship.id).docking_status is Ship.DockingStatus.DOCKING
+
+
+def test_no_docking_change_when_engine_agrees():
+    '''
+    Reparsing an unchanged map reports no docking changes
+    '''
+    scenario = Scenario(2, seed=0)
+    gmap = Map(0, scenario.width, scenario.height)
+    gmap._parse(scenario.map_string())
+    gmap._parse(scenario.map_string())
+
+    assert not [e for e in gmap.events if isinstance(e, ShipDockingChanged)]
@@ -0,0 +1,69 @@
+'''
+Opening evaluator, on synthetic maps (see benchmarks/synthetic.py).
+
+    python -m pytest tests
+'''
+import multiprocessing
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+import hlt
+from hlt import opening
+from synthetic import Scenario
+
+BUDGET = .5
+HORIZON = 10
+
+PARENT = os.getpid()
+_batch = opening._batch
+
+
+def _fail_on_pool(snap, name, seeds, horizon):
+    if os.getpid() != PARENT:
+        raise ValueError('rollout failed')
+    return _batch(snap, name, seeds, horizon)
+
+
+def initial_map():
+    scenario = Scenario(2, seed=0)
+    gmap = hlt.game_map.Map(0, scenario.width, scenario.height)
+    gmap._parse(scenario.map_string())
+    return gmap
+
+
+def test_evaluate_within_budget():
+    '''
+    A short evaluation rolls out both openings and leaves no workers behind
+    '''
+    verdict = opening.evaluate(initial_map(), budget=BUDGET, horizon=HORIZON, workers=2)
+
+    assert verdict.opening in opening.OPENINGS
+    assert all(verdict.stats[o].n > 0 for o in opening.OPENINGS)
+    assert not multiprocessing.active_children()
+
+
+def test_failed_rollouts_fall_back_in_process(monkeypatch):
+    '''
+    When rollouts fail on the pool, evaluate rolls out in process instead
+    of raising
+    '''
+    monkeypatch.setattr(opening, '_batch', _fail_on_pool)
+    verdict = opening.evaluate(initial_map(), budget=BUDGET, horizon=HORIZON, workers=2)
+
+    assert sum(s.n for s in verdict.stats.values()) > 0
+    assert not multiprocessing.active_children()
+
+
+def test_verdict_favours_higher_mean():
+    '''
+    The opening with the higher mean score wins, with a positive z
+    '''
+    verdict = opening._verdict({opening.ALL_IN: [1., 2., 3., 2.],
+                                opening.SCALING: [-1., 0., -2., -1.]})
+
+    assert verdict.opening == opening.ALL_IN
+    assert verdict.z > 0
+    assert verdict.stats[opening.ALL_IN].n == 4
@@ -0,0 +1,45 @@
+'''
+Anytime planning queue.
+
+    python -m pytest tests
+'''
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from hlt.planner import PlanQueue
+
+#seconds per step of the slow plan, and its steps
+STEP = .01
+STEPS = 50
+
+
+def slow():
+    for _ in range(STEPS):
+        time.sleep(STEP)
+        yield
+    return 'done'
+
+
+def test_forced_plan_stops_at_deadline():
+    '''
+    A plan past max_age is only advanced until the turn's deadline when
+    taken, and finishes in a later run
+    '''
+    queue = PlanQueue()
+    queue.start_turn(0)
+    queue.submit('slow', slow, max_age=1)
+
+    start = time.time()
+    queue.start_turn(1, start + 5*STEP)
+    assert queue.take('slow') is None
+    assert time.time() - start < STEPS*STEP/2
+    assert queue.counts['forced'] == 1
+    assert 'slow' in queue
+
+    queue.start_turn(2, time.time() + 10)
+    queue.run(time.time() + 10)
+    assert queue.take('slow') == 'done'
+    assert 'slow' not in queue
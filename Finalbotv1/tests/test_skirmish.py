@@ -0,0 +1,74 @@
+'''
+Skirmish search, on a hand-built fight (see benchmarks/synthetic.py).
+
+    python -m pytest tests
+'''
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+import hlt
+from hlt import constants
+from synthetic import Scenario
+
+#a planet between my two attackers and the enemy they fight
+PLANET = (108., 80., 3.)
+MINE = ((100., 79.), (100., 81.))
+ENEMY = (116., 80.)
+
+
+def fight():
+    '''
+    Map and State of the fight, my ships attacking
+    '''
+    scenario = Scenario(2, seed=0, n_planets=1, ships_per_player=0)
+    planet = scenario.planets[0]
+    planet['x'], planet['y'], planet['r'] = PLANET
+    for x, y in MINE:
+        scenario.spawn(0, x, y)
+    scenario.spawn(1, *ENEMY)
+    gmap = hlt.game_map.Map(0, scenario.width, scenario.height)
+    gmap._parse(scenario.map_string())
+    gstate = hlt.state.State()
+    gstate.update(gmap)
+    for ship in gmap.get_me().all_ships():
+        gstate.set_ship_role(ship.id, 2)
+    return gmap, gstate
+
+
+def test_expired_deadline_skips_search():
+    '''
+    With no time left every ship navigates as before and the skipped
+    skirmish is counted
+    '''
+    gmap, gstate = fight()
+    skirmishes = hlt.skirmish.Skirmishes(gmap, gstate, time.time() - 1)
+
+    for ship in gmap.get_me().all_ships():
+        assert skirmishes.move(ship) is None
+    assert gstate.profiler.counters['skirmishes_skipped'] == 1
+    assert not gstate.profiler.counters['skirmishes']
+
+
+def test_first_move_avoids_crashes():
+    '''
+    The straight line at the enemy runs into the planet; the chosen first
+    moves go round it without landing on each other
+    '''
+    gmap, gstate = fight()
+    skirmishes = hlt.skirmish.Skirmishes(gmap, gstate, time.time() + 10)
+    ships = gmap.get_me().all_ships()
+    moves = [skirmishes.move(ship) for ship in ships]
+
+    assert gstate.profiler.counters['skirmishes'] == 1
+    px, py, r = PLANET
+    for ship, move in zip(ships, moves):
+        assert move is not None
+        for x, y in ((move.x, move.y), ((move.x + ship.x)/2, (move.y + ship.y)/2)):
+            assert math.hypot(x - px, y - py) > r + constants.SHIP_RADIUS
+    a, b = moves
+    assert math.hypot(a.x - b.x, a.y - b.y) >= 2*constants.SHIP_RADIUS